@@ -0,0 +1,75 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import os
+import pathlib
+import tempfile
+import typing
+
+import numpy as np
+
+
+def replace(path: pathlib.Path, write: typing.Callable[[typing.BinaryIO], object]):
+    """write the file through a temporary file renamed to the path,
+    so that a partially written file is never read"""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+@dataclasses.dataclass(frozen=True)
+class NpyCache:
+    """on-disk cache of the NumPy arrays by the keys
+
+    Each array is stored as a NumPy file replaced atomically, and is memory-mapped on load.
+    The cache is disabled if the directory is None."""
+
+    directory: pathlib.Path | None
+
+    def path(self, key: str, suffix: str = ".npy") -> pathlib.Path:
+        if not self.directory:
+            msg = "the cache is disabled"
+            raise ValueError(msg)
+        return self.directory / f"{key}{suffix}"
+
+    def load(self, key: str) -> np.ndarray | None:
+        """the read-only memory-mapped array, None if not cached"""
+        if not self.directory or not (path := self.path(key)).exists():
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def save(self, key: str, array: np.ndarray):
+        if not self.directory:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        replace(self.path(key), lambda f: np.save(f, array))
+
+    @contextlib.contextmanager
+    def create(self, key: str, shape: tuple[int, ...], dtype=np.float64):
+        """a writable memory-mapped array to be saved when the context exits normally
+
+        None if the cache is disabled."""
+        if not self.directory:
+            yield None
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".{path.name}.")
+        os.close(fd)
+        try:
+            array = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+            yield array
+            array.flush()
+            del array
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
@@ -3,14 +3,17 @@
 from __future__ import annotations
 
 import asyncio
+import collections
+import contextlib
 import dataclasses
+import gzip
 import itertools
-import json
 import logging
 import pathlib
 import typing
 
 import aiohttp
+import orjson
 from pydantic_settings import BaseSettings
 
 from . import httputil
@@ -26,29 +29,212 @@ class ResultWriter:
         raise NotImplementedError()
 
 
+Compression = typing.Literal["gzip", "zstd"]
+
+
+def _open_compressed(path: pathlib.Path, compression: Compression | None, mode: str):
+    if compression is None:
+        return path.open(mode + "b")
+    if compression == "gzip":
+        return gzip.open(path, mode + "b")
+    try:
+        import zstandard
+    except ImportError as e:
+        msg = "zstandard is required for zstd compression"
+        raise RuntimeError(msg) from e
+    if mode == "w":
+        return zstandard.ZstdCompressor().stream_writer(path.open("wb"))
+    return zstandard.ZstdDecompressor().stream_reader(path.open("rb"))
+
+
 class FileResultWriter(ResultWriter):
+    """write records as JSON lines in files
+
+    records are buffered and written in batches by a worker thread,
+    so that encoding and file I/O do not block the event loop.
+    if segment_size is given, the file is rotated into segments
+    when the size (before compression) exceeds it."""
+
+    _suffixes: typing.ClassVar[dict[Compression | None, str]] = {
+        None: "",
+        "gzip": ".gz",
+        "zstd": ".zst",
+    }
+
     filepath: pathlib.Path
-    _fp: typing.TextIO
+    paths: list[pathlib.Path]
+    _fp: typing.BinaryIO
 
-    def __init__(self, filepath: pathlib.Path):
+    def __init__(
+        self,
+        filepath: pathlib.Path,
+        *,
+        batch_size: int = 1000,
+        compression: Compression | None = None,
+        segment_size: int | None = None,
+    ):
         self.filepath = filepath
-        self._fp = self.filepath.open("w")
+        self.batch_size = batch_size
+        self.compression = compression
+        self.segment_size = segment_size
+        self.paths = []
+        self._records: list[dict] = []
+        self._pending: asyncio.Future | None = None
+        self._size = 0
+        self._open_segment()
+
+    def _open_segment(self):
+        path = self.filepath
+        if self.segment_size:
+            path = path.with_stem(f"{path.stem}.{len(self.paths):05d}")
+        path = path.with_name(path.name + self._suffixes[self.compression])
+        self._fp = _open_compressed(path, self.compression, "w")
+        self._size = 0
+        self.paths.append(path)
+
+    def _write(self, records: list[dict]):
+        data = b"".join(orjson.dumps(record) + b"\n" for record in records)
+        self._fp.write(data)
+        self._size += len(data)
+        if self.segment_size and self._size >= self.segment_size:
+            self._fp.close()
+            self._open_segment()
+
+    async def _flush(self):
+        # write the previous batch and buffer the next one at the same time
+        if self._pending:
+            await self._pending
+        records, self._records = self._records, []
+        self._pending = asyncio.ensure_future(asyncio.to_thread(self._write, records))
 
     async def close(self):
+        await self._flush()
+        await self._pending
         self._fp.close()
 
     async def write_json(self, data: dict):
-        json.dump(data, self._fp, ensure_ascii=False)
-        self._fp.write("\n")
+        self._records.append(data)
+        if len(self._records) >= self.batch_size:
+            await self._flush()
+
+    def iter_bytes(self, chunk_size: int = 1 << 16) -> typing.Iterator[bytes]:
+        """read the decompressed contents of all the segments"""
+        for path in self.paths:
+            with _open_compressed(path, self.compression, "r") as fp:
+                while chunk := fp.read(chunk_size):
+                    yield chunk
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        msg = "pyarrow is required for parquet output"
+        raise RuntimeError(msg) from e
+    return pyarrow
+
+
+class ParquetResultWriter(ResultWriter):
+    """write records as Parquet tables, one for each event type
+
+    the common fields are stored in typed columns,
+    and the other details in a column of JSON strings."""
+
+    directory: pathlib.Path
+
+    def __init__(self, directory: pathlib.Path, *, batch_size: int = 10000):
+        pa = _import_pyarrow()
+        self.directory = directory
+        self.batch_size = batch_size
+        self.schema = pa.schema(
+            [
+                ("time", pa.float64()),
+                ("source", pa.string()),
+                ("service", pa.string()),
+                ("userId", pa.string()),
+                ("mobilityId", pa.string()),
+                (
+                    "location",
+                    pa.struct(
+                        [
+                            ("locationId", pa.string()),
+                            ("lat", pa.float64()),
+                            ("lng", pa.float64()),
+                        ]
+                    ),
+                ),
+                ("details", pa.string()),
+            ]
+        )
+        self._records: dict[str, list[dict]] = collections.defaultdict(list)
+        self._writers: dict[str, typing.Any] = {}
+        self._pending: asyncio.Future | None = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.glob("*.parquet"):
+            path.unlink()
+
+    @property
+    def paths(self) -> dict[str, pathlib.Path]:
+        return {
+            event_type: self.directory / f"{event_type}.parquet"
+            for event_type in self._writers
+        }
+
+    def _row(self, record: dict) -> dict:
+        details = dict(record.get("details", {}))
+        return {
+            "time": record.get("time"),
+            "source": record.get("source"),
+            "service": record.get("service"),
+            "userId": details.pop("userId", None),
+            "mobilityId": details.pop("mobilityId", None),
+            "location": details.pop("location", None),
+            "details": orjson.dumps(details).decode() if details else None,
+        }
+
+    def _write(self, event_type: str, records: list[dict]):
+        pa = _import_pyarrow()
+        if (writer := self._writers.get(event_type)) is None:
+            path = self.directory / f"{event_type}.parquet"
+            writer = pa.parquet.ParquetWriter(path, self.schema)
+            self._writers[event_type] = writer
+        table = pa.Table.from_pylist([self._row(e) for e in records], self.schema)
+        writer.write_table(table)
+
+    async def _flush(self, event_type: str):
+        if self._pending:
+            await self._pending
+        records = self._records.pop(event_type)
+        self._pending = asyncio.ensure_future(
+            asyncio.to_thread(self._write, event_type, records)
+        )
+
+    async def close(self):
+        for event_type in list(self._records):
+            await self._flush(event_type)
+        if self._pending:
+            await self._pending
+        for writer in self._writers.values():
+            writer.close()
+
+    async def write_json(self, data: dict):
+        event_type = data["eventType"]
+        self._records[event_type].append(data)
+        if len(self._records[event_type]) >= self.batch_size:
+            await self._flush(event_type)
 
 
 class ResultWriterConfig(BaseSettings, frozen=True):
     """environment variable"""
 
     RESULT_WRITER_QUEUE_SIZE: int = 500  # queue size limit for result writer buffer
-    RESULT_WRITER_OVER_INTERVAL: int = (
-        1  # check interval time (seconds) over queue size limit
+    RESULT_WRITER_BATCH_SIZE: int = 500  # max number of records in a request
+    RESULT_WRITER_BATCH_INTERVAL: float = (
+        1.0  # max time (seconds) to wait for records to fill a batch
     )
+    RESULT_WRITER_MAX_IN_FLIGHT: int = 4  # max number of concurrent requests
+    RESULT_WRITER_GZIP: bool = False  # compress request bodies with gzip
 
 
 @dataclasses.dataclass
@@ -59,59 +245,103 @@ class HTTPResultWriter:
         default_factory=aiohttp.ClientSession
     )
     _count: itertools.count = dataclasses.field(default_factory=itertools.count)
-    _records: asyncio.Queue[dict] = dataclasses.field(default_factory=asyncio.Queue)
+    _records: list[dict] = dataclasses.field(default_factory=list)
+    _pending: int = 0  # number of records buffered or being sent
+    _wakeup: asyncio.Event = dataclasses.field(default_factory=asyncio.Event)
+    _drained: asyncio.Event = dataclasses.field(default_factory=asyncio.Event)
+    _semaphore: asyncio.Semaphore = dataclasses.field(init=False)
+    _posts: set[asyncio.Task] = dataclasses.field(default_factory=set)
     _task: asyncio.Task | None = None
+    _error: Exception | None = None
     _closed: bool = False
 
+    def __post_init__(self):
+        self._semaphore = asyncio.Semaphore(self.env.RESULT_WRITER_MAX_IN_FLIGHT)
+
     async def close(self):
         self._closed = True
+        self._wakeup.set()
         if self._task:
-            if self._records.empty():
-                self._task.cancel()
-            try:
-                await self._task
-            except asyncio.CancelledError:
-                pass
+            await self._task
         await self._session.close()
+        if self._error:
+            raise self._error
 
     async def write_json(self, record: dict):
         await self._wait_over()
+        if self._error:
+            raise self._error
         if self._task is None and not self._closed:
             self._task = asyncio.create_task(self._polling())
-        self._records.put_nowait(record)
+        self._records.append({"seqno": next(self._count), "data": record})
+        self._pending += 1
+        if len(self._records) in (1, self.env.RESULT_WRITER_BATCH_SIZE):
+            self._wakeup.set()
 
     async def _wait_over(self):
-        while self._records.qsize() > self.env.RESULT_WRITER_QUEUE_SIZE:
+        if self._pending > self.env.RESULT_WRITER_QUEUE_SIZE:
             logger.warning(
                 "wait_queue_size: queue_size=%s > %s",
-                self._records.qsize(),
+                self._pending,
                 self.env.RESULT_WRITER_QUEUE_SIZE,
             )
-            await asyncio.sleep(self.env.RESULT_WRITER_OVER_INTERVAL)
+        while self._pending > self.env.RESULT_WRITER_QUEUE_SIZE and not self._error:
+            self._drained.clear()
+            await self._drained.wait()
 
     async def _polling(self):
-        while not self._closed:
+        while self._records or not self._closed:
+            if not self._records:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            if (
+                len(self._records) < self.env.RESULT_WRITER_BATCH_SIZE
+                and not self._closed
+            ):
+                # wait for the batch to be filled up to the interval
+                self._wakeup.clear()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), self.env.RESULT_WRITER_BATCH_INTERVAL
+                    )
             await self._send_records()
-        # after close(), process records until the queue becomes empty
-        if not self._records.empty():
-            logger.info("remaining qsize: %s", self._records.qsize())
-            await self._send_records(nowait=True)
-
-    async def _send_records(self, nowait=False):
-        data = [
-            {"seqno": next(self._count), "data": record}
-            async for record in self._pop_records(nowait)
-        ]
-        if data:
+        # after close(), wait for the requests in flight
+        await asyncio.gather(*self._posts)
+
+    async def _send_records(self):
+        await self._semaphore.acquire()
+        size = self.env.RESULT_WRITER_BATCH_SIZE
+        data, self._records = self._records[:size], self._records[size:]
+        task = asyncio.create_task(self._send(data))
+        self._posts.add(task)
+        task.add_done_callback(self._posts.discard)
+
+    async def _send(self, data: list[typing.Mapping]):
+        try:
             await self._post(data=data)
+        except Exception as e:
+            logger.exception("failed to send %s records", len(data))
+            self._error = self._error or e
+        finally:
+            self._semaphore.release()
+            self._pending -= len(data)
+            if self._pending <= self.env.RESULT_WRITER_QUEUE_SIZE or self._error:
+                self._drained.set()
 
-    async def _pop_records(self, nowait: bool):
-        if not nowait and self._records.empty():
-            yield await self._records.get()
-        for _ in range(self._records.qsize()):
-            yield self._records.get_nowait()
+    def _encode(self, data: list[typing.Mapping]) -> bytes:
+        body = orjson.dumps(data)
+        if self.env.RESULT_WRITER_GZIP:
+            body = gzip.compress(body, compresslevel=1)
+        return body
 
     async def _post(self, data: list[typing.Mapping]):
-        async with self._session.post(url=self.url, json=data) as response:
+        headers = {"Content-Type": "application/json"}
+        if self.env.RESULT_WRITER_GZIP:
+            headers["Content-Encoding"] = "gzip"
+        body = await asyncio.to_thread(self._encode, data)
+        async with self._session.post(
+            url=self.url, data=body, headers=headers
+        ) as response:
             await httputil.check_response(response)
             return await response.json()
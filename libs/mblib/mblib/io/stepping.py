@@ -0,0 +1,29 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import math
+import typing
+
+StepResult = tuple[float, list]
+
+
+def advance(
+    peek: typing.Callable[[], float],
+    step: typing.Callable[[], StepResult],
+    now: float,
+    until: float | None = None,
+) -> tuple[float, float, list]:
+    """step the simulation repeatedly up to `until` (for /advance API)
+
+    Stepping stops at the first step emitting some events, so that the events
+    are delivered to the other modules, and their reactions come back, before
+    the next step, in the same order as with /step API.
+    Returns the current time, the time of the next event and emitted events.
+    """
+    if until is None:
+        until = math.inf
+    events: list = []
+    next_ = peek()
+    while not events and math.isfinite(next_) and next_ <= until:
+        now, events = step()
+        next_ = peek()
+    return now, next_, events
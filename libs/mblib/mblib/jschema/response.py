@@ -20,3 +20,9 @@ T = typing.TypeVar("T", bound=Event)
 class Step(BaseModel, typing.Generic[T]):
     now: float
     events: list[T]
+
+
+class Advance(BaseModel, typing.Generic[T]):
+    now: float
+    next: float
+    events: list[T]
@@ -42,6 +42,19 @@ class EventDefinition(BaseModel):
         )
 
 
+class ApiDefinition(BaseModel):
+    advance: bool = Field(
+        False,
+        title="support batched stepping",
+        description="if true, /advance and /triggered/batch are available",
+    )
+    independent: bool = Field(
+        False,
+        title="handle triggered events independently of the other modules",
+        description="if true, triggered events are sent concurrently with others",
+    )
+
+
 class SpecificationResponse(BaseModel):
     version: AnyHttpUrl = Field(
         title="URI to identify corresponding API version",
@@ -52,6 +65,11 @@ class SpecificationResponse(BaseModel):
         title="definition for supported event by type",
         description="if null, validation not supported",
     )
+    api: ApiDefinition | None = Field(
+        None,
+        title="optional APIs supported by the module",
+        description="if null, only the basic APIs are supported",
+    )
 
 
 # class type of StepEvent or TriggeredEvent
@@ -96,12 +114,14 @@ class EventSpecificationBuilder:
         feature = FeatureDefinition(declared=declared, required=required)
         self.events[str(event_type)].feature = feature
 
-    def get_specification_response(self, *, version: str) -> SpecificationResponse:
+    def get_specification_response(
+        self, *, version: str, api: ApiDefinition | None = None
+    ) -> SpecificationResponse:
         """get specification response data"""
         if self.events:
-            return SpecificationResponse(version=version, events=self.events)
+            return SpecificationResponse(version=version, events=self.events, api=api)
         else:
-            return SpecificationResponse(version=version)
+            return SpecificationResponse(version=version, api=api)
 
     @property
     def schemas(self) -> dict[str, JsonSchemaValue | None]:
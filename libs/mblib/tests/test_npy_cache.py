@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import pathlib
+import tempfile
+import unittest
+
+import numpy as np
+from mblib.io.npy_cache import NpyCache, replace
+
+
+class NpyCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name) / "cache"
+        self.cache = NpyCache(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_and_load(self):
+        self.assertIsNone(self.cache.load("key"))
+
+        self.cache.save("key", np.array([[0.0, 1.5], [2.5, 0.0]]))
+        array = self.cache.load("key")
+
+        # memory-mapped read-only
+        self.assertIsInstance(array, np.memmap)
+        self.assertFalse(array.flags.writeable)
+        self.assertEqual([[0.0, 1.5], [2.5, 0.0]], array.tolist())
+        self.assertEqual([self.path / "key.npy"], list(self.path.iterdir()))
+
+    def test_create(self):
+        with self.cache.create("key", (2, 3)) as array:
+            array[:] = np.arange(6).reshape(2, 3)
+            # not loaded until the context exits
+            self.assertIsNone(self.cache.load("key"))
+
+        self.assertEqual([[0, 1, 2], [3, 4, 5]], self.cache.load("key").tolist())
+        self.assertEqual([self.path / "key.npy"], list(self.path.iterdir()))
+
+    def test_create_failed(self):
+        with self.assertRaises(RuntimeError), self.cache.create("key", (2, 2)):
+            raise RuntimeError()
+
+        # the temporary file is removed
+        self.assertIsNone(self.cache.load("key"))
+        self.assertEqual([], list(self.path.iterdir()))
+
+    def test_replace_failed(self):
+        self.path.mkdir()
+        path = self.path / "key.json"
+        path.write_bytes(b"old")
+
+        def write(f):
+            f.write(b"new")
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            replace(path, write)
+
+        self.assertEqual(b"old", path.read_bytes())
+        self.assertEqual([path], list(self.path.iterdir()))
+
+    def test_disabled(self):
+        cache = NpyCache(None)
+
+        cache.save("key", np.zeros(2))
+        with cache.create("key", (2,)) as array:
+            self.assertIsNone(array)
+
+        self.assertIsNone(cache.load("key"))
+        self.assertFalse(self.path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,370 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import asyncio
+import gzip
+import importlib.util
+import json
+import pathlib
+import tempfile
+import unittest
+
+import fastapi
+from aiohttp import test_utils, web
+from mblib.io.result import (
+    FileResultWriter,
+    HTTPResultWriter,
+    ParquetResultWriter,
+    ResultWriterConfig,
+)
+
+COMPRESSIONS = [None, "gzip"]
+if importlib.util.find_spec("zstandard"):
+    COMPRESSIONS.append("zstd")
+
+
+def _records(n: int):
+    return [{"eventType": "DEMAND", "time": float(i), "seq": i} for i in range(n)]
+
+
+def _decompress(path: pathlib.Path, compression: str | None) -> bytes:
+    if compression is None:
+        return path.read_bytes()
+    if compression == "gzip":
+        return gzip.decompress(path.read_bytes())
+    import zstandard
+
+    with zstandard.ZstdDecompressor().stream_reader(path.open("rb")) as fp:
+        return fp.read()
+
+
+class FileResultWriterTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filepath = pathlib.Path(self.directory.name) / "result.txt"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def test_batch(self):
+        writer = FileResultWriter(self.filepath, batch_size=3)
+        records = _records(5)
+        for record in records[:2]:
+            await writer.write_json(record)
+        self.assertEqual(b"", self.filepath.read_bytes())
+
+        # the batch is written when it is filled up
+        await writer.write_json(records[2])
+        await writer._pending
+        writer._fp.flush()
+        lines = self.filepath.read_bytes().splitlines()
+        self.assertEqual(records[:3], [json.loads(line) for line in lines])
+
+        # the rest is written on close
+        for record in records[3:]:
+            await writer.write_json(record)
+        await writer.close()
+        lines = self.filepath.read_bytes().splitlines()
+        self.assertEqual(records, [json.loads(line) for line in lines])
+
+    async def test_compression(self):
+        records = _records(10)
+        for compression in COMPRESSIONS:
+            with self.subTest(compression=compression):
+                writer = FileResultWriter(
+                    self.filepath, batch_size=4, compression=compression
+                )
+                for record in records:
+                    await writer.write_json(record)
+                await writer.close()
+
+                suffix = {None: ".txt", "gzip": ".gz", "zstd": ".zst"}[compression]
+                self.assertEqual([suffix], [path.suffix for path in writer.paths])
+                lines = _decompress(writer.paths[0], compression).splitlines()
+                self.assertEqual(records, [json.loads(line) for line in lines])
+
+    async def test_segments(self):
+        records = _records(20)
+        size = len(json.dumps(records[0], separators=(",", ":"))) + 1
+        for compression in COMPRESSIONS:
+            with self.subTest(compression=compression):
+                writer = FileResultWriter(
+                    self.filepath,
+                    batch_size=2,
+                    compression=compression,
+                    segment_size=size * 5,
+                )
+                for record in records:
+                    await writer.write_json(record)
+                await writer.close()
+
+                # a segment is rotated when its size exceeds segment_size
+                self.assertGreater(len(writer.paths), 3)
+                self.assertEqual(
+                    [f"result.{i:05d}" for i in range(len(writer.paths))],
+                    [path.name.split(".txt")[0] for path in writer.paths],
+                )
+                contents = [_decompress(p, compression) for p in writer.paths]
+                for content in contents[:-1]:
+                    self.assertGreaterEqual(len(content), size * 5)
+
+                # the segments are read back in order
+                data = b"".join(writer.iter_bytes(chunk_size=7))
+                self.assertEqual(b"".join(contents), data)
+                self.assertEqual(
+                    records, [json.loads(line) for line in data.splitlines()]
+                )
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+class ParquetResultWriterTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name) / "events"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def test_round_trip(self):
+        import pyarrow.parquet
+
+        writer = ParquetResultWriter(self.path)
+        location = {"locationId": "S1", "lat": 35.0, "lng": 139.0}
+        records = [
+            {
+                "eventType": "DEPART",
+                "time": 1.0,
+                "source": "bus",
+                "details": {"userId": "U1", "mobilityId": "M1", "location": location},
+            },
+            {
+                "eventType": "DEPART",
+                "time": 2.5,
+                "source": "bus",
+                "service": "bus",
+                "details": {"mobilityId": "M2", "location": location, "x": [1, 2]},
+            },
+            {
+                "eventType": "DEMAND",
+                "time": 3.0,
+                "source": "user",
+                "details": {"userId": "U2", "demandId": "D1"},
+            },
+        ]
+        for record in records:
+            await writer.write_json(record)
+        await writer.close()
+
+        self.assertEqual(
+            {
+                "DEPART": self.path / "DEPART.parquet",
+                "DEMAND": self.path / "DEMAND.parquet",
+            },
+            writer.paths,
+        )
+        table = pyarrow.parquet.read_table(writer.paths["DEPART"])
+        self.assertEqual(
+            [
+                "time",
+                "source",
+                "service",
+                "userId",
+                "mobilityId",
+                "location",
+                "details",
+            ],
+            table.column_names,
+        )
+        self.assertEqual(
+            [
+                {
+                    "time": 1.0,
+                    "source": "bus",
+                    "service": None,
+                    "userId": "U1",
+                    "mobilityId": "M1",
+                    "location": location,
+                    "details": None,
+                },
+                {
+                    "time": 2.5,
+                    "source": "bus",
+                    "service": "bus",
+                    "userId": None,
+                    "mobilityId": "M2",
+                    "location": location,
+                    "details": '{"x":[1,2]}',
+                },
+            ],
+            table.to_pylist(),
+        )
+        rows = pyarrow.parquet.read_table(writer.paths["DEMAND"]).to_pylist()
+        self.assertEqual(
+            [("U2", None, '{"demandId":"D1"}')],
+            [(row["userId"], row["location"], row["details"]) for row in rows],
+        )
+
+    async def test_batch(self):
+        import pyarrow.parquet
+
+        writer = ParquetResultWriter(self.path, batch_size=2)
+        demands = [
+            {"eventType": "DEMAND", "time": float(i), "details": {"userId": f"U{i}"}}
+            for i in range(5)
+        ]
+        await writer.write_json(demands[0])
+        await writer.write_json({"eventType": "ARRIVED", "time": 0.0})
+        self.assertEqual({}, writer.paths)
+
+        # the records of an event type are flushed when they reach batch_size
+        await writer.write_json(demands[1])
+        await writer._pending
+        self.assertEqual(["DEMAND"], list(writer.paths))
+
+        for demand in demands[2:]:
+            await writer.write_json(demand)
+        await writer.close()
+        self.assertEqual(["DEMAND", "ARRIVED"], list(writer.paths))
+        file = pyarrow.parquet.ParquetFile(writer.paths["DEMAND"])
+        self.assertEqual(
+            [2, 2, 1],
+            [file.metadata.row_group(i).num_rows for i in range(file.num_row_groups)],
+        )
+        self.assertEqual(
+            [f"U{i}" for i in range(5)],
+            file.read().column("userId").to_pylist(),
+        )
+
+
+class HTTPResultWriterTestCase(unittest.IsolatedAsyncioTestCase):
+    """HTTPResultWriter sending records to a stub server"""
+
+    async def asyncSetUp(self):
+        self.bodies: list[list[dict]] = []
+        self.status = 200
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.encodings: list[str | None] = []
+        self.received = asyncio.Event()
+        self.release = asyncio.Event()
+        self.release.set()
+
+        async def handle(request: web.Request):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                self.encodings.append(request.headers.get("Content-Encoding"))
+                body = await request.read()
+                if request.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                self.bodies.append(json.loads(body))
+                self.received.set()
+                await self.release.wait()
+                return web.json_response({"message": "ok"}, status=self.status)
+            finally:
+                self.in_flight -= 1
+
+        app = web.Application()
+        app.router.add_post("/result/events/", handle)
+        # the bodies are decompressed by the handler to check the encoding
+        self.server = test_utils.TestServer(app)
+        await self.server.start_server(auto_decompress=False)
+        self.addAsyncCleanup(self.server.close)
+
+    def writer(self, **kwargs):
+        env = ResultWriterConfig(RESULT_WRITER_BATCH_INTERVAL=0.01, **kwargs)
+        return HTTPResultWriter(str(self.server.make_url("/result/events/")), env=env)
+
+    async def test_batch(self):
+        writer = self.writer(RESULT_WRITER_BATCH_SIZE=3)
+        records = _records(7)
+        for record in records:
+            await writer.write_json(record)
+        await writer.close()
+
+        self.assertEqual([3, 3, 1], [len(body) for body in self.bodies])
+        sent = [e for body in self.bodies for e in body]
+        self.assertEqual(list(range(7)), [e["seqno"] for e in sent])
+        self.assertEqual(records, [e["data"] for e in sent])
+
+    async def test_gzip(self):
+        writer = self.writer(RESULT_WRITER_BATCH_SIZE=2, RESULT_WRITER_GZIP=True)
+        records = _records(3)
+        for record in records:
+            await writer.write_json(record)
+        await writer.close()
+
+        self.assertEqual(["gzip", "gzip"], self.encodings)
+        sent = [e for body in self.bodies for e in body]
+        self.assertEqual(records, [e["data"] for e in sent])
+
+    async def test_wait_over_queue_size(self):
+        writer = self.writer(
+            RESULT_WRITER_BATCH_SIZE=1,
+            RESULT_WRITER_MAX_IN_FLIGHT=1,
+            RESULT_WRITER_QUEUE_SIZE=2,
+        )
+        self.release.clear()
+        records = _records(4)
+        for record in records[:3]:
+            await writer.write_json(record)
+        await self.received.wait()
+
+        # the writer blocks while the records over the queue size are pending
+        write = asyncio.create_task(writer.write_json(records[3]))
+        await asyncio.sleep(0.05)
+        self.assertFalse(write.done())
+        self.assertEqual(1, len(self.bodies))
+
+        # and resumes when the requests are completed
+        self.release.set()
+        await asyncio.wait_for(write, 1.0)
+        await writer.close()
+        sent = [e for body in self.bodies for e in body]
+        self.assertEqual(records, [e["data"] for e in sent])
+        self.assertEqual(1, self.max_in_flight)
+
+    async def test_max_in_flight(self):
+        writer = self.writer(
+            RESULT_WRITER_BATCH_SIZE=1,
+            RESULT_WRITER_MAX_IN_FLIGHT=2,
+            RESULT_WRITER_QUEUE_SIZE=100,
+        )
+        self.release.clear()
+        for record in _records(6):
+            await writer.write_json(record)
+        # wait for the requests to reach the limit
+        while self.in_flight < 2:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        self.assertEqual(2, self.in_flight)
+
+        self.release.set()
+        await writer.close()
+        self.assertEqual(2, self.max_in_flight)
+        self.assertEqual(6, len(self.bodies))
+
+    async def test_error_on_write(self):
+        self.status = 500
+        writer = self.writer()
+        await writer.write_json(_records(1)[0])
+        await self.received.wait()
+        while writer._pending:
+            await asyncio.sleep(0.01)
+
+        with self.assertRaises(fastapi.HTTPException):
+            await writer.write_json(_records(1)[0])
+        with self.assertRaises(fastapi.HTTPException):
+            await writer.close()
+
+    async def test_error_on_close(self):
+        self.status = 503
+        writer = self.writer()
+        await writer.write_json(_records(1)[0])
+
+        with self.assertRaises(fastapi.HTTPException):
+            await writer.close()
+        self.assertEqual(1, len(self.bodies))
+
+
+if __name__ == "__main__":
+    unittest.main()
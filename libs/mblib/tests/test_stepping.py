@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import math
+import unittest
+
+from mblib.io import stepping
+
+
+class Schedule:
+    """simulation to emit the events at the scheduled time"""
+
+    def __init__(self, schedule: list[tuple[float, list]]):
+        self.schedule = schedule
+        self.steps = 0
+
+    def peek(self):
+        return self.schedule[0][0] if self.schedule else math.inf
+
+    def step(self):
+        self.steps += 1
+        return self.schedule.pop(0)
+
+
+class AdvanceTestCase(unittest.TestCase):
+    def test_until(self):
+        schedule = Schedule([(1.0, []), (2.0, []), (3.0, [])])
+
+        self.assertEqual(
+            (2.0, 3.0, []), stepping.advance(schedule.peek, schedule.step, 0.0, 2.0)
+        )
+        self.assertEqual(2, schedule.steps)
+
+        # not stepped if the next event is after until
+        self.assertEqual(
+            (2.0, 3.0, []), stepping.advance(schedule.peek, schedule.step, 2.0, 2.5)
+        )
+        self.assertEqual(2, schedule.steps)
+
+    def test_stop_on_events(self):
+        schedule = Schedule([(1.0, []), (2.0, ["a"]), (2.0, ["b"]), (3.0, ["c"])])
+
+        # stopped at the first step emitting events, even if the next is at the same time
+        self.assertEqual(
+            (2.0, 2.0, ["a"]), stepping.advance(schedule.peek, schedule.step, 0.0)
+        )
+        self.assertEqual(
+            (2.0, 3.0, ["b"]), stepping.advance(schedule.peek, schedule.step, 2.0)
+        )
+        self.assertEqual(
+            (3.0, math.inf, ["c"]), stepping.advance(schedule.peek, schedule.step, 2.0)
+        )
+        self.assertEqual(4, schedule.steps)
+
+    def test_inf(self):
+        schedule = Schedule([(1.0, [])])
+
+        self.assertEqual(
+            (1.0, math.inf, []), stepping.advance(schedule.peek, schedule.step, 0.0)
+        )
+        # not stepped without the next event
+        self.assertEqual(
+            (1.0, math.inf, []),
+            stepping.advance(schedule.peek, schedule.step, 1.0, math.inf),
+        )
+        self.assertEqual(1, schedule.steps)
+
+
+if __name__ == "__main__":
+    unittest.main()
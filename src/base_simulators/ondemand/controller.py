@@ -9,12 +9,14 @@ from typing import Annotated
 
 import aiohttp
 import fastapi
+import numpy as np
 from core import Network
 from gtfs import GtfsFlexFilesReader
 from jschema import query, response
-from mblib.io import httputil
+from mblib.io import httputil, stepping
 from mblib.io.log import init_logger
 from mblib.jschema import events, spec
+from network_cache import NetworkCache
 from simulation import CarSetting, Simulation
 
 logger = logging.getLogger(__name__)
@@ -42,6 +44,7 @@ def exception_callback(request: fastapi.Request, exc: Exception):
 
 
 file_table = httputil.FileManager()
+network_cache = NetworkCache()
 sim: Simulation | None = None
 
 
@@ -59,7 +62,9 @@ def get_specification():
     builder.set_feature(events.EventType.ARRIVED, declared=["demand_id"])
     builder.set_feature(events.EventType.RESERVE, required=["demand_id"])
     builder.set_feature(events.EventType.DEPART, required=["demand_id"])
-    return builder.get_specification_response(version=events.VERSION_1)
+    return builder.get_specification_response(
+        version=events.VERSION_1, api=spec.ApiDefinition(advance=True, independent=True)
+    )
 
 
 @app.post("/upload", response_model=response.Message)
@@ -88,37 +93,35 @@ async def setup(settings: query.Setup):
                 events.Location(locationId=e.stop_id, lat=e.lat, lng=e.lng).model_dump()
                 for e in sorted(stops.values(), key=lambda e: e.stop_id)
             ]
-            async with session.post(
-                str(network_url),
-                json=stops_req,
-                timeout=aiohttp.ClientTimeout(total=3600),
-            ) as resp:
-                await httputil.check_response(resp)
-                matrix = await resp.json()
-            network = Network()
-            for stop_a, row in zip(matrix["stops"], matrix["matrix"]):
-                for stop_b, distance in zip(matrix["stops"], row):
-                    if stop_a == stop_b:
-                        continue
-                    assert distance >= 0, (
-                        f"distance must not negative: {distance}, {stop_a} -> {stop_b}"
-                    )
-                    network.add_edge(stop_a, stop_b, distance / settings.mobility_speed)
+            key = network_cache.key(
+                str(network_url), stops_req, settings.mobility_speed
+            )
+            network = network_cache.load(key)
+            if network is None:
+                async with session.post(
+                    str(network_url),
+                    json=stops_req,
+                    timeout=aiohttp.ClientTimeout(total=3600),
+                ) as resp:
+                    await httputil.check_response(resp)
+                    matrix = await resp.json()
+                network = Network.from_matrix(
+                    matrix["stops"],
+                    np.asarray(matrix["matrix"], dtype=np.float64)
+                    / settings.mobility_speed,
+                )
+                network_cache.save(key, network)
         elif settings.network.filename:
             ref = settings.input_files[1]
             _, data = await file_table.pop(
                 session, filename=ref.filename, url=ref.fetch_url
             )
             matrix = json.loads(data)
-            network = Network()
-            for stop_a, row in zip(matrix["stops"], matrix["matrix"]):
-                for stop_b, distance in zip(matrix["stops"], row):
-                    if stop_a == stop_b:
-                        continue
-                    assert distance >= 0, (
-                        f"distance must not negative: {distance}, {stop_a} -> {stop_b}"
-                    )
-                    network.add_edge(stop_a, stop_b, distance / settings.mobility_speed)
+            network = Network.from_matrix(
+                matrix["stops"],
+                np.asarray(matrix["matrix"], dtype=np.float64)
+                / settings.mobility_speed,
+            )
         else:
             raise fastapi.HTTPException(
                 status_code=fastapi.status.HTTP_400_BAD_REQUEST,
@@ -126,6 +129,8 @@ async def setup(settings: query.Setup):
             )
 
     global sim
+    if sim:
+        sim.finish()
     sim = Simulation(
         start_time=datetime.datetime.strptime(
             settings.reference_time, "%Y%m%d"
@@ -137,6 +142,12 @@ async def setup(settings: query.Setup):
         max_delay_time=settings.max_delay_time,
         max_calculation_seconds=settings.max_calculation_seconds,
         max_calculation_stop_times_length=settings.max_calculation_stop_times_length,
+        enable_insertion=settings.enable_insertion,
+        solver_workers=settings.solver_workers,
+        skip_unreachable_cars=settings.skip_unreachable_cars,
+        ortools_time_limit=settings.ortools_time_limit,
+        ortools_guided_local_search=settings.ortools_guided_local_search,
+        ortools_warm_start=settings.ortools_warm_start,
         settings=[
             CarSetting(
                 mobility_id=mobility.mobility_id,
@@ -168,6 +179,18 @@ def step():
     return {"now": sim.step(), "events": sim.event_queue.events}
 
 
+@app.post("/advance", response_model=response.Advance)
+def advance(until: float | None = None):
+    now, next_, events_ = stepping.advance(
+        sim.peek, lambda: (sim.step(), sim.event_queue.events), sim.env.now, until
+    )
+    return {
+        "now": now,
+        "next": next_ if next_ < float("inf") else -1,
+        "events": events_,
+    }
+
+
 @app.post("/triggered")
 def triggered(event: query.TriggeredEvent | events.Event):
     # expect nothing to happen. just let time forward.
@@ -187,6 +210,12 @@ def triggered(event: query.TriggeredEvent | events.Event):
             sim.ready_to_depart(user_id=event.details.userId)
 
 
+@app.post("/triggered/batch")
+def triggered_batch(events_: list[query.TriggeredEvent | events.Event]):
+    for event in events_:
+        triggered(event)
+
+
 @app.get("/reservable", response_model=response.ReservableStatus)
 def reservable(org: str, dst: str):
     return {"reservable": sim.reservable(org, dst)}
@@ -195,6 +224,8 @@ def reservable(org: str, dst: str):
 @app.post("/finish", response_model=response.Message)
 def finish():
     global sim
+    if sim:
+        sim.finish()
     sim = None
     file_table.clear()
     return {"message": "successfully finished."}
@@ -1,10 +1,14 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
 import dataclasses
 import typing
 from datetime import date, datetime, timedelta
 from enum import Enum
 
+import numpy as np
+
 
 class EventType(str, Enum):
     DEPARTED = "DEPARTED"
@@ -53,12 +57,16 @@ class Service:
         self._weekday = [monday, tuesday, wednesday, thursday, friday, saturday, sunday]
         self._added_exceptions: list[date] = []
         self._removed_exceptions: list[date] = []
+        # operation days from self._first, compiled on the first lookup
+        self._first = start_date
+        self._days: bytearray | None = None
 
     def __repr__(self):
         weekday = "".join(str(int(e)) for e in self._weekday)
         return f"Service(start_day={self._start_day}, end_day={self._end_day}, weekday={weekday})"
 
     def append_exception(self, exception_date: date, added=True):
+        self._days = None
         if added:
             assert exception_date not in self._removed_exceptions
             self._added_exceptions.append(exception_date)
@@ -66,16 +74,32 @@ class Service:
             assert exception_date not in self._added_exceptions
             self._removed_exceptions.append(exception_date)
 
-    def is_operation(self, at: date):
-        if at in self._added_exceptions:
-            return True
-        if at in self._removed_exceptions:
-            return False
-
-        if self._start_day <= at <= self._end_day:
-            return self._weekday[at.weekday()]
+    def _compile(self):
+        """days of the operation from the first to the last date, including the exceptions"""
+        first = min([self._start_day, *self._added_exceptions])
+        last = max([self._end_day, *self._added_exceptions])
+        days = bytearray(max((last - first).days + 1, 0))
+        if self._start_day <= self._end_day:
+            start = (self._start_day - first).days
+            n = (self._end_day - self._start_day).days + 1
+            week = bytes(
+                bool(self._weekday[(self._start_day.weekday() + i) % 7])
+                for i in range(7)
+            )
+            days[start : start + n] = (week * (n // 7 + 1))[:n]
+        for exception_date in self._removed_exceptions:
+            if first <= exception_date <= last:
+                days[(exception_date - first).days] = 0
+        for exception_date in self._added_exceptions:
+            days[(exception_date - first).days] = 1
+        self._first = first
+        self._days = days
 
-        return False
+    def is_operation(self, at: date):
+        if self._days is None:
+            self._compile()
+        i = (at - self._first).days
+        return 0 <= i < len(self._days) and bool(self._days[i])
 
 
 class StopTime(typing.NamedTuple):
@@ -95,16 +119,122 @@ class Trip:
 
 
 class Network:
-    def __init__(self):
-        self._network = {}
+    """durations (in minutes) between stops
+
+    The durations are stored in a dense matrix indexed by the stops.
+    A missing edge is represented by NaN, and the duration from a stop to itself is zero."""
+
+    def __init__(self, stop_ids: typing.Iterable[str] = ()):
+        self._index: dict[str, int] = {}
+        self._matrix = np.full((0, 0), np.nan)
+        for stop_id in stop_ids:
+            self._add_stop(stop_id)
+
+    @classmethod
+    def from_matrix(cls, stop_ids: typing.Sequence[str], durations) -> Network:
+        """network from the durations between all pairs of the stops
+
+        The matrix is not copied if it is already a float64 array with a zero diagonal,
+        e.g. a memory-mapped array. A read-only matrix, e.g. loaded from the cache,
+        is copied on the first write by add_edge."""
+        matrix = np.asarray(durations, dtype=np.float64)
+        if matrix.shape != (len(stop_ids), len(stop_ids)):
+            raise ValueError(
+                f"matrix must be {len(stop_ids)}x{len(stop_ids)}: {matrix.shape}"
+            )
+        if np.diagonal(matrix).any():
+            matrix = matrix.copy()
+            np.fill_diagonal(matrix, 0.0)
+        if (matrix < 0).any():
+            a, b = np.argwhere(matrix < 0)[0]
+            raise ValueError(
+                f"duration must not negative: {matrix[a, b]}, {stop_ids[a]} -> {stop_ids[b]}"
+            )
+        network = cls()
+        network._index = {stop_id: i for i, stop_id in enumerate(stop_ids)}
+        if len(network._index) != len(stop_ids):
+            raise ValueError("stop ids must be unique")
+        network._matrix = matrix
+        return network
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def stop_ids(self) -> list[str]:
+        return list(self._index)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """durations between all pairs of the stops, in the order of stop_ids"""
+        return self._matrix[: len(self), : len(self)]
+
+    def _add_stop(self, stop_id: str) -> int:
+        if (i := self._index.get(stop_id)) is not None:
+            return i
+        i = self._index[stop_id] = len(self._index)
+        if i == len(self._matrix):
+            # grow geometrically so that adding edges one by one takes amortized constant time
+            matrix = np.full((max(2 * i, 16),) * 2, np.nan)
+            matrix[:i, :i] = self._matrix
+            self._matrix = matrix
+        self._matrix[i, i] = 0.0
+        return i
 
     def add_edge(self, a: str, b: str, duration: float, with_rev=False):
-        self._network[(a, b)] = duration
+        i, j = self._add_stop(a), self._add_stop(b)
+        if not self._matrix.flags.writeable:
+            self._matrix = self._matrix.copy()
+        self._matrix[i, j] = duration
         if with_rev:
-            self._network[(b, a)] = duration
+            self._matrix[j, i] = duration
+
+    def index(self, stop_id: str) -> int:
+        return self._index[stop_id]
+
+    def indices(self, stop_ids: typing.Iterable[str]) -> np.ndarray:
+        return np.fromiter((self._index[e] for e in stop_ids), dtype=np.intp)
 
     def duration(self, a: str, b: str):
-        return self._network[(a, b)] if a != b else 0.0
+        if a == b:
+            return 0.0
+        duration = self._matrix[self._index[a], self._index[b]]
+        if np.isnan(duration):
+            raise KeyError((a, b))
+        return float(duration)
+
+    def durations(
+        self, origins: typing.Iterable[str], destinations: typing.Iterable[str]
+    ) -> np.ndarray:
+        """matrix of the durations from each of the origins (rows) to each of the destinations (columns)"""
+        durations = self._matrix[
+            np.ix_(self.indices(origins), self.indices(destinations))
+        ]
+        self._check(durations)
+        return durations
+
+    def row(self, origin: str, destinations: typing.Iterable[str]) -> np.ndarray:
+        """durations from the origin to each of the destinations"""
+        durations = self._matrix[self._index[origin], self.indices(destinations)]
+        self._check(durations)
+        return durations
+
+    def column(self, origins: typing.Iterable[str], destination: str) -> np.ndarray:
+        """durations from each of the origins to the destination"""
+        durations = self._matrix[self.indices(origins), self._index[destination]]
+        self._check(durations)
+        return durations
+
+    def path(self, stop_ids: typing.Iterable[str]) -> np.ndarray:
+        """durations of the legs between the consecutive stops"""
+        indices = self.indices(stop_ids)
+        durations = self._matrix[indices[:-1], indices[1:]]
+        self._check(durations)
+        return durations
+
+    def _check(self, durations: np.ndarray):
+        if np.isnan(durations).any():
+            raise KeyError("missing edges in the network")
 
 
 @dataclasses.dataclass(frozen=True)
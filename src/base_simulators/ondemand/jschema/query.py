@@ -27,6 +27,14 @@ class Setup(BaseModel):
     input_files: list[InputFilesItem] = Field(..., min_items=1, max_items=2)
     network: InputFilesItem
     enable_ortools: bool = True
+    enable_insertion: bool = False  # insert new users into the current schedules
+    solver_workers: int = Field(0, ge=0)  # processes to find routes of cars in parallel
+    # skip the cars which cannot reach the user in time even directly,
+    # only valid if the durations of the network satisfy the triangle inequality
+    skip_unreachable_cars: bool = False
+    ortools_time_limit: float = Field(10.0, gt=0)  # [sec] for each car and request
+    ortools_guided_local_search: bool = False  # search beyond local optima
+    ortools_warm_start: bool = True  # start the search from the current schedule
     board_time: float | None
     max_delay_time: float | None
     mobility_speed: float = 20.0 * 1000 / 60  # [m/min]
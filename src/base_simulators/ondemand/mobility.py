@@ -2,14 +2,17 @@
 # SPDX-License-Identifier: Apache-2.0
 from __future__ import annotations
 
+import concurrent.futures
 import dataclasses
 import functools
 import itertools
 import logging
+import pickle
 import time
 import typing
 from datetime import datetime, timedelta
 
+import numpy as np
 import simpy
 from core import Mobility, Network, Stop, Trip, User
 from event import EventQueue
@@ -63,7 +66,330 @@ class OnOff:
     off: User | None = None
 
 
-class Car(Mobility):
+class RouteSearch:
+    """route search of a car, on the live car or on its snapshot
+
+    subclasses provide the state of the car: network, capacity, board_time, max_delay_time,
+    passengers, reserved_users (not on board yet), stop, moving, now, start_time,
+    window() and _pending_route()."""
+
+    def origin(self, start_window: datetime) -> StopTime:
+        """stop and time where a new route starts"""
+        if to := self.moving:
+            # If on moving, set to the next stop and time.
+            return StopTime(stop=to.stop, departure=to.arrival)
+        # If not on moving, set to the current stop and time (or wait till start time).
+        return StopTime(stop=self.stop, departure=max(self.now, start_window))
+
+    def travel_time(self, a: Stop, b: Stop) -> timedelta:
+        return timedelta(minutes=self.network.duration(a.stop_id, b.stop_id))
+
+    def elapsed_secs(self, date_time: datetime):
+        return int((date_time - self.start_time).total_seconds())
+
+    def may_serve(self, user: User) -> bool:
+        """whether the car may serve the user in time, with the lower bound of the arrival time
+
+        The lower bound is that the car goes directly to the user from the stop where a new route starts,
+        assuming that the durations of the network satisfy the triangle inequality."""
+        start_window, end_window = self.window()
+        if start_window is None:
+            return False
+        origin = self.origin(start_window)
+        pickup = max(
+            origin.departure + self.travel_time(origin.stop, user.org),
+            user.desired_dept,
+        )
+        # margin for the durations rounded off to seconds by OR-Tools
+        arrival = pickup + self.travel_time(user.org, user.dst) - timedelta(minutes=1)
+        return arrival <= min(
+            end_window,
+            user.desired_dept + user.ideal_duration + self.max_delay_time,
+        )
+
+    def solve_new_route(
+        self,
+        new_user: User,
+        time_limit: float = 10.0,
+        guided_local_search=False,
+        warm_start=True,
+    ) -> Route | None:
+        """find the route with OR-Tools
+
+        With warm start, the search starts from the current schedule with the new user inserted, if any.
+        With guided local search, the search escapes from local optima until the time limit [sec]
+        or until the improvement of the solutions slows down."""
+        window_start, window_end = self.window()
+        if window_start is None and window_end is None:
+            return None
+
+        depot = (
+            self.moving.stop if self.moving else self.stop
+        )  # either current stop or in-transit stop
+        node_locations = [depot]
+        demands = [
+            len(self.passengers)
+        ]  # Treat the passengers as if they are picked up at the depot.
+        node_onoff: list[OnOff | None] = [None]
+        # Users who haven't boarded yet are considered as two unique nodes each (pickup and delivery).
+        # Passengers already onboard are considered as a single unique node (delivery only).
+        for user in self.passengers:
+            node_locations.append(user.dst)
+            demands.append(-1)  # delivery
+            node_onoff.append(OnOff(off=user))
+        users = (*self.reserved_users, new_user)
+        for user in users:
+            node_locations += [user.org, user.dst]
+            demands += [1, -1]  # pickup and delivery
+            node_onoff += [OnOff(on=user), OnOff(off=user)]
+
+        # Create the routing index manager.
+        manager = pywrapcp.RoutingIndexManager(
+            len(node_locations),
+            1,  # num mobilities
+            0,  # depot
+        )
+
+        # Create Routing Model.
+        routing = pywrapcp.RoutingModel(manager)
+
+        # Define cost of each arc, in seconds between the nodes.
+        stop_ids = [e.stop_id for e in node_locations]
+        durations = (self.network.durations(stop_ids, stop_ids) * 60).astype(np.int64)
+        transit_callback_index = routing.RegisterTransitMatrix(durations.tolist())
+        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+        # Add Distance constraint.
+        dimension_name = "Time"
+        routing.AddDimension(
+            transit_callback_index,
+            60 * 60 * 24,  # slack time (1 day)
+            self.elapsed_secs(
+                window_end
+            ),  # must return to the depot within operating hours
+            False,
+            dimension_name,
+        )
+        time_dimension = routing.GetDimensionOrDie(dimension_name)
+
+        # Determine the route start time based on the vehicle's current state.
+        # If the vehicle is already moving, use its scheduled arrival time as the start time.
+        # Otherwise, use the current time if it is after the time window start;
+        # if not, use the window start time to ensure the route does not begin too early.
+        if to := self.moving:
+            start_time = to.arrival
+        else:
+            now = self.now
+            start_time = max(window_start, now)
+        time_dimension.CumulVar(routing.Start(0)).SetValue(
+            self.elapsed_secs(start_time)
+        )
+
+        for dst_node, user in enumerate(self.passengers, start=1):
+            dst_index = manager.NodeToIndex(dst_node)
+            time_dimension.CumulVar(dst_index).SetRange(
+                self.elapsed_secs(user.desired_dept + user.ideal_duration),
+                self.elapsed_secs(
+                    user.desired_dept + user.ideal_duration + self.max_delay_time
+                ),
+            )
+
+        for i, user in enumerate(users):
+            org_node = 1 + len(self.passengers) + 2 * i
+            org_index = manager.NodeToIndex(org_node)
+            dst_index = manager.NodeToIndex(org_node + 1)
+
+            # Time window constraint
+            time_dimension.CumulVar(org_index).SetRange(
+                self.elapsed_secs(user.desired_dept),
+                self.elapsed_secs(user.desired_dept + self.max_delay_time),
+            )
+            time_dimension.CumulVar(dst_index).SetRange(
+                self.elapsed_secs(user.desired_dept + user.ideal_duration),
+                self.elapsed_secs(
+                    user.desired_dept + user.ideal_duration + self.max_delay_time
+                ),
+            )
+
+            # Define Transportation Requests.
+            routing.AddPickupAndDelivery(org_index, dst_index)
+            routing.solver().Add(
+                time_dimension.CumulVar(org_index) <= time_dimension.CumulVar(dst_index)
+            )
+
+        # Define pickup-delivery demands
+        demand_callback_index = routing.RegisterUnaryTransitCallback(
+            lambda index: demands[manager.IndexToNode(index)]
+        )
+
+        routing.AddDimensionWithVehicleCapacity(
+            demand_callback_index,
+            0,  # null capacity slack
+            [self.capacity],  # vehicle maximum capacities
+            True,  # start cumul to zero
+            "Capacity",
+        )
+
+        assert len(node_locations) == manager.GetNumberOfNodes() == len(demands), (
+            "Mismatch found, It might be a bug."
+        )
+
+        # Instantiate route start and end times to produce feasible times.
+        routing.AddVariableMinimizedByFinalizer(
+            time_dimension.CumulVar(routing.Start(0))
+        )
+        routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.End(0)))
+
+        # Setting first solution heuristic.
+        search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+        search_parameters.first_solution_strategy = (
+            routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
+        )
+
+        if guided_local_search:
+            search_parameters.local_search_metaheuristic = (
+                routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+            )
+            # stop when the improvements get rare
+            search_parameters.improvement_limit_parameters.improvement_rate_coefficient = 1.0
+            search_parameters.improvement_limit_parameters.improvement_rate_solutions_distance = 10
+
+        # Add time limit
+        search_parameters.time_limit.FromMilliseconds(int(time_limit * 1000))
+
+        # Solve the problem, from the initial route if it is feasible.
+        initial = None
+        if (
+            warm_start
+            and (nodes := self._initial_nodes(new_user, node_onoff)) is not None
+        ):
+            routing.CloseModelWithParameters(search_parameters)
+            initial = routing.ReadAssignmentFromRoutes(
+                [[manager.NodeToIndex(node) for node in nodes]], True
+            )
+        if initial:
+            solution = routing.SolveFromAssignmentWithParameters(
+                initial, search_parameters
+            )
+        else:
+            solution = routing.SolveWithParameters(search_parameters)
+
+        if not solution:
+            return None
+
+        route = []
+        current = routing.Start(0)
+        current = solution.Value(routing.NextVar(current))
+        while not routing.IsEnd(current):
+            node = manager.IndexToNode(current)
+            location = node_locations[node]
+            onoff = node_onoff[node]
+
+            if onoff.on:
+                route.append(StopTime(stop=location, on=[onoff.on]))
+            if onoff.off:
+                route.append(StopTime(stop=location, off=[onoff.off]))
+            if routing.IsEnd(current):
+                break
+            current = solution.Value(routing.NextVar(current))
+
+        return Route(route)
+
+    def _initial_nodes(
+        self, new_user: User, node_onoff: list[OnOff | None]
+    ) -> list[int] | None:
+        """nodes of the current schedule with the new user inserted, to start the search"""
+        if (route := self._pending_route()) is None:
+            return None
+        start_window, end_window = self.window()
+        route = Insertion(self, route, start_window, end_window).best(new_user)
+        if route is None:
+            return None
+        pickups = {
+            onoff.on.user_id: node
+            for node, onoff in enumerate(node_onoff)
+            if onoff and onoff.on
+        }
+        dropoffs = {
+            onoff.off.user_id: node
+            for node, onoff in enumerate(node_onoff)
+            if onoff and onoff.off
+        }
+        nodes = []
+        for stop_time in route.stop_times:
+            nodes += [dropoffs.get(user.user_id) for user in stop_time.off]
+            nodes += [pickups.get(user.user_id) for user in stop_time.on]
+        # every node except the depot must be visited once
+        if None in nodes or sorted(nodes) != list(range(1, len(node_onoff))):
+            return None
+        return nodes
+
+    def routes_appended_new_user(
+        self, user: User, timeout_seconds: int = 30, max_stop_time_length: int = 20
+    ):
+        watchdog = TimeoutWatchDog(limit_seconds=float(timeout_seconds))
+        routes = [
+            Route(
+                stop_times=[
+                    StopTime(stop=passenger.dst, off=[passenger])
+                    for passenger in passengers
+                ]
+            )
+            for passengers in itertools.permutations(self.passengers)
+        ]
+        for user_ in (
+            *self.reserved_users,
+            user,
+        ):
+            new_routes = []
+            for route in routes:
+                if watchdog.limit_exceeded():
+                    logger.warning(
+                        f"abort calculation for appending a new user={user.user_id} to the car={self}: elapsed more than {watchdog.limit_seconds} seconds",
+                    )
+                    return []
+
+                for i, k in itertools.combinations_with_replacement(
+                    range(len(route.stop_times) + 1), 2
+                ):
+                    stop_times = [
+                        StopTime(
+                            stop=stop_time.stop, on=stop_time.on, off=stop_time.off
+                        )
+                        for stop_time in route.stop_times
+                    ]
+                    stop_times.insert(k, StopTime(stop=user_.dst, off=[user_]))
+                    stop_times.insert(i, StopTime(stop=user_.org, on=[user_]))
+
+                    r = Route(stop_times)
+                    # exclude the duplicated pattern
+                    if r in new_routes:
+                        continue
+                    # exclude the obviously inefficient pattern
+                    if r.inefficient(self.passengers):
+                        continue
+                    # exclude the pattern that exceeds capacity
+                    if len(self.passengers) + r.max_passengers > self.capacity:
+                        continue
+                    # exclude the pattern that exceeds max delay
+                    if any(
+                        value > self.max_delay_time
+                        for value in Evaluation(self, r).values
+                    ):
+                        continue
+                    if len(r.stop_times) > max_stop_time_length:
+                        logger.debug(
+                            f"skip a route for appending a new user={user.user_id} to the car={self}: exceeded max stop times length={max_stop_time_length}."
+                        )
+                        continue
+                    new_routes.append(r)
+
+            routes = list(new_routes)
+
+        return routes
+
+
+class Car(Mobility, RouteSearch):
     """On-Demand Bus
 
     mobility that transport multiple users from a stop to another stop and operate to meet their requests.
@@ -134,7 +460,7 @@ class Car(Mobility):
 
     @property
     def reserved_users(self):
-        return (self._reserved_users | self._waiting_users).values()
+        return (self._waiting_users | self._reserved_users).values()
 
     @property
     def waiting_users(self):
@@ -152,10 +478,22 @@ class Car(Mobility):
     def board_time(self):
         return self._board_time
 
+    @property
+    def max_delay_time(self):
+        return self._max_delay_time
+
     @property
     def moving(self):
         return self.schedule.current if not self.stop else None
 
+    @property
+    def now(self):
+        return self.env.datetime_now
+
+    @property
+    def start_time(self):
+        return self.env.start_time
+
     @property
     def waiting_until_scheduled(self):
         return bool(self._wait_until_scheduled and self._wait_until_scheduled.is_alive)
@@ -257,237 +595,66 @@ class Car(Mobility):
 
         self.env.process(self.arrived())
 
-    def solve_new_route(self, new_user: User) -> Route | None:
-        node_locations = []
-        demands = []
-        node_onoff = []
-
-        # Create the routing index manager.
-        manager = pywrapcp.RoutingIndexManager(
-            # Users who haven't boarded yet are considered as two unique nodes each (pickup and delivery).
-            # Passengers already onboard are considered as a single unique node (delivery only).
-            len(self.reserved_users) * 2 + len(self.passengers) + 2 + 1,
-            1,  # num mobilities
-            0,  # depot
+    def state(self, with_route=False) -> CarState:
+        """snapshot of the car to find new routes
+
+        with the pending route of the current schedule to warm-start OR-Tools if with_route."""
+        return CarState(
+            mobility_id=self.mobility_id,
+            network=self.network,
+            capacity=self.capacity,
+            board_time=self._board_time,
+            max_delay_time=self._max_delay_time,
+            passengers=tuple(self.passengers),
+            reserved_users=tuple(self.reserved_users),
+            stop=self.stop,
+            moving=StopTime(stop=to.stop, arrival=to.arrival)
+            if (to := self.moving)
+            else None,
+            now=self.env.datetime_now,
+            start_time=self.env.start_time,
+            window_=self.window(),
+            route=self._pending_route() if with_route else None,
         )
 
-        # Create Routing Model.
-        routing = pywrapcp.RoutingModel(manager)
-
-        depot = (
-            self.moving.stop if self.moving else self.stop
-        )  # either current stop or in-transit stop
-        node_locations.append(depot)
-        demands.append(
-            len(self.passengers)
-        )  # Treat the passengers as if they are picked up at the depot.
-        node_onoff.append(None)
-
-        # Define cost of each arc.
-        def callback(from_index, to_index):
-            # Convert from routing variable Index to location ID.
-            from_loc = node_locations[manager.IndexToNode(from_index)]
-            to_loc = node_locations[manager.IndexToNode(to_index)]
-            duration = self.network.duration(from_loc.stop_id, to_loc.stop_id)
-            return int(duration * 60)
-
-        transit_callback_index = routing.RegisterTransitCallback(callback)
-        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-        window_start, window_end = self.window()
-        if window_start is None and window_end is None:
+    def route_inserted_new_user(self, user: User) -> Route | None:
+        """find the best route inserting the new user into the current schedule"""
+        start_window, end_window = self.window()
+        if start_window is None:
             return None
-
-        # Add Distance constraint.
-        dimension_name = "Time"
-        routing.AddDimension(
-            transit_callback_index,
-            60 * 60 * 24,  # slack time (1 day)
-            self.env.elapsed_secs(
-                window_end
-            ),  # must return to the depot within operating hours
-            False,
-            dimension_name,
-        )
-        time_dimension = routing.GetDimensionOrDie(dimension_name)
-
-        # Determine the route start time based on the vehicle's current state.
-        # If the vehicle is already moving, use its scheduled arrival time as the start time.
-        # Otherwise, use the current time if it is after the time window start;
-        # if not, use the window start time to ensure the route does not begin too early.
-        if to := self.moving:
-            start_time = to.arrival
-        else:
-            now = self.env.datetime_now
-            start_time = max(window_start, now)
-        time_dimension.CumulVar(routing.Start(0)).SetValue(
-            self.env.elapsed_secs(start_time)
-        )
-
-        for user in self.passengers:
-            dst_node = len(node_locations)
-            dst_index = manager.NodeToIndex(dst_node)
-            node_locations.append(user.dst)
-            demands.append(-1)  # delivery
-            node_onoff.append(OnOff(off=user))
-            time_dimension.CumulVar(dst_index).SetRange(
-                self.env.elapsed_secs(user.desired_dept + user.ideal_duration),
-                self.env.elapsed_secs(
-                    user.desired_dept + user.ideal_duration + self._max_delay_time
-                ),
-            )
-
-        for user in (
-            self._waiting_users | self._reserved_users | {new_user.user_id: new_user}
-        ).values():
-            org_node = len(node_locations)
-            org_index = manager.NodeToIndex(org_node)
-            node_locations.append(user.org)
-            demands.append(1)  # pickup
-            node_onoff.append(OnOff(on=user))
-
-            dst_node = len(node_locations)
-            dst_index = manager.NodeToIndex(dst_node)
-            node_locations.append(user.dst)
-            demands.append(-1)  # delivery
-            node_onoff.append(OnOff(off=user))
-
-            # Time window constraint
-            time_dimension.CumulVar(org_index).SetRange(
-                self.env.elapsed_secs(user.desired_dept),
-                self.env.elapsed_secs(user.desired_dept + self._max_delay_time),
-            )
-            time_dimension.CumulVar(dst_index).SetRange(
-                self.env.elapsed_secs(user.desired_dept + user.ideal_duration),
-                self.env.elapsed_secs(
-                    user.desired_dept + user.ideal_duration + self._max_delay_time
-                ),
-            )
-
-            # Define Transportation Requests.
-            routing.AddPickupAndDelivery(org_index, dst_index)
-            routing.solver().Add(
-                time_dimension.CumulVar(org_index) <= time_dimension.CumulVar(dst_index)
-            )
-
-        # Define pickup-delivery demands
-        demand_callback_index = routing.RegisterUnaryTransitCallback(
-            lambda index: demands[manager.IndexToNode(index)]
-        )
-
-        routing.AddDimensionWithVehicleCapacity(
-            demand_callback_index,
-            0,  # null capacity slack
-            [self.capacity],  # vehicle maximum capacities
-            True,  # start cumul to zero
-            "Capacity",
-        )
-
-        assert len(node_locations) == manager.GetNumberOfNodes() == len(demands), (
-            "Mismatch found, It might be a bug."
-        )
-
-        # Instantiate route start and end times to produce feasible times.
-        routing.AddVariableMinimizedByFinalizer(
-            time_dimension.CumulVar(routing.Start(0))
+        if (route := self._pending_route()) is not None:
+            return Insertion(self, route, start_window, end_window).best(user)
+        # the current schedule does not cover all the users (e.g. not scheduled yet)
+        return min(
+            self.routes_appended_new_user(user),
+            key=lambda r: Evaluation(self, r).value,
+            default=None,
         )
-        routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.End(0)))
 
-        # Setting first solution heuristic.
-        search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-        search_parameters.first_solution_strategy = (
-            routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
+    def _pending_route(self) -> Route | None:
+        """route of the current schedule for the users not yet picked up or dropped off"""
+        reserved = set(self.reserved_users)
+        users = set(self.users)
+        current = [self.schedule.current] if self.schedule.current else []
+        route = Route(
+            [
+                StopTime(
+                    stop=stop_time.stop,
+                    on=[e for e in stop_time.on if e in reserved],
+                    off=[e for e in stop_time.off if e in users],
+                )
+                for stop_time in current + list(self.schedule.stop_times)
+                if set(stop_time.on) & reserved or set(stop_time.off) & users
+            ]
         )
-
-        # Add time limit
-        search_parameters.time_limit.FromSeconds(10)
-
-        # Solve the problem.
-        solution = routing.SolveWithParameters(search_parameters)
-
-        if not solution:
-            return None
-
-        route = []
-        current = routing.Start(0)
-        current = solution.Value(routing.NextVar(current))
-        while not routing.IsEnd(current):
-            node = manager.IndexToNode(current)
-            location = node_locations[node]
-            onoff = node_onoff[node]
-
-            if onoff.on:
-                route.append(StopTime(stop=location, on=[onoff.on]))
-            if onoff.off:
-                route.append(StopTime(stop=location, off=[onoff.off]))
-            if routing.IsEnd(current):
-                break
-            current = solution.Value(routing.NextVar(current))
-
-        return Route(route)
-
-    def routes_appended_new_user(
-        self, user: User, timeout_seconds: int = 30, max_stop_time_length: int = 20
-    ):
-        watchdog = TimeoutWatchDog(limit_seconds=float(timeout_seconds))
-        routes = [
-            Route(
-                stop_times=[
-                    StopTime(stop=passenger.dst, off=[passenger])
-                    for passenger in passengers
-                ]
-            )
-            for passengers in itertools.permutations(self.passengers)
-        ]
-        for user_ in (
-            self._waiting_users | self._reserved_users | {user.user_id: user}
-        ).values():
-            new_routes = []
-            for route in routes:
-                if watchdog.limit_exceeded():
-                    logger.warning(
-                        f"abort calculation for appending a new user={user.user_id} to the car={self}: elapsed more than {watchdog.limit_seconds} seconds",
-                    )
-                    return []
-
-                for i, k in itertools.combinations_with_replacement(
-                    range(len(route.stop_times) + 1), 2
-                ):
-                    stop_times = [
-                        StopTime(
-                            stop=stop_time.stop, on=stop_time.on, off=stop_time.off
-                        )
-                        for stop_time in route.stop_times
-                    ]
-                    stop_times.insert(k, StopTime(stop=user_.dst, off=[user_]))
-                    stop_times.insert(i, StopTime(stop=user_.org, on=[user_]))
-
-                    r = Route(stop_times)
-                    # exclude the duplicated pattern
-                    if r in new_routes:
-                        continue
-                    # exclude the obviously inefficient pattern
-                    if r.inefficient(self.passengers):
-                        continue
-                    # exclude the pattern that exceeds capacity
-                    if len(self.passengers) + r.max_passengers > self.capacity:
-                        continue
-                    # exclude the pattern that exceeds max delay
-                    if any(
-                        value > self._max_delay_time
-                        for value in Evaluation(self, r).values
-                    ):
-                        continue
-                    if len(r.stop_times) > max_stop_time_length:
-                        logger.debug(
-                            f"skip a route for appending a new user={user.user_id} to the car={self}: exceeded max stop times length={max_stop_time_length}."
-                        )
-                        continue
-                    new_routes.append(r)
-
-            routes = list(new_routes)
-
-        return routes
+        on = [user.user_id for e in route.stop_times for user in e.on]
+        off = [user.user_id for e in route.stop_times for user in e.off]
+        # every user must be picked up (unless on board) and dropped off only once
+        if sorted(on) == sorted(e.user_id for e in reserved) and sorted(off) == sorted(
+            e.user_id for e in users
+        ):
+            return route
+        return None
 
     def reserve(self, user: User, schedule: list[StopTime]):
         # Ensure that the user has not already reserved
@@ -531,6 +698,42 @@ class Car(Mobility):
         return None, None
 
 
+@dataclasses.dataclass(frozen=True)
+class CarState(RouteSearch):
+    """snapshot of a car to find new routes, which can be sent to worker processes"""
+
+    mobility_id: str
+    network: Network | None
+    capacity: int
+    board_time: timedelta
+    max_delay_time: timedelta
+    passengers: tuple[User, ...]
+    reserved_users: tuple[User, ...]  # users not on board yet
+    stop: Stop | None
+    moving: StopTime | None
+    now: datetime
+    start_time: datetime
+    window_: tuple[datetime | None, datetime | None]
+    route: Route | None = None  # pending route of the current schedule
+
+    def __str__(self):
+        reserved = [e.user_id for e in self.reserved_users]
+        passenger = [e.user_id for e in self.passengers]
+        return f"Car[{self.mobility_id}] with users({reserved=}, {passenger=})"
+
+    def users_by_id(self, *users: User) -> dict[str, User]:
+        return {
+            e.user_id: e
+            for e in itertools.chain(self.passengers, self.reserved_users, users)
+        }
+
+    def window(self) -> tuple[datetime | None, datetime | None]:
+        return self.window_
+
+    def _pending_route(self) -> Route | None:
+        return self.route
+
+
 class Route:
     def __init__(self, stop_times: list[StopTime]):
         def _normalize(a: list[StopTime], b: StopTime):
@@ -538,6 +741,36 @@ class Route:
 
         self.stop_times = functools.reduce(_normalize, stop_times, [])
 
+    def user_ids(self) -> list[tuple[list[str], list[str]]]:
+        """users getting on/off at each stop to send the route across processes"""
+        return [
+            ([e.user_id for e in stop_time.on], [e.user_id for e in stop_time.off])
+            for stop_time in self.stop_times
+        ]
+
+    @classmethod
+    def from_user_ids(
+        cls, user_ids: list[tuple[list[str], list[str]]], users: dict[str, User]
+    ):
+        return cls(
+            [
+                StopTime(
+                    stop=users[on[0]].org if on else users[off[0]].dst,
+                    on=[users[e] for e in on],
+                    off=[users[e] for e in off],
+                )
+                for on, off in user_ids
+            ]
+        )
+
+    def copy(self):
+        return Route(
+            [
+                StopTime(stop=e.stop, on=list(e.on), off=list(e.off))
+                for e in self.stop_times
+            ]
+        )
+
     def __eq__(self, other):
         if not isinstance(other, Route):
             return False
@@ -582,6 +815,13 @@ class StopTime:
             )
         )
 
+    def departure_from(self, arrival: datetime, board_time: timedelta) -> datetime:
+        """departure time after the users get on/off, but not before they are ready"""
+        return max(
+            [arrival + board_time * bool(self.off) + board_time * bool(self.on)]
+            + [user.desired_dept + board_time for user in self.on]
+        )
+
     def __add__(self, other: StopTime):
         assert self.stop is other.stop, (self.stop, other.stop)
         return StopTime(
@@ -603,33 +843,18 @@ class Evaluation:
         if start_window is None:
             return
 
-        if to := self.car.moving:
-            # If on moving, set to the next stop and time.
-            previous = StopTime(stop=to.stop, departure=to.arrival)
-        else:
-            # If not on moving, set to the current stop and time.
-            now = self.car.env.datetime_now
-            if now >= start_window:
-                previous = StopTime(stop=car.stop, departure=now)
-            else:
-                # wait till start time
-                previous = StopTime(stop=car.stop, departure=start_window)
-
-        for previous_stop_time, stop_time in zip(
-            [previous] + plan.stop_times, plan.stop_times
+        previous = car.origin(start_window)
+        durations = car.network.path(
+            e.stop.stop_id for e in [previous] + plan.stop_times
+        )
+        for previous_stop_time, stop_time, duration in zip(
+            [previous] + plan.stop_times, plan.stop_times, durations.tolist()
         ):
             stop_time.arrival = previous_stop_time.departure + timedelta(
-                minutes=self.car.network.duration(
-                    previous_stop_time.stop.stop_id, stop_time.stop.stop_id
-                )
+                minutes=duration
             )
-            stop_time.departure = max(
-                [
-                    stop_time.arrival
-                    + self.car.board_time * bool(stop_time.off)
-                    + self.car.board_time * bool(stop_time.on)
-                ]
-                + [user.desired_dept + self.car.board_time for user in stop_time.on]
+            stop_time.departure = stop_time.departure_from(
+                stop_time.arrival, self.car.board_time
             )
 
         if plan.stop_times[-1].arrival <= end_window:
@@ -647,6 +872,180 @@ class Evaluation:
         return self.value < other.value
 
 
+class Insertion:
+    """insertion of a new user into the route of a car
+
+    caches the arrival times and the slack times of the route,
+    so that each position to insert can be checked without evaluating the whole route.
+    """
+
+    def __init__(
+        self, car: Car, route: Route, start_window: datetime, end_window: datetime
+    ):
+        self.car = car
+        self.stop_times = route.stop_times
+        self.origin = car.origin(start_window)
+        self.end_window = end_window
+        self._index = {id(e): i for i, e in enumerate(self.stop_times)}
+
+        self.arrivals: list[datetime] = []
+        self.departures: list[datetime] = []
+        self.loads: list[int] = []  # number of passengers after the departure
+        self.delays: list[timedelta] = []  # delays of the users getting off
+        self.deadlines: list[datetime] = []
+        previous, departure = self.origin.stop, self.origin.departure
+        load = len(car.passengers)
+        for stop_time in self.stop_times:
+            arrival = departure + car.travel_time(previous, stop_time.stop)
+            departure = stop_time.departure_from(arrival, car.board_time)
+            load += len(stop_time.on) - len(stop_time.off)
+            self.arrivals.append(arrival)
+            self.departures.append(departure)
+            self.loads.append(load)
+            self.delays.append(self._delay(stop_time, arrival))
+            self.deadlines.append(self._deadline(stop_time))
+            previous = stop_time.stop
+
+        # total delays from each stop to the end of the route
+        self.suffix_delays = list(
+            itertools.accumulate(reversed(self.delays), initial=timedelta())
+        )[::-1]
+        # how long the arrival can be delayed without violating the following deadlines
+        self.slacks: list[timedelta] = [timedelta()] * len(self.stop_times)
+        slack = None
+        for i in reversed(range(len(self.stop_times))):
+            margin = self.deadlines[i] - self.arrivals[i]
+            if slack is not None:
+                # a delay within the waiting time does not affect the following stops
+                wait = self.departures[i] - (
+                    self.arrivals[i]
+                    + car.board_time * bool(self.stop_times[i].off)
+                    + car.board_time * bool(self.stop_times[i].on)
+                )
+                margin = min(margin, wait + slack)
+            self.slacks[i] = slack = margin
+
+    def _delay(self, stop_time: StopTime, arrival: datetime) -> timedelta:
+        return sum(
+            (
+                arrival - user.desired_dept + self.car.board_time - user.ideal_duration
+                for user in stop_time.off
+            ),
+            timedelta(),
+        )
+
+    def _deadline(self, stop_time: StopTime) -> datetime:
+        # the latest arrival to keep the delays within the max delay time
+        return min(
+            [self.end_window]
+            + [
+                user.desired_dept
+                + user.ideal_duration
+                + self.car.max_delay_time
+                - self.car.board_time
+                for user in stop_time.off
+            ]
+        )
+
+    def best(self, user: User) -> Route | None:
+        """route with the minimum total delay in all the positions to insert the user"""
+        capacity = self.car.capacity
+        size = len(self.stop_times)
+        best: tuple[timedelta, Route] | None = None
+        for i in range(size + 1):
+            if (self.loads[i - 1] if i else len(self.car.passengers)) + 1 > capacity:
+                continue
+            for k in range(i, size + 1):
+                # the user is on board while passing the stops between the pickup and the dropoff
+                if k > i and self.loads[k - 1] + 1 > capacity:
+                    break
+                route = Route(
+                    self.stop_times[:i]
+                    + [StopTime(stop=user.org, on=[user])]
+                    + self.stop_times[i:k]
+                    + [StopTime(stop=user.dst, off=[user])]
+                    + self.stop_times[k:]
+                )
+                delay = self._total_delay(route, user)
+                if delay is not None and (best is None or delay < best[0]):
+                    best = delay, route
+        return best[1].copy() if best else None
+
+    def _total_delay(self, route: Route, user: User) -> timedelta | None:
+        """total delay of the route, or None if infeasible"""
+        stop_times = route.stop_times
+        # the stops before the insertion are not changed
+        start = next(
+            (
+                i
+                for i, (a, b) in enumerate(zip(stop_times, self.stop_times))
+                if a is not b
+            ),
+            len(self.stop_times),
+        )
+        end = next(i for i, e in enumerate(stop_times) if user in e.off)
+        if start:
+            previous = stop_times[start - 1].stop
+            departure = self.departures[start - 1]
+            load = self.loads[start - 1]
+        else:
+            previous, departure = self.origin.stop, self.origin.departure
+            load = len(self.car.passengers)
+        total = self.suffix_delays[0] - self.suffix_delays[start]
+
+        for c in range(start, len(stop_times)):
+            stop_time = stop_times[c]
+            arrival = departure + self.car.travel_time(previous, stop_time.stop)
+            j = self._index.get(id(stop_time))
+            if c > end:
+                # the rest of the route is shifted by the delay
+                shift = arrival - self.arrivals[j]
+                if shift > self.slacks[j]:
+                    return None
+                if not shift:
+                    return total + self.suffix_delays[j]
+            else:
+                load += len(stop_time.on) - len(stop_time.off)
+                if load > self.car.capacity:
+                    return None
+                deadline = (
+                    self.deadlines[j] if j is not None else self._deadline(stop_time)
+                )
+                if arrival > deadline:
+                    return None
+            total += self._delay(stop_time, arrival)
+            departure = stop_time.departure_from(arrival, self.car.board_time)
+            previous = stop_time.stop
+        return total
+
+
+_network: Network | None = None
+
+
+def _importable() -> bool:
+    """whether the car states can be sent to worker processes
+
+    They are pickled by reference to the modules, which cannot be imported by name
+    when the simulator is loaded in-process by the broker."""
+    try:
+        pickle.dumps((CarState, Route, StopTime, Network, User))
+    except pickle.PicklingError:
+        return False
+    return True
+
+
+def _init_solver(network: Network):
+    global _network
+    _network = network
+
+
+def _solve(state: CarState, method: str, *args):
+    """find routes by the method of the car state in a worker process"""
+    result = getattr(dataclasses.replace(state, network=_network), method)(*args)
+    routes = result if isinstance(result, list) else [result] if result else []
+    return [route.user_ids() for route in routes]
+
+
 class CarSetting(typing.NamedTuple):
     mobility_id: str
     capacity: int
@@ -667,11 +1066,27 @@ class CarManager:
         settings: typing.Collection[CarSetting],
         max_calculation_seconds: int = 30,
         max_calculation_stop_times_length: int = 10,
+        enable_insertion: bool = False,
+        solver_workers: int = 0,
+        skip_unreachable_cars: bool = False,
+        ortools_time_limit: float = 10.0,
+        ortools_guided_local_search: bool = False,
+        ortools_warm_start: bool = True,
     ):
         self.network = network
         self.event_queue = event_queue
         self.board_time: timedelta = timedelta(minutes=board_time)
         self.enable_ortools = enable_ortools
+        self.enable_insertion = enable_insertion
+        if solver_workers > 0 and not _importable():
+            msg = "solver_workers is not available for the simulator running in-process"
+            raise ValueError(msg)
+        self.solver_workers = solver_workers
+        self.skip_unreachable_cars = skip_unreachable_cars
+        self.ortools_time_limit = ortools_time_limit
+        self.ortools_guided_local_search = ortools_guided_local_search
+        self.ortools_warm_start = ortools_warm_start
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
         self.max_delay_time: timedelta = timedelta(minutes=max_delay_time)
         self.max_calculation_seconds = max_calculation_seconds
         self.max_calculation_stop_times_length = max_calculation_stop_times_length
@@ -693,6 +1108,11 @@ class CarManager:
     def env(self):
         return self.event_queue.env
 
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
     def depart(self, user_id: str):
         for mobility in self.mobilities.values():
             if user := mobility.find_reserved_user(user_id):
@@ -726,17 +1146,87 @@ class CarManager:
             self.event_queue.reserve_failed(user)
 
     def minimum_delay(self, user: User) -> Evaluation | None:
-        if self.enable_ortools:
+        if self.enable_insertion:
+            return self.minimum_delay_by_insertion(user)
+        elif self.enable_ortools:
             return self.minimum_delay_by_ortools(user)
         else:
             return self.minimum_delay_by_brute_force(user)
 
+    def candidates(self, user: User) -> list[Car]:
+        """cars to find routes for the user
+
+        all the cars unless skip_unreachable_cars, since the lower bound of the arrival time
+        to skip the cars holds only if the network satisfies the triangle inequality."""
+        if not self.skip_unreachable_cars:
+            return list(self.mobilities.values())
+        candidates = [car for car in self.mobilities.values() if car.may_serve(user)]
+        logger.debug(
+            "candidates for user=%s: %s / %s cars",
+            user.user_id,
+            len(candidates),
+            len(self.mobilities),
+        )
+        return candidates
+
+    def solve(
+        self, method: str, user: User, *args, with_route=False
+    ) -> list[tuple[Car, Route]]:
+        """find routes of each car by the method
+
+        the cars are solved on their snapshots in worker processes if solver_workers is positive,
+        and the routes are returned in the order of the cars in any case."""
+        cars = self.candidates(user)
+        if self.solver_workers <= 0:
+            results = [getattr(car, method)(user, *args) for car in cars]
+            return [
+                (car, route)
+                for car, result in zip(cars, results)
+                for route in (result if isinstance(result, list) else [result])
+                if route
+            ]
+
+        if not self._executor:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.solver_workers,
+                initializer=_init_solver,
+                initargs=(self.network,),
+            )
+        states = [car.state(with_route=with_route) for car in cars]
+        futures = [
+            self._executor.submit(
+                _solve, dataclasses.replace(state, network=None), method, user, *args
+            )
+            for state in states
+        ]
+        return [
+            (car, Route.from_user_ids(user_ids, state.users_by_id(user)))
+            for car, state, future in zip(cars, states, futures)
+            for user_ids in future.result()
+        ]
+
     def minimum_delay_by_ortools(self, user: User) -> Evaluation | None:
+        return min(
+            (
+                Evaluation(car, route)
+                for car, route in self.solve(
+                    "solve_new_route",
+                    user,
+                    self.ortools_time_limit,
+                    self.ortools_guided_local_search,
+                    self.ortools_warm_start,
+                    with_route=self.ortools_warm_start,
+                )
+            ),
+            default=None,
+        )
+
+    def minimum_delay_by_insertion(self, user: User) -> Evaluation | None:
         return min(
             (
                 Evaluation(mobility, route)
-                for mobility in self.mobilities.values()
-                if (route := mobility.solve_new_route(user))
+                for mobility in self.candidates(user)
+                if (route := mobility.route_inserted_new_user(user))
             ),
             default=None,
         )
@@ -744,11 +1234,11 @@ class CarManager:
     def minimum_delay_by_brute_force(self, user: User) -> Evaluation | None:
         delays = [
             Evaluation(car, route)
-            for car in self.mobilities.values()
-            for route in car.routes_appended_new_user(
+            for car, route in self.solve(
+                "routes_appended_new_user",
                 user,
-                timeout_seconds=self.max_calculation_seconds,
-                max_stop_time_length=self.max_calculation_stop_times_length,
+                self.max_calculation_seconds,
+                self.max_calculation_stop_times_length,
             )
         ]
 
@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import dataclasses
+import hashlib
+import json
+import logging
+import pathlib
+
+from core import Network
+from mblib.io.npy_cache import NpyCache, replace
+from pydantic_settings import BaseSettings
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkCacheConfig(BaseSettings, frozen=True):
+    """environment variable"""
+
+    NETWORK_CACHE_DIR: pathlib.Path | None = None  # not cached if not specified
+
+
+@dataclasses.dataclass(frozen=True)
+class NetworkCache:
+    """on-disk cache of the networks fetched from the network service
+
+    Each network is stored as a NumPy file of the durations and a JSON file of the stop ids,
+    and is memory-mapped on load."""
+
+    env: NetworkCacheConfig = dataclasses.field(default_factory=NetworkCacheConfig)
+
+    @property
+    def directory(self) -> pathlib.Path | None:
+        return self.env.NETWORK_CACHE_DIR
+
+    @staticmethod
+    def key(url: str, stops: list[dict], mobility_speed: float) -> str:
+        """content address of the network for the stops and the speed"""
+        content = {
+            "url": url,
+            "stops": sorted(stops, key=lambda e: e["locationId"]),
+            "mobility_speed": mobility_speed,
+        }
+        data = json.dumps(content, sort_keys=True).encode()
+        return hashlib.sha256(data).hexdigest()
+
+    @property
+    def _arrays(self) -> NpyCache:
+        return NpyCache(self.directory)
+
+    def load(self, key: str) -> Network | None:
+        if (matrix := self._arrays.load(key)) is None:
+            return None
+        with self._arrays.path(key, ".json").open() as f:
+            stop_ids = json.load(f)
+        network = Network.from_matrix(stop_ids, matrix)
+        logger.info("loaded the network from the cache: %s", self._arrays.path(key))
+        return network
+
+    def save(self, key: str, network: Network):
+        if not self.directory:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # the matrix is written last, so that a partially written entry is never loaded
+        replace(
+            self._arrays.path(key, ".json"),
+            lambda f: f.write(json.dumps(network.stop_ids).encode()),
+        )
+        self._arrays.save(key, network.matrix)
+        logger.info("saved the network to the cache: %s", self.directory / key)
@@ -24,6 +24,12 @@ class Simulation:
         settings: typing.Collection[CarSetting],
         max_calculation_seconds: int = 30,
         max_calculation_stop_times_length: int = 10,
+        enable_insertion: bool = False,
+        solver_workers: int = 0,
+        skip_unreachable_cars: bool = False,
+        ortools_time_limit: float = 10.0,
+        ortools_guided_local_search: bool = False,
+        ortools_warm_start: bool = True,
     ):
         self.env = Environment(start_time=start_time)
         self.event_queue = EventQueue(self.env)
@@ -34,7 +40,7 @@ class Simulation:
             for trip in trips.values()
             for location in trip.stop_time.group.locations
         }
-        if enable_ortools and board_time > 0:
+        if enable_ortools and not enable_insertion and board_time > 0:
             self.board_time = 0
             logger.warning("board_time is ignored when enable_ortools is true")
         self.car_manager = CarManager(
@@ -45,12 +51,21 @@ class Simulation:
             max_delay_time=max_delay_time,
             max_calculation_seconds=max_calculation_seconds,
             max_calculation_stop_times_length=max_calculation_stop_times_length,
+            enable_insertion=enable_insertion,
+            solver_workers=solver_workers,
+            skip_unreachable_cars=skip_unreachable_cars,
+            ortools_time_limit=ortools_time_limit,
+            ortools_guided_local_search=ortools_guided_local_search,
+            ortools_warm_start=ortools_warm_start,
             settings=settings,
         )
 
     def start(self):
         pass
 
+    def finish(self):
+        self.car_manager.close()
+
     def peek(self):
         return self.env.peek()
 
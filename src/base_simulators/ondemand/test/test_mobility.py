@@ -1,14 +1,25 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+import sys
 import unittest
 from datetime import UTC, datetime, timedelta
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from core import Group, Network, Service, Stop, Trip, User
 from core import StopTime as flex_StopTime
 from environment import Environment
-from mobility import Car, CarManager, CarSetting, Evaluation, Route, StopTime
+from mobility import (
+    Car,
+    CarManager,
+    CarSetting,
+    Evaluation,
+    Insertion,
+    Route,
+    Schedule,
+    StopTime,
+)
+from ortools.constraint_solver import pywrapcp
 
 base_datetime = datetime(year=2022, month=1, day=1, tzinfo=UTC)
 stops = [
@@ -321,6 +332,148 @@ class RoutingTestCase(TestCase):
         actual = self.mobility2.solve_new_route(user2)
         self.assertEqual(expected, actual.stop_times)
 
+    def schedule_a_passenger_and_a_user(self):
+        """mobility2 scheduled to drop off a passenger and carry a user,
+        and another user to be added to the route"""
+        passenger = User(
+            user_id="Passenger",
+            demand_id=...,
+            org=stops[2],
+            dst=stops[0],
+            desired=self.base_datetime + timedelta(hours=18),
+            ideal=timedelta(
+                minutes=self.network.duration(stops[2].stop_id, stops[0].stop_id)
+            ),
+        )
+        user1 = User(
+            user_id="U001",
+            demand_id=...,
+            org=stops[0],
+            dst=stops[1],
+            desired=self.base_datetime + timedelta(hours=18),
+            ideal=timedelta(
+                minutes=self.network.duration(stops[0].stop_id, stops[1].stop_id)
+            ),
+        )
+        user2 = User(
+            user_id="U002",
+            demand_id=...,
+            org=stops[1],
+            dst=stops[0],
+            desired=self.base_datetime + timedelta(hours=18),
+            ideal=timedelta(
+                minutes=self.network.duration(stops[1].stop_id, stops[0].stop_id)
+            ),
+        )
+        self.mobility2._passengers.update({passenger.user_id: passenger})
+        self.mobility2._waiting_users.update({user1.user_id: user1})
+        self.mobility2.schedule = Schedule(
+            stop_times=[
+                StopTime(stop=stops[0], on=[user1], off=[passenger]),
+                StopTime(stop=stops[1], off=[user1]),
+            ]
+        )
+        return passenger, user1, user2
+
+    def test_insert_a_user_into_the_schedule(self):
+        passenger, user1, user2 = self.schedule_a_passenger_and_a_user()
+
+        expected = [
+            StopTime(stop=stops[0], on=[user1], off=[passenger]),
+            StopTime(stop=stops[1], on=[user2], off=[user1]),
+            StopTime(stop=stops[0], on=[], off=[user2]),
+        ]
+        actual = self.mobility2.route_inserted_new_user(user2)
+        self.assertEqual(expected, actual.stop_times)
+
+    def test_find_routes_from_the_schedule(self):
+        passenger, user1, user2 = self.schedule_a_passenger_and_a_user()
+
+        expected = [
+            StopTime(stop=stops[0], on=[user1], off=[passenger]),
+            StopTime(stop=stops[1], on=[user2], off=[user1]),
+            StopTime(stop=stops[0], on=[], off=[user2]),
+        ]
+        # snapshots for worker processes include the route only on demand
+        self.assertIsNone(self.mobility2.state().route)
+        self.assertEqual(
+            self.mobility2.schedule.stop_times,
+            self.mobility2.state(with_route=True).route.stop_times,
+        )
+
+        for warm_start in [True, False]:
+            with (
+                self.subTest(warm_start=warm_start),
+                patch.object(
+                    pywrapcp.RoutingModel,
+                    "SolveFromAssignmentWithParameters",
+                    autospec=True,
+                    side_effect=pywrapcp.RoutingModel.SolveFromAssignmentWithParameters,
+                ) as solve,
+                patch.object(
+                    Car, "_pending_route", autospec=True, side_effect=Car._pending_route
+                ) as pending_route,
+            ):
+                actual = self.mobility2.solve_new_route(
+                    user2,
+                    time_limit=1.0,
+                    guided_local_search=True,
+                    warm_start=warm_start,
+                )
+                self.assertEqual(warm_start, solve.called)
+                # the route of the schedule is not computed unless used
+                self.assertEqual(warm_start, pending_route.called)
+                self.assertEqual(expected, actual.stop_times)
+
+    def test_insertion_delay_equals_evaluation(self):
+        users = [
+            User(
+                user_id=f"U{i:03}",
+                demand_id=...,
+                org=stops[i % 3],
+                dst=stops[(i + 1) % 3],
+                desired=self.base_datetime + timedelta(hours=18, minutes=5 * i),
+                ideal=timedelta(
+                    minutes=self.network.duration(
+                        stops[i % 3].stop_id, stops[(i + 1) % 3].stop_id
+                    )
+                ),
+            )
+            for i in range(3)
+        ]
+        route = Route(
+            [
+                StopTime(stop=stops[0], on=[users[0]]),
+                StopTime(stop=stops[1], on=[users[1]], off=[users[0]]),
+                StopTime(stop=stops[2], off=[users[1]]),
+            ]
+        )
+        self.mobility2._waiting_users.update({e.user_id: e for e in users[:2]})
+        start_window, end_window = self.mobility2.window()
+        insertion = Insertion(self.mobility2, route, start_window, end_window)
+
+        size = len(route.stop_times)
+        for i in range(size + 1):
+            for k in range(i, size + 1):
+                candidate = Route(
+                    route.stop_times[:i]
+                    + [StopTime(stop=users[2].org, on=[users[2]])]
+                    + route.stop_times[i:k]
+                    + [StopTime(stop=users[2].dst, off=[users[2]])]
+                    + route.stop_times[k:]
+                )
+                evaluation = Evaluation(self.mobility2, candidate.copy())
+                if all(
+                    v <= timedelta(minutes=self.max_delay_time)
+                    for v in evaluation.values
+                ):
+                    expected = sum(evaluation.values, timedelta())
+                else:
+                    expected = None
+                with self.subTest(i=i, k=k):
+                    actual = insertion._total_delay(candidate, users[2])
+                    self.assertEqual(expected, actual)
+
 
 class EvaluationTestCase(TestCase):
     def setUp(self):
@@ -856,6 +1009,148 @@ class PlanningTestCase(TestCase):
 
         self.assertEqual(expected, actual.stop_times)
 
+    def test_candidates(self):
+        manager = CarManager(
+            network=self.network,
+            event_queue=Mock(env=Environment(self.base_datetime)),
+            settings=[
+                CarSetting(
+                    mobility_id=f"M00{i + 1}", capacity=1, trip=trips[0], stop=stop
+                )
+                for i, stop in enumerate(stops)
+            ],
+            enable_ortools=True,
+            max_delay_time=self.max_delay_time,
+            board_time=self.board_time,
+            skip_unreachable_cars=True,
+        )
+        user = User(
+            user_id="User",
+            demand_id="Demand",
+            org=stops[1],
+            dst=stops[0],
+            desired=self.base_datetime + trips[0].stop_time.start_window,
+            ideal=timedelta(
+                minutes=self.network.duration(stops[1].stop_id, stops[0].stop_id)
+            ),
+        )
+
+        actual = [car.mobility_id for car in manager.candidates(user)]
+
+        # the car on stops[2] cannot pick up the user in time (50 + 30 > 30 + 30)
+        self.assertEqual(["M001", "M002"], actual)
+
+    def test_candidates_on_non_metric_network(self):
+        # the direct path between stops[0] and stops[2] is longer than the one via stops[1]
+        network = Network()
+        network.add_edge(stops[0].stop_id, stops[1].stop_id, 10, with_rev=True)
+        network.add_edge(stops[1].stop_id, stops[2].stop_id, 10, with_rev=True)
+        network.add_edge(stops[0].stop_id, stops[2].stop_id, 100, with_rev=True)
+        desired = self.base_datetime + trips[0].stop_time.start_window
+        reserved = User(
+            user_id="Reserved",
+            demand_id=...,
+            org=stops[0],
+            dst=stops[1],
+            desired=desired,
+            ideal=timedelta(minutes=10),
+        )
+        user = User(
+            user_id="User",
+            demand_id="Demand",
+            org=stops[2],
+            dst=stops[1],
+            desired=desired,
+            ideal=timedelta(minutes=10),
+        )
+        expected = [
+            StopTime(stop=stops[0], on=[reserved]),
+            StopTime(stop=stops[1], off=[reserved]),
+            StopTime(stop=stops[2], on=[user]),
+            StopTime(stop=stops[1], off=[user]),
+        ]
+        for skip_unreachable_cars in [False, True]:
+            manager = CarManager(
+                network=network,
+                event_queue=Mock(env=Environment(self.base_datetime)),
+                settings=[
+                    CarSetting(
+                        mobility_id="M001", capacity=1, trip=trips[0], stop=stops[0]
+                    )
+                ],
+                enable_ortools=True,
+                max_delay_time=self.max_delay_time,
+                board_time=self.board_time,
+                skip_unreachable_cars=skip_unreachable_cars,
+            )
+            car = manager.mobilities["M001"]
+            car._reserved_users.update({reserved.user_id: reserved})
+            car.schedule = Schedule(stop_times=expected[:2])
+
+            with self.subTest(skip_unreachable_cars=skip_unreachable_cars):
+                actual = manager.minimum_delay(user)
+                if skip_unreachable_cars:
+                    # the lower bound assumes the triangle inequality
+                    self.assertIsNone(actual)
+                else:
+                    # the car can serve the user via stops[1] in time
+                    self.assertEqual(expected, actual.stop_times)
+
+    def test_plan_routes_in_worker_processes(self):
+        user = User(
+            user_id="User",
+            demand_id="Demand",
+            org=stops[1],
+            dst=stops[0],
+            desired=self.base_datetime + trips[0].stop_time.start_window,
+            ideal=timedelta(
+                minutes=self.network.duration(stops[1].stop_id, stops[0].stop_id)
+            ),
+        )
+        expected = [
+            StopTime(stop=stops[1], on=[user], off=[]),
+            StopTime(stop=stops[0], on=[], off=[user]),
+        ]
+        for enable_ortools in [True, False]:
+            manager = CarManager(
+                network=self.network,
+                event_queue=Mock(env=Environment(self.base_datetime)),
+                settings=[
+                    CarSetting(
+                        mobility_id="M001", capacity=1, trip=trips[0], stop=stops[0]
+                    ),
+                    CarSetting(
+                        mobility_id="M002", capacity=1, trip=trips[0], stop=stops[1]
+                    ),
+                ],
+                enable_ortools=enable_ortools,
+                max_delay_time=self.max_delay_time,
+                board_time=self.board_time,
+                solver_workers=2,
+            )
+            with self.subTest(enable_ortools=enable_ortools):
+                actual = manager.minimum_delay(user)
+                manager.close()
+
+                self.assertEqual("M002", actual.car.mobility_id)
+                self.assertEqual(expected, actual.stop_times)
+                self.assertIs(user, actual.stop_times[0].on[0])
+
+    def test_reject_worker_processes_in_process(self):
+        # the broker imports the simulator freshly and removes it from sys.modules
+        with patch.dict(sys.modules):
+            del sys.modules["mobility"]
+            with self.assertRaises(ValueError):
+                CarManager(
+                    network=self.network,
+                    event_queue=Mock(env=Environment(self.base_datetime)),
+                    settings=[],
+                    enable_ortools=True,
+                    max_delay_time=self.max_delay_time,
+                    board_time=self.board_time,
+                    solver_workers=2,
+                )
+
 
 if __name__ == "__main__":
     unittest.main()
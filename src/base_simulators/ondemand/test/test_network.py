@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import pathlib
+import tempfile
+import unittest
+
+from core import Network
+from network_cache import NetworkCache, NetworkCacheConfig
+
+
+class NetworkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.network = Network.from_matrix(
+            ["S1", "S2", "S3"],
+            [
+                [0.0, 1.0, 2.0],
+                [3.0, 0.0, 4.0],
+                [5.0, 6.0, 0.0],
+            ],
+        )
+
+    def test_duration(self):
+        self.assertEqual(4.0, self.network.duration("S2", "S3"))
+        self.assertEqual(0.0, self.network.duration("S2", "S2"))
+        with self.assertRaises(KeyError):
+            self.network.duration("S1", "S4")
+
+    def test_vectorized_lookups(self):
+        self.assertEqual(
+            [[1.0, 0.0], [6.0, 5.0]],
+            self.network.durations(["S1", "S3"], ["S2", "S1"]).tolist(),
+        )
+        self.assertEqual([3.0, 4.0], self.network.row("S2", ["S1", "S3"]).tolist())
+        self.assertEqual([2.0, 4.0], self.network.column(["S1", "S2"], "S3").tolist())
+        self.assertEqual(
+            [1.0, 4.0, 5.0], self.network.path(["S1", "S2", "S3", "S1"]).tolist()
+        )
+
+    def test_add_edge(self):
+        network = Network()
+        for i in range(20):
+            network.add_edge(f"S{i}", f"S{i + 1}", i, with_rev=True)
+
+        self.assertEqual(21, len(network))
+        self.assertEqual(19.0, network.duration("S20", "S19"))
+        self.assertEqual(0.0, network.duration("S20", "S20"))
+        with self.assertRaises(KeyError):
+            network.duration("S0", "S2")
+        with self.assertRaises(KeyError):
+            network.path(["S0", "S1", "S3"])
+
+    def test_invalid_matrix(self):
+        with self.assertRaises(ValueError):
+            Network.from_matrix(["S1", "S2"], [[0.0, -1.0], [1.0, 0.0]])
+        with self.assertRaises(ValueError):
+            Network.from_matrix(["S1", "S2"], [[0.0, 1.0]])
+
+
+class NetworkCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.stops = [
+            {"locationId": "S2", "lat": 35.1, "lng": 139.1},
+            {"locationId": "S1", "lat": 35.0, "lng": 139.0},
+        ]
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = NetworkCache(
+            env=NetworkCacheConfig(NETWORK_CACHE_DIR=pathlib.Path(self.directory.name))
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_key(self):
+        key = self.cache.key("http://network/matrix", self.stops, 300.0)
+
+        self.assertEqual(
+            key, self.cache.key("http://network/matrix", self.stops[::-1], 300.0)
+        )
+        self.assertNotEqual(
+            key, self.cache.key("http://network/matrix", self.stops, 200.0)
+        )
+        self.assertNotEqual(
+            key, self.cache.key("http://network/matrix", self.stops[:1], 300.0)
+        )
+
+    def test_save_and_load(self):
+        key = self.cache.key("http://network/matrix", self.stops, 300.0)
+        self.assertIsNone(self.cache.load(key))
+
+        self.cache.save(key, Network.from_matrix(["S1", "S2"], [[0, 1.5], [2.5, 0]]))
+        network = self.cache.load(key)
+
+        # memory-mapped read-only
+        self.assertFalse(network.matrix.flags.writeable)
+        self.assertEqual(["S1", "S2"], network.stop_ids)
+        self.assertEqual(2.5, network.duration("S2", "S1"))
+
+    def test_add_edge_to_loaded(self):
+        key = self.cache.key("http://network/matrix", self.stops, 300.0)
+        self.cache.save(key, Network.from_matrix(["S1", "S2"], [[0, 1.5], [2.5, 0]]))
+        network = self.cache.load(key)
+
+        # the read-only matrix is copied on the first write
+        network.add_edge("S1", "S2", 3.0)
+        network.add_edge("S2", "S3", 4.0)
+        self.assertEqual(3.0, network.duration("S1", "S2"))
+        self.assertEqual(4.0, network.duration("S2", "S3"))
+        self.assertEqual(1.5, self.cache.load(key).duration("S1", "S2"))
+
+    def test_disabled(self):
+        cache = NetworkCache(env=NetworkCacheConfig(NETWORK_CACHE_DIR=None))
+        key = cache.key("http://network/matrix", self.stops, 300.0)
+
+        cache.save(key, Network.from_matrix(["S1", "S2"], [[0, 1.5], [2.5, 0]]))
+
+        self.assertIsNone(cache.load(key))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -179,6 +179,27 @@ class SimpleTestCase(unittest.TestCase):
             )
         )
 
+    def test_exceptions_out_of_the_range(self):
+        service = Service(
+            start_date=date(year=2022, month=7, day=4),
+            end_date=date(year=2022, month=7, day=10),
+            monday=True,
+        )
+        self.assertTrue(service.is_operation(at=date(year=2022, month=7, day=4)))
+        self.assertFalse(service.is_operation(at=date(year=2022, month=7, day=1)))
+
+        # appended after the lookup
+        service.append_exception(date(year=2022, month=7, day=1), added=True)
+        service.append_exception(date(year=2022, month=7, day=20), added=True)
+        service.append_exception(date(year=2022, month=7, day=4), added=False)
+
+        self.assertTrue(service.is_operation(at=date(year=2022, month=7, day=1)))
+        self.assertFalse(service.is_operation(at=date(year=2022, month=7, day=4)))
+        self.assertFalse(service.is_operation(at=date(year=2022, month=7, day=11)))
+        self.assertFalse(service.is_operation(at=date(year=2022, month=7, day=18)))
+        self.assertTrue(service.is_operation(at=date(year=2022, month=7, day=20)))
+        self.assertFalse(service.is_operation(at=date(year=2022, month=7, day=21)))
+
 
 if __name__ == "__main__":
     unittest.main()
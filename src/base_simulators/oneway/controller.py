@@ -9,7 +9,7 @@ import aiohttp
 import fastapi
 from gbfs import GbfsFiles
 from jschema import query, response
-from mblib.io import httputil
+from mblib.io import httputil, stepping
 from mblib.io.log import init_logger
 from mblib.jschema import events, spec
 from mobility import ScooterParameter
@@ -58,7 +58,9 @@ def get_specification():
     builder.set_feature(events.EventType.ARRIVED, declared=["demand_id"])
     builder.set_feature(events.EventType.RESERVE, required=["demand_id"])
     builder.set_feature(events.EventType.DEPART, required=["demand_id"])
-    return builder.get_specification_response(version=events.VERSION_1)
+    return builder.get_specification_response(
+        version=events.VERSION_1, api=spec.ApiDefinition(advance=True, independent=True)
+    )
 
 
 @app.post("/upload", response_model=response.Message)
@@ -118,6 +120,16 @@ def step():
     return {"now": now, "events": events}
 
 
+@app.post("/advance", response_model=response.Advance)
+def advance(until: float | None = None):
+    now, next_, events_ = stepping.advance(sim.peek, sim.step, sim.env.now, until)
+    return {
+        "now": now,
+        "next": next_ if next_ < float("inf") else -1,
+        "events": events_,
+    }
+
+
 @app.post("/triggered")
 def triggered(event: query.TriggeredEvent | events.Event):
     # just let time forward to expect nothing to happen.
@@ -140,6 +152,12 @@ def triggered(event: query.TriggeredEvent | events.Event):
             )
 
 
+@app.post("/triggered/batch")
+def triggered_batch(events_: list[query.TriggeredEvent | events.Event]):
+    for event in events_:
+        triggered(event)
+
+
 @app.get("/reservable", response_model=response.ReservableStatus)
 def reservable(org: str, dst: str):
     return {"reservable": sim.reservable(org, dst)}
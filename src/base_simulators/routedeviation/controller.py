@@ -10,7 +10,7 @@ import aiohttp
 import fastapi
 import gtfs
 from jschema import query, response
-from mblib.io import httputil
+from mblib.io import httputil, stepping
 from mblib.io.log import init_logger
 from mblib.jschema import events, spec
 from simulation import Simulation
@@ -57,7 +57,9 @@ def get_specification():
     builder.set_feature(events.EventType.ARRIVED, declared=["demand_id"])
     builder.set_feature(events.EventType.RESERVE, required=["demand_id"])
     builder.set_feature(events.EventType.DEPART, required=["demand_id"])
-    return builder.get_specification_response(version=events.VERSION_1)
+    return builder.get_specification_response(
+        version=events.VERSION_1, api=spec.ApiDefinition(advance=True, independent=True)
+    )
 
 
 @app.post("/upload")
@@ -107,6 +109,18 @@ def step():
     return {"now": sim.step(), "events": sim.event_queue.events}
 
 
+@app.post("/advance", response_model=response.Advance)
+def advance(until: float | None = None):
+    now, next_, events_ = stepping.advance(
+        sim.peek, lambda: (sim.step(), sim.event_queue.events), sim.env.now, until
+    )
+    return {
+        "now": now,
+        "next": next_ if next_ < float("inf") else -1,
+        "events": events_,
+    }
+
+
 @app.post("/triggered")
 def triggered(event: query.TriggeredEvent | events.Event):
     # expect nothing to happen. just let time forward.
@@ -126,6 +140,12 @@ def triggered(event: query.TriggeredEvent | events.Event):
             sim.dept_user(user_id=event.details.userId)
 
 
+@app.post("/triggered/batch")
+def triggered_batch(events_: list[query.TriggeredEvent | events.Event]):
+    for event in events_:
+        triggered(event)
+
+
 @app.get("/reservable", response_model=response.ReservableStatus)
 def reservable(org: str, dst: str):
     return {"reservable": sim.reservable(org, dst)}
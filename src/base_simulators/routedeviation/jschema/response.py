@@ -10,6 +10,7 @@ Message = response.Message
 Peek = response.Peek
 StepEvent: typing.TypeAlias = ReservedEvent | DepartedEvent | ArrivedEvent
 Step = response.Step[StepEvent]
+Advance = response.Advance[StepEvent]
 
 
 class ReservableStatus(BaseModel):
@@ -4,10 +4,11 @@ import logging
 import unittest
 from datetime import date, datetime, time, timedelta
 
-from core import EventType, Service, Stop, StopTime
+from core import EventType, Path, Service, Stop, StopTime, StopTimeWithDateTime
 from mblib.jschema import events
+from mobility import Occupancy
 from simulation import Simulation
-from trip import BlockTrip, SingleTrip
+from trip import BlockTrip, DateCache, SingleTrip
 
 logger = logging.getLogger(__name__)
 BASE_DATE = date(2022, 1, 1)
@@ -490,5 +491,64 @@ class BlockTripTestCase(unittest.TestCase):
         self.assertEqual(expected_events, triggered_events)
 
 
+class DateCacheTestCase(unittest.TestCase):
+    def test_evict_least_recently_used(self):
+        cache = DateCache(maxsize=2)
+        computed = []
+
+        def compute(at: date):
+            computed.append(at)
+            return [at]
+
+        days = [BASE_DATE + timedelta(days=i) for i in range(3)]
+        value = cache.get(days[0], compute)
+        self.assertIs(value, cache.get(days[0], compute))
+        cache.get(days[1], compute)
+        cache.get(days[0], compute)
+        cache.get(days[2], compute)  # evicts days[1]
+        cache.get(days[0], compute)
+        cache.get(days[1], compute)
+
+        self.assertEqual([days[0], days[1], days[2], days[1]], computed)
+
+
+class OccupancyTestCase(unittest.TestCase):
+    def path(self, departure: int, arrival: int):
+        return Path(
+            pick_up=StopTimeWithDateTime(
+                stop_time=StopTime(
+                    stop=gtfs_stations["3_1"],
+                    departure=timedelta(minutes=540 + departure),
+                ),
+                reference_date=BASE_DATE,
+            ),
+            drop_off=StopTimeWithDateTime(
+                stop_time=StopTime(
+                    stop=gtfs_stations["7_1"], arrival=timedelta(minutes=540 + arrival)
+                ),
+                reference_date=BASE_DATE,
+            ),
+        )
+
+    def test_max_load(self):
+        occupancy = Occupancy()
+        occupancy.add(self.path(10, 20))
+        occupancy.add(self.path(15, 30))
+        occupancy.add(self.path(20, 25))
+
+        self.assertEqual(1, occupancy.max_load(self.path(0, 15)))
+        self.assertEqual(2, occupancy.max_load(self.path(15, 20)))
+        self.assertEqual(2, occupancy.max_load(self.path(0, 40)))
+        self.assertEqual(1, occupancy.max_load(self.path(25, 40)))
+        self.assertEqual(0, occupancy.max_load(self.path(30, 40)))
+
+        occupancy.remove(self.path(15, 30))
+
+        self.assertEqual(1, occupancy.max_load(self.path(0, 40)))
+        occupancy.remove(self.path(10, 20))
+        occupancy.remove(self.path(20, 25))
+        self.assertEqual(0, occupancy.max_load(self.path(0, 40)))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,8 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+import collections
 import dataclasses
+import functools
 import itertools
 import typing
 from datetime import date, datetime, time, timedelta
@@ -25,6 +27,25 @@ from core import (
 T = typing.TypeVar("T")
 
 
+class DateCache(typing.Generic[T]):
+    """values computed for each date, keeping the most recently used ones
+
+    The simulation looks up the dates around the current one, so a few entries are enough."""
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._values: collections.OrderedDict[date, T] = collections.OrderedDict()
+
+    def get(self, at: date, compute: typing.Callable[[date], T]) -> T:
+        if at in self._values:
+            self._values.move_to_end(at)
+            return self._values[at]
+        value = self._values[at] = compute(at)
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+        return value
+
+
 def _triplewise(it: typing.Iterable[T]):
     a, b, c = itertools.tee(it, 3)
     next(b, None)
@@ -150,7 +171,7 @@ class SingleTrip(Trip):
         assert isinstance(self.stop_times_with[0], StopTime)
         assert isinstance(self.stop_times_with[-1], StopTime)
 
-    @property
+    @functools.cached_property
     def stop_times(self) -> list[StopTime]:
         return [
             stop_time
@@ -203,10 +224,10 @@ class SingleTrip(Trip):
         )
 
     def start_time(self, at: date):
-        return next(iter(self.stop_times_at(at))).arrival
+        return datetime.combine(at, time()) + self.stop_times[0].arrival
 
     def end_time(self, at: date):
-        return list(self.stop_times_at(at))[-1].departure
+        return datetime.combine(at, time()) + self.stop_times[-1].departure
 
     def paths(self, org: StopLike, dst: StopLike, at: date):
         if not self.service.is_operation(at):
@@ -222,6 +243,9 @@ class BlockTrip(Trip):
     """Sequence of trips which belong to a block"""
 
     trips: list[SingleTrip]
+    _stop_times_with: DateCache[list[AbstractStopTime]] = dataclasses.field(
+        default_factory=DateCache, init=False, repr=False, compare=False
+    )
 
     def __post_init__(self):
         assert len(self.trips) >= 2
@@ -265,9 +289,8 @@ class BlockTrip(Trip):
         # but this will not be considered for now.
         return [
             StopTimeWithDateTime(stop_time=stop_time, reference_date=at)
-            for trip in self.trips
-            if trip.service.is_operation(at)
-            for stop_time in trip.stop_times
+            for stop_time in self.stop_times_with(at)
+            if isinstance(stop_time, StopTime)
         ]
 
     def iter_stop_times_at(
@@ -293,18 +316,23 @@ class BlockTrip(Trip):
         )
 
     def stop_times_with(self, at: date) -> list[AbstractStopTime]:
-        return [
-            stop_time
-            for trip in self.trips
-            if trip.service.is_operation(at)
-            for stop_time in trip.stop_times_with
-        ]
+        """stop times of the operating trips, which must not be modified"""
+        return self._stop_times_with.get(
+            at,
+            lambda at_: [
+                stop_time
+                for trip in self.trips
+                if trip.service.is_operation(at_)
+                for stop_time in trip.stop_times_with
+            ],
+        )
 
     def start_time(self, at: date):
-        return next(iter(self.stop_times_at(at))).arrival
+        # the first and the last of each trip are stops
+        return datetime.combine(at, time()) + self.stop_times_with(at)[0].arrival
 
     def end_time(self, at: date):
-        return list(self.stop_times_at(at))[-1].departure
+        return datetime.combine(at, time()) + self.stop_times_with(at)[-1].departure
 
     def paths(self, org: StopLike, dst: StopLike, at: date):
         if not self.is_operation(at):
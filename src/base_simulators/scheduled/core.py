@@ -114,8 +114,12 @@ class Service:
         self._weekday = (monday, tuesday, wednesday, thursday, friday, saturday, sunday)
         self._added_exceptions = []
         self._removed_exceptions = []
+        # operation days from self._first, compiled on the first lookup
+        self._first = start_date
+        self._days: bytearray | None = None
 
     def append_exception(self, exception_date: date, added=True):
+        self._days = None
         if added:
             assert exception_date not in self._removed_exceptions
             self._added_exceptions.append(exception_date)
@@ -123,16 +127,32 @@ class Service:
             assert exception_date not in self._added_exceptions
             self._removed_exceptions.append(exception_date)
 
-    def is_operation(self, at: date):
-        if at in self._added_exceptions:
-            return True
-        if at in self._removed_exceptions:
-            return False
-
-        if self._start_day <= at <= self._end_day:
-            return self._weekday[at.weekday()]
+    def _compile(self):
+        """days of the operation from the first to the last date, including the exceptions"""
+        first = min([self._start_day, *self._added_exceptions])
+        last = max([self._end_day, *self._added_exceptions])
+        days = bytearray(max((last - first).days + 1, 0))
+        if self._start_day <= self._end_day:
+            start = (self._start_day - first).days
+            n = (self._end_day - self._start_day).days + 1
+            week = bytes(
+                bool(self._weekday[(self._start_day.weekday() + i) % 7])
+                for i in range(7)
+            )
+            days[start : start + n] = (week * (n // 7 + 1))[:n]
+        for exception_date in self._removed_exceptions:
+            if first <= exception_date <= last:
+                days[(exception_date - first).days] = 0
+        for exception_date in self._added_exceptions:
+            days[(exception_date - first).days] = 1
+        self._first = first
+        self._days = days
 
-        return False
+    def is_operation(self, at: date):
+        if self._days is None:
+            self._compile()
+        i = (at - self._first).days
+        return 0 <= i < len(self._days) and bool(self._days[i])
 
 
 @dataclasses.dataclass(frozen=True)
@@ -180,7 +200,7 @@ class Trip:
     def is_operation(self, at: date) -> bool:
         raise NotImplementedError()
 
-    def stop_times_at(self, at: date) -> list[StopTimeWithDateTime]:
+    def stop_times_at(self, at: date) -> typing.Iterable[StopTimeWithDateTime]:
         raise NotImplementedError()
 
     def start_time(self, at: date) -> datetime:
@@ -194,6 +214,14 @@ class Trip:
     ) -> typing.Generator[Path, typing.Any, None]:
         raise NotImplementedError()
 
+    def earliest_path(
+        self, org: Stop, dst: Stop, at: date, dept: datetime
+    ) -> Path | None:
+        """the first path departing at or after `dept` in the operation of the date"""
+        return next(
+            (path for path in self.paths(org, dst, at) if dept <= path.departure), None
+        )
+
 
 @dataclasses.dataclass
 class User:
@@ -1,9 +1,14 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import array
 import collections
+import collections.abc
 import csv
 import datetime
 import io
+import itertools
 import re
 import typing
 import zipfile
@@ -11,15 +16,24 @@ import zipfile
 from core import Agency, Route, Service, Stop, StopTime
 from trip import SingleTrip
 
+T = typing.TypeVar("T")
+
+MISSING = -1  # seconds of an empty arrival_time / departure_time
+
 p = re.compile(r"(\d\d?):(\d\d?):(\d\d?)")
 
 
-def str_time(time: str):
+def str_seconds(time: str) -> int | None:
+    """seconds of "HH:MM:SS", which may exceed 24:00:00"""
     if match := p.fullmatch(time):
         hours, minutes, seconds = match.groups()
-        return datetime.timedelta(
-            hours=int(hours), minutes=int(minutes), seconds=int(seconds)
-        )
+        return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+    return None
+
+
+def str_time(time: str):
+    if (seconds := str_seconds(time)) is not None:
+        return datetime.timedelta(seconds=seconds)
     return None
 
 
@@ -74,15 +88,167 @@ def parse_calendar_dates(row: dict[str, str]):
     return row["service_id"], str_date(row["date"]), row["exception_type"] == "1"
 
 
+class _Seconds(dict[str, int]):
+    """memo of parsed time strings, which repeat across trips"""
+
+    def __missing__(self, time: str) -> int:
+        seconds = str_seconds(time)
+        value = self[time] = MISSING if seconds is None else seconds
+        return value
+
+
+class StopTimeTable:
+    """stop_times.txt stored in columns of trip index, stop index and seconds
+
+    Rows are grouped by trip, keeping the order of the file within each trip."""
+
+    def __init__(self, stops: dict[str, Stop]):
+        self._stops = list(stops.values())
+        self._stop_index = {stop_id: i for i, stop_id in enumerate(stops)}
+        self._trip_index: dict[str, int] = {}
+        self._trip = array.array("i")
+        self._stop = array.array("i")
+        self._arrival = array.array("i")
+        self._departure = array.array("i")
+        self._offsets = array.array("i", [0])
+        self._deltas: dict[int, datetime.timedelta] = {}
+
+    def __len__(self):
+        return len(self._trip)
+
+    def read(self, f: typing.IO[bytes]):
+        reader = csv.reader(io.TextIOWrapper(f, encoding="utf-8-sig"))
+        header = next(reader)
+        trip_column, stop_column, arrival_column, departure_column = (
+            header.index(name)
+            for name in ("trip_id", "stop_id", "arrival_time", "departure_time")
+        )
+
+        seconds = _Seconds()
+        grouped = True
+        for row in reader:
+            if not row:
+                continue
+            trip_id = row[trip_column]
+            if (trip := self._trip_index.get(trip_id)) is None:
+                trip = self._trip_index[trip_id] = len(self._trip_index)
+            elif self._trip and trip != self._trip[-1]:
+                grouped = False
+            arrival = seconds[row[arrival_column]]
+            departure = seconds[row[departure_column]]
+            if arrival == MISSING and departure == MISSING:
+                msg = f"no valid arrival_time nor departure_time: {trip_id=}, {row=}"
+                raise ValueError(msg)
+            self._trip.append(trip)
+            self._stop.append(self._stop_index[row[stop_column]])
+            self._arrival.append(arrival)
+            self._departure.append(departure)
+
+        self._group(grouped)
+        return self
+
+    def _group(self, grouped: bool):
+        counts = [0] * len(self._trip_index)
+        for trip in self._trip:
+            counts[trip] += 1
+        self._offsets = array.array("i", itertools.accumulate(counts, initial=0))
+        if grouped:
+            # trip indices are numbered in order of appearance
+            return
+
+        # counting sort by trip, stable within each trip
+        positions = self._offsets[:-1]
+        order = array.array("i", bytes(self._trip.itemsize * len(self._trip)))
+        for row, trip in enumerate(self._trip):
+            order[positions[trip]] = row
+            positions[trip] += 1
+        for name in ("_trip", "_stop", "_arrival", "_departure"):
+            column = getattr(self, name)
+            setattr(self, name, array.array("i", (column[row] for row in order)))
+
+    def stop_times(self, trip_id: str) -> StopTimes:
+        if (trip := self._trip_index.get(trip_id)) is None:
+            return StopTimes(self, 0, 0)
+        return StopTimes(self, self._offsets[trip], self._offsets[trip + 1])
+
+    def stop_time(self, row: int) -> StopTime:
+        return StopTime(
+            stop=self._stops[self._stop[row]],
+            arrival=self._delta(self._arrival[row]),
+            departure=self._delta(self._departure[row]),
+        )
+
+    def _delta(self, seconds: int) -> datetime.timedelta | None:
+        if seconds == MISSING:
+            return None
+        if (delta := self._deltas.get(seconds)) is None:
+            delta = self._deltas[seconds] = datetime.timedelta(seconds=seconds)
+        return delta
+
+
+class StopTimes(collections.abc.Sequence):
+    """stop times of a trip, built from the rows of StopTimeTable on access"""
+
+    __slots__ = ("_start", "_stop", "_table")
+
+    def __init__(self, table: StopTimeTable, start: int, stop: int):
+        self._table = table
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    @typing.overload
+    def __getitem__(self, index: int) -> StopTime: ...
+
+    @typing.overload
+    def __getitem__(self, index: slice) -> list[StopTime]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._table.stop_time(self._start + index)
+
+    def __iter__(self):
+        return map(self._table.stop_time, range(self._start, self._stop))
+
+
+class LazyMapping(collections.abc.Mapping, typing.Generic[T]):
+    """read-only mapping whose values are built on first access"""
+
+    def __init__(self, keys: typing.Iterable[str], build: typing.Callable[[str], T]):
+        self._keys = dict.fromkeys(keys)
+        self._build = build
+        self._values: dict[str, T] = {}
+
+    def __getitem__(self, key: str) -> T:
+        if (value := self._values.get(key)) is None:
+            if key not in self._keys:
+                raise KeyError(key)
+            value = self._values[key] = self._build(key)
+        return value
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
 class GtfsFilesReader:
     def __init__(self, archive: zipfile.ZipFile):
         self._agencies: dict[str, Agency] = {}
         self.stops: dict[str, Stop] = {}
         self._routes: dict[str, Route] = {}
-        self._stop_times: dict[str, list[StopTime]] = collections.defaultdict(list)
         self._services: dict[str, Service] = {}
-        self.trips: dict[str, SingleTrip] = {}
-        self.blocks: dict[str, list[SingleTrip]] = collections.defaultdict(list)
+        # route, service and block of each trip; trips are materialized on demand
+        self._trips: dict[str, tuple[Route, Service, str | None]] = {}
+        self._blocks: dict[str, list[str]] = collections.defaultdict(list)
 
         with archive.open("agency.txt") as f:
             for k, v in GtfsReader(f, parse_agency):
@@ -126,15 +292,22 @@ class GtfsFilesReader:
                 self._services[service_id].append_exception(exception_date, is_added)
 
         with archive.open("stop_times.txt") as f:
-            for k, v in GtfsReader(f, self.parse_stop_time):
-                self._stop_times[k].append(v)
+            self._stop_times = StopTimeTable(self.stops).read(f)
 
         with archive.open("trips.txt") as f:
             for k, v in GtfsReader(f, self.parse_trip):
-                if block_id := v.block_id:
-                    self.blocks[block_id].append(v)
-                else:
-                    self.trips.update({k: v})
+                if block_id := v[2]:
+                    self._blocks[block_id].append(k)
+                self._trips.update({k: v})
+
+        self._single_trips = LazyMapping(self._trips, self._build_trip)
+        self.trips = LazyMapping(
+            (k for k, v in self._trips.items() if not v[2]), self._single_trips.get
+        )
+        self.blocks = LazyMapping(
+            self._blocks,
+            lambda block_id: [self._single_trips[k] for k in self._blocks[block_id]],
+        )
 
     def parse_route(self, row: dict[str, str]):
         return row["route_id"], Route(
@@ -146,17 +319,18 @@ class GtfsFilesReader:
             route_type=row["route_type"],
         )
 
-    def parse_stop_time(self, row: dict[str, str]):
-        return row["trip_id"], StopTime(
-            stop=self.stops[row["stop_id"]],
-            arrival=str_time(row["arrival_time"]),
-            departure=str_time(row["departure_time"]),
+    def parse_trip(self, row: dict[str, str]):
+        return row["trip_id"], (
+            self._routes[row["route_id"]],
+            self._services[row["service_id"]],
+            row.get("block_id", None),
         )
 
-    def parse_trip(self, row: dict[str, str]):
-        return row["trip_id"], SingleTrip(
-            route=self._routes[row["route_id"]],
-            service=self._services[row["service_id"]],
-            stop_times=self._stop_times[row["trip_id"]],
-            block_id=row.get("block_id", None),
+    def _build_trip(self, trip_id: str):
+        route, service, block_id = self._trips[trip_id]
+        return SingleTrip(
+            route=route,
+            service=service,
+            stop_times=self._stop_times.stop_times(trip_id),
+            block_id=block_id,
         )
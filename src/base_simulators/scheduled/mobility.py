@@ -2,18 +2,74 @@
 # SPDX-License-Identifier: Apache-2.0
 from __future__ import annotations
 
+import bisect
+import collections
 import typing
-from datetime import datetime, time, timedelta
-from itertools import chain
+from datetime import date, datetime, time, timedelta
 from logging import getLogger
 
 from core import Mobility, Path, Stop, Trip, User, UserStatus
 from environment import Environment
 from event import ArrivedEvent, DepartedEvent, EventQueue, ReservedEvent
+from trip import DateCache
 
 logger = getLogger(__name__)
 
 
+class Occupancy:
+    """number of the reserved users in a car over time
+
+    Each reserved path takes a seat in [departure, arrival).
+    The load is kept as a step function, so a check costs the number of its steps in the path,
+    i.e. the stops on the way, regardless of the number of the reserved users."""
+
+    def __init__(self):
+        self._times: list[datetime] = []  # steps of the load
+        self._loads: list[int] = []  # load in [times[i], times[i + 1])
+        self._refs: collections.Counter[datetime] = collections.Counter()
+
+    def _insert(self, at: datetime) -> int:
+        i = bisect.bisect_left(self._times, at)
+        if i == len(self._times) or self._times[i] != at:
+            self._times.insert(i, at)
+            self._loads.insert(i, self._loads[i - 1] if i else 0)
+        self._refs[at] += 1
+        return i
+
+    def _release(self, at: datetime):
+        self._refs[at] -= 1
+        if not self._refs[at]:
+            # no path starts or ends here, so the load is the same as the previous step
+            del self._refs[at]
+            i = bisect.bisect_left(self._times, at)
+            del self._times[i]
+            del self._loads[i]
+
+    def add(self, path: Path):
+        if not path.departure < path.arrival:
+            return
+        i = self._insert(path.departure)
+        j = self._insert(path.arrival)
+        for k in range(i, j):
+            self._loads[k] += 1
+
+    def remove(self, path: Path):
+        if not path.departure < path.arrival:
+            return
+        i = bisect.bisect_left(self._times, path.departure)
+        j = bisect.bisect_left(self._times, path.arrival)
+        for k in range(i, j):
+            self._loads[k] -= 1
+        self._release(path.arrival)
+        self._release(path.departure)
+
+    def max_load(self, path: Path) -> int:
+        """maximum load while riding along the path"""
+        i = max(bisect.bisect_right(self._times, path.departure) - 1, 0)
+        j = bisect.bisect_left(self._times, path.arrival)
+        return max(self._loads[i:j], default=0)
+
+
 class Car(Mobility):
     def __init__(
         self,
@@ -31,6 +87,7 @@ class Car(Mobility):
         self.users: dict[
             str, User
         ] = {}  # 車両を予約している/停車駅に待機している/車両に乗車している すべての利用者
+        self._occupancy = Occupancy()  # paths of all the users
 
     @property
     def stop(self):
@@ -59,21 +116,8 @@ class Car(Mobility):
         ]
 
     def is_reservable(self, reservation: Path):
-        paths = [user.path for user in self.users.values()] + [reservation]
-        for path in paths:
-            departure = path.departure
-            if (
-                len(
-                    [
-                        path
-                        for path in paths
-                        if path.departure <= departure < path.arrival
-                    ]
-                )
-                > self._capacity
-            ):
-                return False
-        return True
+        # the reserved paths are within the capacity, as they have been checked on their reservations
+        return self._occupancy.max_load(reservation) + 1 <= self._capacity
 
     def _get_on(self):
         assert self.stop
@@ -102,6 +146,7 @@ class Car(Mobility):
                     ArrivedEvent(env=self.env, mobility=self, user=user)
                 )
                 self.users.pop(user.user_id)
+                self._occupancy.remove(user.path)
 
     def _arrive(self, stop: Stop):
         self._stop = stop
@@ -146,6 +191,7 @@ class Car(Mobility):
     def reserve(self, user_id: str, demand_id: str, path: Path):
         assert user_id not in self.users
         self.users.update({user_id: User(user_id, demand_id, path)})
+        self._occupancy.add(path)
         self.env.process(self._reserved(self.users[user_id]))
 
     def _reserved(self, user: User):
@@ -166,13 +212,11 @@ class Car(Mobility):
         dept_datetime = self.env.datetime_from(dept)
 
         # Search for paths for one day before or after the day of operation, including the day of operation.
-        for path in chain(
-            self.paths(org, dst, at=dept_datetime.date() - timedelta(days=1)),
-            self.paths(org, dst, at=dept_datetime.date()),
-            self.paths(org, dst, at=dept_datetime.date() + timedelta(days=1)),
-        ):
-            # This route is available for boarding.
-            if dept_datetime <= path.departure:
+        for days in (-1, 0, 1):
+            at = dept_datetime.date() + timedelta(days=days)
+            if (trip := self.trip(at)) and (
+                path := trip.earliest_path(org, dst, at, dept_datetime)
+            ):
                 return path
         return None
 
@@ -204,6 +248,12 @@ class CarManager:
             )
             for setting in settings
         }
+        self._operating: DateCache[set[Car]] = DateCache()
+        # cars stopping at each stop, in the order of the mobilities
+        self._cars_by_stop: dict[Stop, list[Car]] = {}
+        for car in self.mobilities.values():
+            for stop in dict.fromkeys(car._trip.stops):
+                self._cars_by_stop.setdefault(stop, []).append(car)
 
     def find_user(self, user_id: str):
         for mobility in self.mobilities.values():
@@ -215,16 +265,29 @@ class CarManager:
         for car in self.mobilities.values():
             self.env.process(car.run())
 
+    def operating(self, at: date) -> set[Car]:
+        """cars whose trips are in operation on the date"""
+        return self._operating.get(
+            at, lambda at_: {car for car in self.mobilities.values() if car.trip(at_)}
+        )
+
     def earliest_mobility(self, org: Stop, dst: Stop, dept: float) -> Car | None:
         """Return the vehicle that arrives at the destination earliest.
 
         Returns `None` If there is no vehicle available"""
 
+        # only the cars stopping at both the stops and in operation around the date can take the user
+        dept_date = self.env.datetime_from(dept).date()
+        operating = [
+            self.operating(dept_date + timedelta(days=days)) for days in (-1, 0, 1)
+        ]
+        cars = set(self._cars_by_stop.get(dst, []))
         car_arrivals = {
             k: v.arrival
             for k, v in {
                 car: car.earliest_path(org, dst, dept)
-                for car in self.mobilities.values()
+                for car in self._cars_by_stop.get(org, [])
+                if car in cars and any(car in e for e in operating)
             }.items()
             if v
         }
@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 from __future__ import annotations
 
+from collections.abc import Mapping
 from datetime import datetime
 from logging import getLogger
 
@@ -18,8 +19,8 @@ class Simulation:
         self,
         start_time: datetime,
         capacity: int,
-        trips: dict[str, SingleTrip] | None = None,
-        blocks: dict[str, list[SingleTrip]] | None = None,
+        trips: Mapping[str, SingleTrip] | None = None,
+        blocks: Mapping[str, list[SingleTrip]] | None = None,
     ) -> None:
         trips = trips or {}
         blocks = blocks or {}
@@ -0,0 +1,124 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import io
+import unittest
+import zipfile
+from datetime import timedelta
+
+from gtfs import GtfsFilesReader, str_time
+
+files = {
+    "agency.txt": "agency_id,agency_name,agency_url,agency_timezone\n"
+    "A1,agency,http://example.com,Asia/Tokyo\n",
+    "stops.txt": "stop_id,stop_name,stop_lat,stop_lon\n"
+    "S1,stop1,35.0,139.0\n"
+    "S2,stop2,35.1,139.1\n"
+    "S3,stop3,35.2,139.2\n",
+    "routes.txt": "route_id,agency_id,route_long_name,route_short_name,route_type\n"
+    "R1,A1,route,r,3\n",
+    "calendar.txt": "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date\n"
+    "W,1,1,1,1,1,0,0,20240101,20241231\n",
+    "calendar_dates.txt": "service_id,date,exception_type\nW,20240102,2\n",
+    # rows of the trips are interleaved
+    "stop_times.txt": "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+    "T1,09:00:00,09:00:00,S1,1\n"
+    "T2,9:30:00,,S2,1\n"
+    "T1,09:10:00,09:11:00,S2,2\n"
+    "T2,,25:40:30,S3,2\n"
+    "T1,09:20:00,09:20:00,S3,3\n"
+    "B1,10:00:00,10:00:00,S3,1\n"
+    "B1,10:10:00,10:10:00,S1,2\n"
+    "B2,11:00:00,11:00:00,S1,1\n"
+    "B2,11:10:00,11:10:00,S3,2\n",
+    "trips.txt": "route_id,service_id,trip_id,block_id\n"
+    "R1,W,T1,\n"
+    "R1,W,T2,\n"
+    "R1,W,B1,block\n"
+    "R1,W,B2,block\n",
+}
+
+
+def archive(contents: dict[str, str] = files):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as f:
+        for name, content in contents.items():
+            f.writestr(name, content)
+    return zipfile.ZipFile(data)
+
+
+class GtfsFilesReaderTestCase(unittest.TestCase):
+    def setUp(self):
+        with archive() as f:
+            self.gtfs = GtfsFilesReader(f)
+
+    def test_str_time(self):
+        self.assertEqual(
+            timedelta(hours=25, minutes=40, seconds=30), str_time("25:40:30")
+        )
+        self.assertEqual(timedelta(hours=9, minutes=5), str_time("9:05:00"))
+        self.assertIsNone(str_time(""))
+        self.assertIsNone(str_time("09:05"))
+        self.assertIsNone(str_time(" 9:05:00"))
+        self.assertIsNone(str_time("100:00:00"))
+        self.assertIsNone(str_time("09:-5:00"))
+
+    def test_trips(self):
+        self.assertEqual(["T1", "T2"], list(self.gtfs.trips))
+        self.assertNotIn("B1", self.gtfs.trips)
+
+        trip = self.gtfs.trips["T1"]
+        self.assertIs(trip, self.gtfs.trips["T1"])
+        self.assertEqual(["S1", "S2", "S3"], [stop.stop_id for stop in trip.stops])
+        self.assertEqual(
+            [
+                (timedelta(hours=9), timedelta(hours=9)),
+                (timedelta(hours=9, minutes=10), timedelta(hours=9, minutes=11)),
+                (timedelta(hours=9, minutes=20), timedelta(hours=9, minutes=20)),
+            ],
+            [(e.arrival, e.departure) for e in trip.stop_times],
+        )
+
+    def test_missing_times(self):
+        trip = self.gtfs.trips["T2"]
+
+        self.assertEqual(
+            [
+                (timedelta(hours=9, minutes=30), timedelta(hours=9, minutes=30)),
+                (
+                    timedelta(hours=25, minutes=40, seconds=30),
+                    timedelta(hours=25, minutes=40, seconds=30),
+                ),
+            ],
+            [(e.arrival, e.departure) for e in trip.stop_times],
+        )
+
+    def test_invalid_times(self):
+        # malformed feeds fail at load, not when the trip is used
+        invalid = files | {
+            "stop_times.txt": files["stop_times.txt"] + "T1,9:30,x,S1,4\n"
+        }
+        with archive(invalid) as f, self.assertRaises(ValueError) as cm:
+            GtfsFilesReader(f)
+        self.assertIn("no valid arrival_time nor departure_time", str(cm.exception))
+
+    def test_stop_times_view(self):
+        stop_times = self.gtfs.trips["T1"].stop_times
+        self.assertEqual(3, len(stop_times))
+        self.assertEqual("S3", stop_times[-1].stop.stop_id)
+        self.assertEqual(["S2", "S3"], [e.stop.stop_id for e in stop_times[1:]])
+        self.assertEqual(list(stop_times), [stop_times[i] for i in range(3)])
+        with self.assertRaises(IndexError):
+            stop_times[3]
+
+    def test_blocks(self):
+        self.assertEqual(["block"], list(self.gtfs.blocks))
+
+        block = self.gtfs.blocks["block"]
+        self.assertEqual(2, len(block))
+        self.assertEqual(["S3", "S1"], [stop.stop_id for stop in block[0].stops])
+        self.assertEqual(["S1", "S3"], [stop.stop_id for stop in block[1].stops])
+        self.assertEqual("block", block[0].block_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,9 +4,10 @@ import logging
 import unittest
 from datetime import date, datetime, time, timedelta
 
-from core import EventType, Service, Stop, StopTime
+from core import EventType, Path, Service, Stop, StopTime, StopTimeWithDateTime
+from mobility import Occupancy
 from simulation import Simulation
-from trip import BlockTrip, SingleTrip
+from trip import BlockTrip, DateCache, SingleTrip
 
 logger = logging.getLogger(__name__)
 BASE_DATE = date(2022, 1, 1)
@@ -623,5 +624,125 @@ class BlockTripBoundaryTimeTestCase(unittest.TestCase):
         self.assertEqual(timedelta(minutes=595), stop_times[3].departure)
 
 
+class TimetableTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stops = gtfs_stations
+        self.trip = SingleTrip(
+            route=...,
+            service=Service(
+                start_date=BASE_DATE,
+                end_date=BASE_DATE + timedelta(days=1),
+                saturday=True,
+            ),
+            stop_times=[
+                StopTime(
+                    stop=self.stops[each[0]],
+                    departure=timedelta(minutes=each[1]),
+                )
+                for each in [
+                    ("3_1", 540),
+                    ("7_1", 545),
+                    ("11_1", 550),
+                    ("3_1", 555),  # loop back to the first stop
+                    ("7_1", 560),
+                ]
+            ],
+        )
+
+    def test_earliest_path(self):
+        org, dst = self.stops["3_1"], self.stops["7_1"]
+        base = datetime.combine(BASE_DATE, time())
+
+        path = self.trip.earliest_path(org, dst, BASE_DATE, base)
+        self.assertEqual(
+            (base + timedelta(minutes=540), base + timedelta(minutes=545)),
+            (path.departure, path.arrival),
+        )
+
+        path = self.trip.earliest_path(
+            org, dst, BASE_DATE, base + timedelta(minutes=541)
+        )
+        self.assertEqual(
+            (base + timedelta(minutes=555), base + timedelta(minutes=560)),
+            (path.departure, path.arrival),
+        )
+
+        path = self.trip.earliest_path(dst, org, BASE_DATE, base)
+        self.assertEqual(
+            (base + timedelta(minutes=545), base + timedelta(minutes=555)),
+            (path.departure, path.arrival),
+        )
+
+        self.assertIsNone(
+            self.trip.earliest_path(org, dst, BASE_DATE, base + timedelta(minutes=556))
+        )
+        # not in operation on Sunday
+        self.assertIsNone(
+            self.trip.earliest_path(org, dst, BASE_DATE + timedelta(days=1), base)
+        )
+        self.assertIsNone(
+            self.trip.earliest_path(org, self.stops["35_1"], BASE_DATE, base)
+        )
+
+
+class DateCacheTestCase(unittest.TestCase):
+    def test_evict_least_recently_used(self):
+        cache = DateCache(maxsize=2)
+        computed = []
+
+        def compute(at: date):
+            computed.append(at)
+            return [at]
+
+        days = [BASE_DATE + timedelta(days=i) for i in range(3)]
+        value = cache.get(days[0], compute)
+        self.assertIs(value, cache.get(days[0], compute))
+        cache.get(days[1], compute)
+        cache.get(days[0], compute)
+        cache.get(days[2], compute)  # evicts days[1]
+        cache.get(days[0], compute)
+        cache.get(days[1], compute)
+
+        self.assertEqual([days[0], days[1], days[2], days[1]], computed)
+
+
+class OccupancyTestCase(unittest.TestCase):
+    def path(self, departure: int, arrival: int):
+        return Path(
+            pick_up=StopTimeWithDateTime(
+                stop_time=StopTime(
+                    stop=gtfs_stations["3_1"],
+                    departure=timedelta(minutes=540 + departure),
+                ),
+                reference_date=BASE_DATE,
+            ),
+            drop_off=StopTimeWithDateTime(
+                stop_time=StopTime(
+                    stop=gtfs_stations["7_1"], arrival=timedelta(minutes=540 + arrival)
+                ),
+                reference_date=BASE_DATE,
+            ),
+        )
+
+    def test_max_load(self):
+        occupancy = Occupancy()
+        occupancy.add(self.path(10, 20))
+        occupancy.add(self.path(15, 30))
+        occupancy.add(self.path(20, 25))
+
+        self.assertEqual(1, occupancy.max_load(self.path(0, 15)))
+        self.assertEqual(2, occupancy.max_load(self.path(15, 20)))
+        self.assertEqual(2, occupancy.max_load(self.path(0, 40)))
+        self.assertEqual(1, occupancy.max_load(self.path(25, 40)))
+        self.assertEqual(0, occupancy.max_load(self.path(30, 40)))
+
+        occupancy.remove(self.path(15, 30))
+
+        self.assertEqual(1, occupancy.max_load(self.path(0, 40)))
+        occupancy.remove(self.path(10, 20))
+        occupancy.remove(self.path(20, 25))
+        self.assertEqual(0, occupancy.max_load(self.path(0, 40)))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,19 +1,98 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import bisect
+import collections
 import dataclasses
+import functools
 import itertools
-from datetime import date
+import typing
+from datetime import date, datetime, time
 
 from core import Path, Route, Service, Stop, StopTime, StopTimeWithDateTime, Trip
 
+T = typing.TypeVar("T")
+
+
+class DateCache(typing.Generic[T]):
+    """values computed for each date, keeping the most recently used ones
+
+    The simulation looks up the dates around the current one, so a few entries are enough."""
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._values: collections.OrderedDict[date, T] = collections.OrderedDict()
+
+    def get(self, at: date, compute: typing.Callable[[date], T]) -> T:
+        if at in self._values:
+            self._values.move_to_end(at)
+            return self._values[at]
+        value = self._values[at] = compute(at)
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+        return value
+
+
+@dataclasses.dataclass(frozen=True)
+class Timetable:
+    """stop times of a trip indexed by stops, to look up the earliest path by bisection
+
+    The stop times are assumed to be in chronological order, as in GTFS."""
+
+    stop_times: typing.Sequence[StopTime]
+    positions: dict[Stop, list[int]]  # positions of the stop times at each stop
+    departures: dict[Stop, list]  # departures at each stop, in the order of positions
+    arrivals: dict[Stop, list]  # arrivals at each stop, in the order of positions
+
+    @classmethod
+    def build(cls, stop_times: typing.Sequence[StopTime]) -> Timetable:
+        positions: dict[Stop, list[int]] = {}
+        departures: dict[Stop, list] = {}
+        arrivals: dict[Stop, list] = {}
+        for i, stop_time in enumerate(stop_times):
+            positions.setdefault(stop_time.stop, []).append(i)
+            departures.setdefault(stop_time.stop, []).append(stop_time.departure)
+            arrivals.setdefault(stop_time.stop, []).append(stop_time.arrival)
+        return cls(
+            stop_times=stop_times,
+            positions=positions,
+            departures=departures,
+            arrivals=arrivals,
+        )
+
+    def earliest_path(self, org: Stop, dst: Stop, at: date, dept: datetime):
+        """path from the earliest departure at or after dept to the first arrival after it"""
+        if org not in self.positions or dst not in self.positions:
+            return None
+        departures = self.departures[org]
+        i = bisect.bisect_left(departures, dept - datetime.combine(at, time()))
+        if i == len(departures):
+            return None
+        arrivals = self.arrivals[dst]
+        k = bisect.bisect_right(arrivals, departures[i])
+        if k == len(arrivals):
+            return None
+        return Path(
+            pick_up=StopTimeWithDateTime(
+                stop_time=self.stop_times[self.positions[org][i]], reference_date=at
+            ),
+            drop_off=StopTimeWithDateTime(
+                stop_time=self.stop_times[self.positions[dst][k]], reference_date=at
+            ),
+        )
+
 
 @dataclasses.dataclass(frozen=True)
 class SingleTrip(Trip):
-    """Sequence of two or more stops that occur during a specific time period."""
+    """Sequence of two or more stops that occur during a specific time period.
+
+    The stop times may be a view of the stop times table of the feed,
+    which builds each StopTime on access."""
 
     route: Route
     service: Service
-    stop_times: list[StopTime]
+    stop_times: typing.Sequence[StopTime]
     block_id: str = ""
 
     def __post_init__(self):
@@ -27,25 +106,35 @@ class SingleTrip(Trip):
         return self.service.is_operation(at)
 
     def stop_times_at(self, at: date):
-        return [
+        return (
             StopTimeWithDateTime(stop_time=stop_time, reference_date=at)
             for stop_time in self.stop_times
-        ]
+        )
 
     def start_time(self, at: date):
-        return next(iter(self.stop_times_at(at))).arrival
+        return datetime.combine(at, time()) + self.stop_times[0].arrival
 
     def end_time(self, at: date):
-        return list(self.stop_times_at(at))[-1].departure
+        return datetime.combine(at, time()) + self.stop_times[-1].departure
+
+    @functools.cached_property
+    def timetable(self):
+        return Timetable.build(self.stop_times)
+
+    def earliest_path(self, org: Stop, dst: Stop, at: date, dept: datetime):
+        if not self.service.is_operation(at):
+            return None
+        return self.timetable.earliest_path(org, dst, at, dept)
 
     def paths(self, org: Stop, dst: Stop, at: date):
         if not self.service.is_operation(at):
             return
 
         # This is redundant because a single trip may contain multiple identical stations.
-        for stop_time_org in self.stop_times_at(at):
+        stop_times = list(self.stop_times_at(at))
+        for stop_time_org in stop_times:
             if stop_time_org.stop == org:
-                for stop_time_dst in self.stop_times_at(at):
+                for stop_time_dst in stop_times:
                     if (
                         stop_time_dst.stop == dst
                         and stop_time_org.departure < stop_time_dst.arrival
@@ -58,6 +147,13 @@ class BlockTrip(Trip):
     """Sequence of trips which belong to a block"""
 
     trips: list[SingleTrip]
+    # timetables for each combination of the operating trips
+    _timetables: dict[tuple[int, ...], Timetable] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _stop_times: DateCache[list[StopTime]] = dataclasses.field(
+        default_factory=DateCache, init=False, repr=False, compare=False
+    )
 
     def __post_init__(self):
         assert len(self.trips) >= 2
@@ -79,6 +175,10 @@ class BlockTrip(Trip):
         return any(trip.service.is_operation(at) for trip in self.trips)
 
     def _normalized_stop_times(self, at: date) -> list[StopTime]:
+        """stop times of the operating trips merged at the boundaries, which must not be modified"""
+        return self._stop_times.get(at, self._normalize)
+
+    def _normalize(self, at: date) -> list[StopTime]:
         operating_trips = [trip for trip in self.trips if trip.service.is_operation(at)]
         if not operating_trips:
             return []
@@ -142,18 +242,36 @@ class BlockTrip(Trip):
         ]
 
     def start_time(self, at: date):
-        return next(iter(self.stop_times_at(at))).arrival
+        return datetime.combine(at, time()) + self._normalized_stop_times(at)[0].arrival
 
     def end_time(self, at: date):
-        return list(self.stop_times_at(at))[-1].departure
+        return (
+            datetime.combine(at, time()) + self._normalized_stop_times(at)[-1].departure
+        )
+
+    def timetable(self, at: date) -> Timetable:
+        key = tuple(
+            i for i, trip in enumerate(self.trips) if trip.service.is_operation(at)
+        )
+        if (timetable := self._timetables.get(key)) is None:
+            timetable = self._timetables[key] = Timetable.build(
+                self._normalized_stop_times(at)
+            )
+        return timetable
+
+    def earliest_path(self, org: Stop, dst: Stop, at: date, dept: datetime):
+        if not self.is_operation(at):
+            return None
+        return self.timetable(at).earliest_path(org, dst, at, dept)
 
     def paths(self, org: Stop, dst: Stop, at: date):
         if not self.is_operation(at):
             return
 
-        for stop_time_org in self.stop_times_at(at):
+        stop_times = self.stop_times_at(at)
+        for stop_time_org in stop_times:
             if stop_time_org.stop == org:
-                for stop_time_dst in self.stop_times_at(at):
+                for stop_time_dst in stop_times:
                     if (
                         stop_time_dst.stop == dst
                         and stop_time_org.departure < stop_time_dst.arrival
@@ -6,6 +6,7 @@ import math
 import fastapi
 from core import Location
 from jschema import query, response
+from mblib.io import stepping
 from mblib.io.log import init_logger
 from mblib.jschema import events, spec
 from simulation import Simulation
@@ -51,7 +52,9 @@ def get_specification():
     builder.set_feature(events.EventType.ARRIVED, declared=["demand_id"])
     builder.set_feature(events.EventType.RESERVE, required=["demand_id"])
     builder.set_feature(events.EventType.DEPART, required=["demand_id"])
-    return builder.get_specification_response(version=events.VERSION_1)
+    return builder.get_specification_response(
+        version=events.VERSION_1, api=spec.ApiDefinition(advance=True, independent=True)
+    )
 
 
 @app.post("/setup", response_model=response.Message)
@@ -81,6 +84,13 @@ def step():
     return response.Step(now=now, events=events)
 
 
+@app.post("/advance", response_model=response.Advance)
+def advance(until: float | None = None):
+    now, next_, events_ = stepping.advance(sim.peek, sim.step, sim.env.now, until)
+    next_ = next_ if math.isfinite(next_) else -1
+    return response.Advance(now=now, next=next_, events=events_)
+
+
 @app.post("/triggered")
 def triggered(event: query.TriggeredEvent | events.Event):
     # just let time forward to expect nothing to happen.
@@ -111,6 +121,12 @@ def triggered(event: query.TriggeredEvent | events.Event):
             )
 
 
+@app.post("/triggered/batch")
+def triggered_batch(events_: list[query.TriggeredEvent | events.Event]):
+    for event in events_:
+        triggered(event)
+
+
 @app.get("/reservable", response_model=response.ReservableStatus)
 def reservable(_org: str, _dst: str):
     return response.ReservableStatus(reservable=True)
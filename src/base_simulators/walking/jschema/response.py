@@ -17,6 +17,12 @@ class Step(BaseModel):
     events: list[ReservedEvent | DepartedEvent | ArrivedEvent]
 
 
+class Advance(BaseModel):
+    now: float
+    next: float
+    events: list[ReservedEvent | DepartedEvent | ArrivedEvent]
+
+
 class ReservableStatus(BaseModel):
     reservable: bool
 
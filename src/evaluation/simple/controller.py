@@ -51,7 +51,9 @@ writer: ResultWriter | None = None
 def get_specification():
     builder = spec.EventSpecificationBuilder(triggered=query.TriggeredEvent)
     builder.set_feature(events.EventType.DEMAND)
-    return builder.get_specification_response(version=events.VERSION_1)
+    return builder.get_specification_response(
+        version=events.VERSION_1, api=spec.ApiDefinition(advance=True, independent=True)
+    )
 
 
 @app.post("/setup", response_model=response.Message)
@@ -88,6 +90,17 @@ async def step():
     return response.Step(now=now, events=[])
 
 
+@app.post("/advance", response_model=response.Advance)
+async def advance(until: float | None = None):
+    # no events are emitted, so step through all the events until `until`
+    until = until if until is not None else math.inf
+    now = manager.env.now
+    while math.isfinite(next_ := manager.env.peek()) and next_ <= until:
+        now = await manager.step()
+    next_ = next_ if math.isfinite(next_) else -1
+    return response.Advance(now=now, next=next_, events=[])
+
+
 @app.post("/triggered")
 def triggered(event: query.TriggeredEvent | events.Event):
     match event:
@@ -110,6 +123,12 @@ def triggered(event: query.TriggeredEvent | events.Event):
             )
 
 
+@app.post("/triggered/batch")
+def triggered_batch(events_: list[query.TriggeredEvent | events.Event]):
+    for event in events_:
+        triggered(event)
+
+
 @app.post("/finish", response_model=response.Message)
 async def finish():
     global manager, writer
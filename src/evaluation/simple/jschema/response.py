@@ -20,5 +20,11 @@ class Step(BaseModel):
     events: list | None = []
 
 
+class Advance(BaseModel):
+    now: float
+    next: float
+    events: list | None = []
+
+
 class ReservableStatus(BaseModel):
     reservable: bool
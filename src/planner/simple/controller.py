@@ -2,6 +2,8 @@
 # SPDX-License-Identifier: Apache-2.0
 import datetime
 import io
+import itertools
+import json
 import logging
 import zipfile
 from typing import Annotated
@@ -16,6 +18,7 @@ from gtfs.reader import FilesReader as GtfsFiles
 from gtfs_flex.network import Network as GtfsFlexNetwork
 from gtfs_flex.reader import FilesReader as GtfsFlexFiles
 from jschema import query, response
+from matrix_cache import MatrixCache
 from mblib.io import httputil
 from mblib.io.log import init_logger
 from route_planner import DirectPathPlanner, Planner
@@ -45,6 +48,7 @@ def exception_callback(request: fastapi.Request, exc: Exception):
 
 
 file_table = httputil.FileManager()
+matrix_cache = MatrixCache()
 planner: Planner | None = None
 
 
@@ -84,6 +88,7 @@ async def setup(settings: query.Setup):
                 network = GbfsNetwork(
                     service=name,
                     walking_meters_per_minute=settings.walking_meters_per_minute,
+                    max_walking_meters=settings.max_walking_meters,
                     mobility_meters_per_minute=setting.mobility_meters_per_minute,
                 )
                 network.setup(gbfs_files.stations.values())
@@ -103,6 +108,7 @@ async def setup(settings: query.Setup):
                     service=name,
                     start_time=start_time,
                     walking_meters_per_minute=settings.walking_meters_per_minute,
+                    max_walking_meters=settings.max_walking_meters,
                     max_waiting_bus_time=setting.max_waiting_time,
                 )
                 network.setup(gtfs_files.trips.values())
@@ -122,6 +128,7 @@ async def setup(settings: query.Setup):
                     service=name,
                     start_time=start_time,
                     walking_meters_per_minute=settings.walking_meters_per_minute,
+                    max_walking_meters=settings.max_walking_meters,
                     mobility_meters_per_minute=setting.mobility_meters_per_minute,
                     expected_waiting_time=setting.expected_waiting_time,
                 )
@@ -132,22 +139,42 @@ async def setup(settings: query.Setup):
             networks.append(network)
 
     global planner
-    planner = DirectPathPlanner(networks)
+    planner = DirectPathPlanner(networks, matrix_cache=matrix_cache)
 
     return {"message": "successfully configured."}
 
 
-@app.post("/matrix", response_model=response.DistanceMatrix)
+# the matrix is streamed, so that the response is documented but not validated by the model
+@app.post("/matrix", responses={200: {"model": response.DistanceMatrix}})
 async def meters_for_all_stops_combinations(stops: list[query.LocationSetting]):
-    return planner.meters_for_all_stops_combinations(
-        [Location(e.locationId, e.lat, e.lng) for e in stops]
-    )
+    if planner is None:
+        msg = "planner is not set up"
+        raise fastapi.HTTPException(fastapi.status.HTTP_409_CONFLICT, msg)
+    locations = [Location(e.locationId, e.lat, e.lng) for e in stops]
+
+    # The cache is opened and the first rows are computed before the response starts,
+    # so that their errors are returned as the status instead of a truncated body.
+    chunks = planner.meters_chunks_for_all_stops_combinations(locations)
+    if (first := next(chunks, None)) is not None:
+        chunks = itertools.chain([first], chunks)
+
+    # stream the rows as they are computed, instead of the whole matrix at once
+    def content():
+        yield '{"stops": ' + json.dumps([e.id_ for e in locations]) + ', "matrix": ['
+        separator = ""
+        for chunk in chunks:
+            yield separator + ", ".join(json.dumps(row) for row in chunk.tolist())
+            separator = ", "
+        yield "]}"
+
+    return fastapi.responses.StreamingResponse(content(), media_type="application/json")
 
 
 # `response_model=list[Path]` does not work
 # @app.post("/plan", response_model=list[Path])
+# served in the thread pool, since the networks are not modified by queries
 @app.post("/plan")
-async def plan(
+def plan(
     org: query.LocationSetting,
     dst: query.LocationSetting,
     dept: float,
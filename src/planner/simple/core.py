@@ -1,8 +1,15 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
 import dataclasses
+import heapq
+import itertools
+import typing
 
-from geopy.distance import great_circle
+import networkx as nx
+import numpy as np
+from geopy.distance import EARTH_RADIUS, great_circle
+
+EARTH_RADIUS_METERS = EARTH_RADIUS * 1000
 
 
 @dataclasses.dataclass(frozen=True)
@@ -16,6 +23,93 @@ class Location:
         return great_circle([self.lat, self.lng], [other.lat, other.lng]).meters
 
 
+def haversine(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """great-circle distances in meters between points in radians, vectorized"""
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class LocationIndex:
+    """grid index of locations to find the ones within a radius
+
+    The cells are squares of `cell_meters` in radians of latitude/ longitude."""
+
+    def __init__(
+        self, locations: typing.Iterable[Location], cell_meters: float = 1000.0
+    ):
+        self.locations = list(locations)
+        self._lat = np.radians([location.lat for location in self.locations])
+        self._lng = np.radians([location.lng for location in self.locations])
+        self._cell = cell_meters / EARTH_RADIUS_METERS
+        cells: dict[tuple[int, int], list[int]] = {}
+        for i, cell in enumerate(
+            zip(
+                np.floor(self._lat / self._cell).astype(int).tolist(),
+                np.floor(self._lng / self._cell).astype(int).tolist(),
+            )
+        ):
+            cells.setdefault(cell, []).append(i)
+        self._cells = {cell: np.array(indices) for cell, indices in cells.items()}
+
+    def __len__(self):
+        return len(self.locations)
+
+    def distances(self, location: Location, indices: np.ndarray | None = None):
+        """meters from the location to the indexed locations (all of them by default)"""
+        lat, lng = np.radians(location.lat), np.radians(location.lng)
+        if indices is None:
+            return haversine(lat, lng, self._lat, self._lng)
+        return haversine(lat, lng, self._lat[indices], self._lng[indices])
+
+    def meters_between(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """meters between the indexed locations of the rows and the columns"""
+        return haversine(
+            self._lat[rows, None],
+            self._lng[rows, None],
+            self._lat[columns],
+            self._lng[columns],
+        )
+
+    def within(
+        self, location: Location, radius: float | None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """indices of the locations within the radius (all of them if None) and the meters to them"""
+        cells = None if radius is None else self._candidates(location, radius)
+        if cells is None:
+            indices = np.arange(len(self))
+        else:
+            # in the order of the locations
+            indices = np.sort(np.concatenate(cells or [np.empty(0, dtype=int)]))
+        meters = self.distances(location, indices)
+        if radius is not None:
+            mask = meters <= radius
+            indices, meters = indices[mask], meters[mask]
+        return indices, meters
+
+    def _candidates(self, location: Location, radius: float) -> list[np.ndarray] | None:
+        # cells overlapping the bounding box of the circle;
+        # None if the box is too wide, so that all the locations are scanned
+        lat, lng = np.radians(location.lat), np.radians(location.lng)
+        d_lat = radius / EARTH_RADIUS_METERS
+        cos_lat = np.cos(min(abs(lat) + d_lat, np.pi / 2))
+        if cos_lat <= d_lat or abs(lng) + d_lat / cos_lat >= np.pi:
+            return None
+        d_lng = d_lat / cos_lat
+        i0, i1 = (int(np.floor(e / self._cell)) for e in (lat - d_lat, lat + d_lat))
+        j0, j1 = (int(np.floor(e / self._cell)) for e in (lng - d_lng, lng + d_lng))
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._cells):
+            return None
+        return [
+            cell
+            for i in range(i0, i1 + 1)
+            for j in range(j0, j1 + 1)
+            if (cell := self._cells.get((i, j))) is not None
+        ]
+
+
 @dataclasses.dataclass(frozen=True)
 class Trip:
     org: Location
@@ -69,3 +163,49 @@ class WalkingNetwork(MobilityNetwork):
                 )
             ]
         )
+
+
+def shortest_path_via(
+    graph: nx.Graph,
+    org_costs: typing.Mapping[typing.Hashable, float],
+    dst_costs: typing.Mapping[typing.Hashable, float],
+    weight: str,
+) -> tuple[list, list[float]]:
+    """Dijkstra's algorithm from a virtual org node to a virtual dst node
+
+    The virtual nodes are connected to the nodes of the graph by org_costs/ dst_costs,
+    instead of adding temporary nodes to the graph, so that the graph is left read-only.
+    Returns the nodes on the shortest path between org and dst and the costs of its edges.
+    """
+    # nodes are visited in the same order as networkx.shortest_path on the graph with
+    # the temporary nodes, so that the same one of the shortest paths is selected.
+    org, dst = object(), object()
+    counter = itertools.count()
+    fringe = [(0.0, next(counter), org)]
+    dist: dict[typing.Hashable, float] = {}
+    seen: dict[typing.Hashable, float] = {org: 0.0}
+    paths: dict[typing.Hashable, list] = {org: []}
+    costs: dict[typing.Hashable, list[float]] = {org: []}
+    while fringe:
+        d, _, v = heapq.heappop(fringe)
+        if v in dist:
+            continue
+        dist[v] = d
+        if v is dst:
+            return paths[v][:-1], costs[v]
+
+        if v is org:
+            edges = org_costs.items()
+        else:
+            edges = ((u, e[weight]) for u, e in graph.adj[v].items())
+            if v in dst_costs:
+                edges = itertools.chain(edges, [(dst, dst_costs[v])])
+        for u, cost in edges:
+            vu_dist = d + cost
+            if u not in dist and (u not in seen or vu_dist < seen[u]):
+                seen[u] = vu_dist
+                heapq.heappush(fringe, (vu_dist, next(counter), u))
+                paths[u] = paths[v] + [u]
+                costs[u] = costs[v] + [cost]
+
+    raise nx.NetworkXNoPath("No path between org and dst.")
@@ -1,18 +1,14 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
-import itertools
 import logging
 import typing
 
-import networkx as nx
-from core import Location, MobilityNetwork, Path, Trip
+import numpy as np
+from core import Location, LocationIndex, MobilityNetwork, Path, Trip
 
 logger = logging.getLogger(__name__)
 
-
-class Node(typing.NamedTuple):
-    location: Location
-    side: str
+CHUNK_ELEMENTS = 1 << 20  # elements of a chunk of the station pairs
 
 
 class Network(MobilityNetwork):
@@ -21,94 +17,94 @@ class Network(MobilityNetwork):
         service: str,
         mobility_meters_per_minute: float,
         walking_meters_per_minute: float,
+        max_walking_meters: float | None = None,
     ):
         self.service = service
         self.mobility_velocity = mobility_meters_per_minute
         self.walking_velocity = walking_meters_per_minute
-        self.graph = nx.Graph()
-
-    def setup(self, locations: typing.Collection[Location]):
-        self.graph.clear()
-
-        for u, v in itertools.product(
-            [Node(location=location, side="org") for location in locations],
-            [Node(location=location, side="dst") for location in locations],
-        ):
-            u: Node
-            v: Node
-
-            # Nodes at the same location are not connected to each other.
-            if u.location == v.location:
-                continue
+        self.max_walking_meters = max_walking_meters
+        self.index = LocationIndex([])
 
-            # Nodes on the same side are not connected to each other.
-            assert u.side != v.side
+    @property
+    def stations(self) -> list[Location]:
+        return self.index.locations
 
-            # Nodes on the "org" side are only connected to nodes on the "dst" side.
-            self.graph.add_edge(
-                u_of_edge=u,
-                v_of_edge=v,
-                cost=u.location.distance(v.location) / self.mobility_velocity,
-            )
-
-    def _shortest_nodes_on_path(self, org: Location, dst: Location):
-        # Add temporary nodes, indicating org/ dst location.
-        # Nodes on the "org" side are only connected to org location.
-        # Nodes on the "dst" side are only connected to dst location.
-        for node in list(self.graph.nodes):
-            target = org if node.side == "org" else dst
-            self.graph.add_edge(
-                node,
-                target,
-                cost=node.location.distance(target) / self.walking_velocity,
+    def setup(self, locations: typing.Collection[Location]):
+        # stations at the same location are the same station.
+        self.index = LocationIndex(
+            dict.fromkeys(locations), cell_meters=self.max_walking_meters or 1000.0
+        )
+
+    def _best_stations(
+        self, org: Location, dst: Location
+    ) -> tuple[Location, Location] | None:
+        # The mobility leg is a direct ride between two stations,
+        # so the best pair of the stations within walking distance is searched exhaustively.
+        orgs, org_meters = self.index.within(org, self.max_walking_meters)
+        dsts, dst_meters = self.index.within(dst, self.max_walking_meters)
+        if not len(orgs) or not len(dsts):
+            return None
+        org_minutes = org_meters / self.walking_velocity
+        dst_minutes = dst_meters / self.walking_velocity
+
+        best, best_pair = np.inf, None
+        size = max(1, CHUNK_ELEMENTS // len(dsts))
+        for start in range(0, len(orgs), size):
+            rows = orgs[start : start + size]
+            minutes = (
+                org_minutes[start : start + size, None]
+                + self.index.meters_between(rows, dsts) / self.mobility_velocity
+                + dst_minutes
             )
+            # a station is not connected to itself.
+            minutes[rows[:, None] == dsts] = np.inf
+            i, j = np.unravel_index(np.argmin(minutes), minutes.shape)
+            if minutes[i, j] < best:
+                best, best_pair = minutes[i, j], (rows[i], dsts[j])
 
-        # a list of nodes in the shortest path
-        nodes_on_path: list[Node] = nx.shortest_path(
-            self.graph, source=org, target=dst, weight="cost"
-        )[1:-1]
-
-        # remove temporary nodes.
-        self.graph.remove_nodes_from([org, dst])
-
-        return nodes_on_path
+        if best_pair is None:
+            return None
+        return self.stations[best_pair[0]], self.stations[best_pair[1]]
 
     def shortest_path(self, org: Location, dst: Location, dept: float):
-        nodes_on_path = self._shortest_nodes_on_path(org=org, dst=dst)
-
-        arrv = dept + org.distance(nodes_on_path[0].location) / self.walking_velocity
-        trips = [
-            Trip(
-                org=org,
-                dst=nodes_on_path[0].location,
-                dept=dept,
-                arrv=arrv,
-                service="walking",
+        if not (stations := self._best_stations(org=org, dst=dst)):
+            return Path(
+                trips=[
+                    Trip(
+                        org=org,
+                        dst=dst,
+                        dept=dept,
+                        arrv=float("inf"),
+                        service="not_found",
+                    )
+                ]
             )
-        ]
+        a, b = stations
 
-        for a, b in itertools.pairwise(nodes_on_path):
-            dept = arrv
-            arrv += a.location.distance(b.location) / self.mobility_velocity
-            trips.append(
+        arrv0 = dept + org.distance(a) / self.walking_velocity
+        arrv1 = arrv0 + a.distance(b) / self.mobility_velocity
+        return Path(
+            [
                 Trip(
-                    org=a.location,
-                    dst=b.location,
+                    org=org,
+                    dst=a,
                     dept=dept,
-                    arrv=arrv,
+                    arrv=arrv0,
+                    service="walking",
+                ),
+                Trip(
+                    org=a,
+                    dst=b,
+                    dept=arrv0,
+                    arrv=arrv1,
                     service=self.service,
-                )
-            )
-
-        trips += [
-            Trip(
-                org=nodes_on_path[-1].location,
-                dst=dst,
-                dept=arrv,
-                arrv=arrv
-                + nodes_on_path[-1].location.distance(dst) / self.walking_velocity,
-                service="walking",
-            )
-        ]
-
-        return Path(trips)
+                ),
+                Trip(
+                    org=b,
+                    dst=dst,
+                    dept=arrv1,
+                    arrv=arrv1 + b.distance(dst) / self.walking_velocity,
+                    service="walking",
+                ),
+            ]
+        )
@@ -1,40 +1,147 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+import array
+import bisect
 import datetime
 import itertools
 import logging
+import math
+import threading
 import typing
 
-import networkx as nx
-from core import Location, MobilityNetwork, Path, Trip
-from networkx.exception import NetworkXNoPath
+import numpy as np
+from core import Location, LocationIndex, MobilityNetwork, Path, Trip
 
-from gtfs.object import StopTimeWithDatetime as StopTime
 from gtfs.object import Trip as gtfs_Trip
 
 logger = logging.getLogger(__name__)
 
 
-class SchedulePoint(typing.NamedTuple):
-    stop: Location
-    time: datetime.datetime
-    side: typing.Literal["org", "dst"]
+class Leg(typing.NamedTuple):
+    """a ride from the boarding to the alighting connection"""
 
+    board: int
+    alight: int
+    previous: typing.Optional["Leg"]
 
-def add_nodes(graph: nx.DiGraph, stop_times: typing.Sequence[StopTime]):
-    for source, target in itertools.pairwise(stop_times):
-        # The "org" side is interested in departure times.
-        graph.add_edge(
-            u_of_edge=SchedulePoint(source.stop, source.departure, side="org"),
-            v_of_edge=SchedulePoint(target.stop, target.departure, side="org"),
-            weight=(target.departure - source.departure).total_seconds() / 60,
-        )
-        # The "dst" side is interested in arrival times.
-        graph.add_edge(
-            u_of_edge=SchedulePoint(source.stop, source.departure, side="org"),
-            v_of_edge=SchedulePoint(target.stop, target.departure, side="dst"),
-            weight=(target.arrival - source.departure).total_seconds() / 60,
-        )
+
+class Label(typing.NamedTuple):
+    """the best journey found so far to a stop"""
+
+    arrival: float
+    rides: int
+    access: float  # walking minutes from the origin to the first boarding stop
+    leg: Leg | None
+
+    @property
+    def key(self):
+        # The station nearest to the origin is preferred among journeys with fewer rides.
+        return self.arrival, self.rides, self.access
+
+
+class Entry(typing.NamedTuple):
+    """the boarding connection of a trip and the journey before it"""
+
+    board: int
+    rides: int
+    access: float
+    leg: Leg | None
+
+    @property
+    def key(self):
+        return self.rides, self.access
+
+
+class Timetable:
+    """connections of the trips operating on a date, sorted by departure time
+
+    A connection is a hop of a trip between two consecutive stops.
+    Times are minutes elapsed from the start time of the network."""
+
+    def __init__(self):
+        self.departures = array.array("d")
+        self.arrivals = array.array("d")
+        self.origins = array.array("i")  # stop index
+        self.destinations = array.array("i")  # stop index
+        self.trips = array.array("i")  # trip index on the date
+
+    def __len__(self):
+        return len(self.departures)
+
+    @classmethod
+    def build(
+        cls, connections: typing.Iterable[tuple[float, float, int, int, int, int]]
+    ) -> "Timetable":
+        """connections of (departure, arrival, trip, sequence, origin, destination)"""
+        timetable = cls()
+        # hops of a trip at the same time are kept in order of the sequence
+        for departure, arrival, trip, _, origin, destination in sorted(connections):
+            timetable.departures.append(departure)
+            timetable.arrivals.append(arrival)
+            timetable.origins.append(origin)
+            timetable.destinations.append(destination)
+            timetable.trips.append(trip)
+        return timetable
+
+    def earliest_arrival(
+        self,
+        access: typing.Sequence[float],
+        egress: typing.Sequence[float],
+        dept: float,
+        max_waiting_time: float = 0,
+    ) -> Label | None:
+        """Connection Scan for the earliest arrival at the destination
+
+        access/ egress are walking minutes between the origin/ destination and each stop,
+        infinite if the stop is out of walking distance.
+        Transfers are allowed between trips at the same stop."""
+        labels: list[Label | None] = [None] * len(access)
+        entries: dict[int, Entry] = {}  # trips in reach
+        best: Label | None = None
+
+        for i in range(bisect.bisect_left(self.departures, dept), len(self)):
+            departure = self.departures[i]
+            if best and departure > best.arrival:
+                break
+
+            trip = self.trips[i]
+            origin = self.origins[i]
+            entry = entries.get(trip)
+
+            # boarding at the stop walking from the origin
+            walking = access[origin]
+            if departure >= dept + walking and not (
+                max_waiting_time and departure - dept - walking > max_waiting_time
+            ):
+                candidate = Entry(board=i, rides=0, access=walking, leg=None)
+                if entry is None or candidate.key < entry.key:
+                    entries[trip] = entry = candidate
+
+            # boarding at the stop transferring from another trip
+            if (label := labels[origin]) and label.arrival <= departure:
+                candidate = Entry(
+                    board=i, rides=label.rides, access=label.access, leg=label.leg
+                )
+                if entry is None or candidate.key < entry.key:
+                    entries[trip] = entry = candidate
+
+            if entry is None:
+                continue
+
+            destination = self.destinations[i]
+            label = Label(
+                arrival=self.arrivals[i],
+                rides=entry.rides + 1,
+                access=entry.access,
+                leg=Leg(board=entry.board, alight=i, previous=entry.leg),
+            )
+            if labels[destination] is None or label.key < labels[destination].key:
+                labels[destination] = label
+                label = label._replace(arrival=label.arrival + egress[destination])
+                if label.arrival < math.inf and (best is None or label.key < best.key):
+                    best = label
+
+        return best
 
 
 class Network(MobilityNetwork):
@@ -44,106 +151,104 @@ class Network(MobilityNetwork):
         walking_meters_per_minute: float,
         start_time: datetime.datetime,
         max_waiting_bus_time: float = 0,
+        max_walking_meters: float | None = None,
     ):
         self.service = service
         self.start_time = start_time
         self.walking_velocity = walking_meters_per_minute
         self.max_waiting_bus_time = max_waiting_bus_time
-        self.graphs: dict[datetime.date, nx.DiGraph] = {}
+        self.max_walking_meters = max_walking_meters
+        self.timetables: dict[datetime.date, Timetable] = {}
         self.trips: list[gtfs_Trip] = []
+        self.stops: list[Location] = []
+        self._stop_index: dict[Location, int] = {}
+        self._location_index = LocationIndex([])
+        self._lock = threading.Lock()
 
     def setup(self, trips: typing.Collection[gtfs_Trip]):
         self.trips = list(trips)
+        self.timetables.clear()
+        self.stops = list(
+            dict.fromkeys(stop for trip in self.trips for stop in trip.stops)
+        )
+        self._stop_index = {stop: i for i, stop in enumerate(self.stops)}
+        self._location_index = LocationIndex(
+            self.stops, cell_meters=self.max_walking_meters or 1000.0
+        )
 
     def datetime_from(self, elapsed_minutes: float):
         return self.start_time + datetime.timedelta(minutes=elapsed_minutes)
 
     def elapsed_until(self, date_time: datetime.datetime):
+        # times of the timetable are in the time zone of the start time
+        if date_time.tzinfo is None:
+            date_time = date_time.replace(tzinfo=self.start_time.tzinfo)
         return (date_time - self.start_time).total_seconds() / 60
 
-    def graph(self, at: datetime.date):
-        if at in self.graphs:
-            return self.graphs[at]
-
-        self.graphs[at] = graph = nx.DiGraph()
-
-        for trip in self.trips:
-            if trip.service.is_operation(at):
-                add_nodes(graph, trip.stop_times(at))
-
-        return graph
-
-        # ToDo: Allow transfer to another Trip
-
-    def _nodes_on_shortest_path(
-        self, graph: nx.DiGraph, org: Location, dst: Location, dept: datetime.datetime
-    ) -> list[SchedulePoint]:
-        # Add temporary nodes, indicating org/ dst location.
-        # Nodes on the "org" side are only connected to org location.
-        # Nodes on the "dst" side are only connected to dst location.
-        for node in list(graph.nodes):
-            node: SchedulePoint
-
-            if node.side == "dst":
-                walking_duration = node.stop.distance(dst) / self.walking_velocity
-
-                # weight = walking duration
-                graph.add_edge(u_of_edge=node, v_of_edge=dst, weight=walking_duration)
-
-            elif node.side == "org":
-                walking_duration = node.stop.distance(org) / self.walking_velocity
-
-                # Ignore nodes that are not on time for departure.
-                if node.time < dept + datetime.timedelta(minutes=walking_duration):
-                    continue
-
-                weight = (node.time - dept).total_seconds() / 60.0
-
-                # Ignore nodes whose waiting time at the stop exceeds "max_waiting_bus_time"
-                if (
-                    self.max_waiting_bus_time
-                    and weight - walking_duration > self.max_waiting_bus_time
-                ):
-                    continue
-
-                # weight = waiting time at the stop + walking duration
-                graph.add_edge(u_of_edge=org, v_of_edge=node, weight=weight)
+    def timetable(self, at: datetime.date):
+        # timetables are built once and read-only afterward, so that queries may run in parallel
+        with self._lock:
+            if at not in self.timetables:
+                self.timetables[at] = self._timetable(at)
+            return self.timetables[at]
+
+    def _timetable(self, at: datetime.date):
+        def connections():
+            for trip_index, trip in enumerate(self.trips):
+                pairs = itertools.pairwise(trip.stop_times(at))
+                for sequence, (source, target) in enumerate(pairs):
+                    yield (
+                        self.elapsed_until(source.departure),
+                        self.elapsed_until(target.arrival),
+                        trip_index,
+                        sequence,
+                        self._stop_index[source.stop],
+                        self._stop_index[target.stop],
+                    )
 
-        # Depending on the dept time, org node may not be added to the temporary graph.
-        graph.add_node(org)
+        return Timetable.build(connections())
 
-        # There may be many shortest paths between the source and target.
-        # The station nearest to the source is preferentially selected.
-        # Actually, a single list of nodes in the shortest path.
-        try:
-            return min(
-                nx.all_shortest_paths(graph, source=org, target=dst, weight="weight"),
-                key=lambda path: path[1].stop.distance(org),
-            )[1:-1]
-        except NetworkXNoPath:
-            return []
-        finally:
-            # remove temporary nodes.
-            graph.remove_nodes_from([org, dst])
+    def _walking_minutes(self, location: Location) -> list[float]:
+        # stops out of walking distance are not accessible
+        minutes = np.full(len(self.stops), np.inf)
+        indices, meters = self._location_index.within(location, self.max_walking_meters)
+        minutes[indices] = meters / self.walking_velocity
+        return minutes.tolist()
 
-    def nodes_on_shortest_path(
+    def legs_on_earliest_path(
         self, org: Location, dst: Location, dept: float
-    ) -> list[SchedulePoint]:
-        dept = self.datetime_from(dept)
-        # graphs in the other day may contain more appropriate paths
-        for graph in [
-            self.graph(dept.date() - datetime.timedelta(days=1)),
-            self.graph(dept.date()),
-            self.graph(dept.date() + datetime.timedelta(days=1)),
+    ) -> list[tuple[Location, float, Location, float]]:
+        access = self._walking_minutes(org)
+        egress = self._walking_minutes(dst)
+        date = self.datetime_from(dept).date()
+        # timetables in the other day may contain more appropriate paths
+        for at in [
+            date - datetime.timedelta(days=1),
+            date,
+            date + datetime.timedelta(days=1),
         ]:
-            nodes_on_path = self._nodes_on_shortest_path(graph, org, dst, dept)
-            if nodes_on_path:
-                return nodes_on_path
+            timetable = self.timetable(at)
+            if label := timetable.earliest_arrival(
+                access, egress, dept, self.max_waiting_bus_time
+            ):
+                legs = []
+                leg = label.leg
+                while leg:
+                    legs.append(
+                        (
+                            self.stops[timetable.origins[leg.board]],
+                            timetable.departures[leg.board],
+                            self.stops[timetable.destinations[leg.alight]],
+                            timetable.arrivals[leg.alight],
+                        )
+                    )
+                    leg = leg.previous
+                return legs[::-1]
 
         return []
 
     def shortest_path(self, org: Location, dst: Location, dept: float):
-        if not (nodes_on_path := self.nodes_on_shortest_path(org, dst, dept)):
+        if not (legs := self.legs_on_earliest_path(org, dst, dept)):
             return Path(
                 trips=[
                     Trip(
@@ -156,14 +261,8 @@ class Network(MobilityNetwork):
                 ]
             )
 
-        dept_stop, dept_time = (
-            nodes_on_path[0].stop,
-            self.elapsed_until(nodes_on_path[0].time),
-        )
-        arrv_stop, arrv_time = (
-            nodes_on_path[-1].stop,
-            self.elapsed_until(nodes_on_path[-1].time),
-        )
+        dept_stop = legs[0][0]
+        arrv_stop, arrv_time = legs[-1][2:]
 
         return Path(
             [
@@ -177,12 +276,13 @@ class Network(MobilityNetwork):
             ]
             + [
                 Trip(
-                    org=dept_stop,
-                    dst=arrv_stop,
-                    dept=dept_time,
-                    arrv=arrv_time,
+                    org=board_stop,
+                    dst=alight_stop,
+                    dept=board_time,
+                    arrv=alight_time,
                     service=self.service,
                 )
+                for board_stop, board_time, alight_stop, alight_time in legs
             ]
             + [
                 Trip(
@@ -84,6 +84,10 @@ class Trip:
         self.service = service
         self._stop_times = stop_times
 
+    @property
+    def stops(self) -> list[Location]:
+        return [stop_time.stop for stop_time in self._stop_times]
+
     def stop_times(self, at: date) -> list[StopTimeWithDatetime]:
         return (
             [StopTimeWithDatetime(stop_time, at) for stop_time in self._stop_times]
@@ -3,10 +3,18 @@
 import datetime
 import itertools
 import logging
+import threading
 import typing
 
 import networkx as nx
-from core import Location, MobilityNetwork, Path, Trip
+from core import (
+    Location,
+    LocationIndex,
+    MobilityNetwork,
+    Path,
+    Trip,
+    shortest_path_via,
+)
 from networkx.exception import NetworkXNoPath
 
 from gtfs_flex.object import Stop, StopTime
@@ -28,17 +36,29 @@ class Network(MobilityNetwork):
         mobility_meters_per_minute: float,
         walking_meters_per_minute: float,
         expected_waiting_time: float,
+        max_walking_meters: float | None = None,
     ):
         self.service = service
         self.start_time = start_time
         self.mobility_velocity = mobility_meters_per_minute
         self.walking_velocity = walking_meters_per_minute
         self.waiting_bus_time = expected_waiting_time
-        self.graphs: dict[datetime.date, nx.DiGraph] = {}
+        self.max_walking_meters = max_walking_meters
+        self.indices: dict[str, LocationIndex] = {}
+        self.graphs: dict[datetime.date, dict[StopTime, nx.DiGraph]] = {}
         self.trips: list[gtfs_Trip] = []
+        self._lock = threading.Lock()
 
     def setup(self, trips: typing.Collection[gtfs_Trip]):
         self.trips = trips
+        # index of the stops for each group
+        self.indices = {
+            trip.stop_time.group.group_id: LocationIndex(
+                trip.stop_time.group.locations,
+                cell_meters=self.max_walking_meters or 1000.0,
+            )
+            for trip in trips
+        }
 
     def datetime_from(self, elapsed_minutes: float) -> datetime.datetime:
         return self.start_time + datetime.timedelta(minutes=elapsed_minutes)
@@ -71,12 +91,17 @@ class Network(MobilityNetwork):
         return graph
 
     def graph(self, at: datetime.date):
-        if at in self.graphs:
+        # graphs are built once and read-only afterward, so that queries may run in parallel
+        with self._lock:
+            if at not in self.graphs:
+                self.graphs[at] = self._graph(at)
             return self.graphs[at]
+
+    def _graph(self, at: datetime.date):
         prev = at - datetime.timedelta(days=1)
         next_ = at + datetime.timedelta(days=1)
 
-        self.graphs[at] = graph = {}
+        graph: dict[StopTime, nx.DiGraph] = {}
 
         for trip in self.trips:
             trip: gtfs_Trip
@@ -105,31 +130,36 @@ class Network(MobilityNetwork):
                 graph[stop_time] = self.graph_from_stops(stops)
         return graph
 
+    def _walking_costs(
+        self, graph: nx.DiGraph, index: LocationIndex, location: Location, side: str
+    ) -> dict[Node, float]:
+        # stops out of walking distance are not connected
+        indices, meters = index.within(location, self.max_walking_meters)
+        nodes = (Node(index.locations[i], side) for i in indices.tolist())
+        return {
+            node: cost
+            for node, cost in zip(nodes, (meters / self.walking_velocity).tolist())
+            if node in graph
+        }
+
     def _nodes_on_shortest_path(
-        self, graph: nx.DiGraph, org: Location, dst: Location
+        self, graph: nx.DiGraph, index: LocationIndex, org: Location, dst: Location
     ) -> tuple[list[Node], list[float]]:
-        # Add temporary nodes, indicating org/ dst location.
-        for node in list(graph.nodes):
-            node: Node
-            if node.side == "org":
-                graph.add_edge(
-                    org, node, cost=org.distance(node.stop) / self.walking_velocity
-                )
-            else:
-                graph.add_edge(
-                    node, dst, cost=node.stop.distance(dst) / self.walking_velocity
-                )
-
+        # org/ dst are connected to the nodes on the "org"/ "dst" side by walking.
         # a list of nodes in the shortest path
         try:
-            path = nx.shortest_path(graph, source=org, target=dst, weight="cost")
-            costs = [graph.edges[u, v]["cost"] for u, v in itertools.pairwise(path)]
-            return path[1:-1], costs
+            path, costs = shortest_path_via(
+                graph,
+                org_costs=self._walking_costs(graph, index, org, side="org"),
+                dst_costs=self._walking_costs(graph, index, dst, side="dst"),
+                weight="cost",
+            )
         except NetworkXNoPath:
             return [], []
-        finally:
-            # remove temporary nodes.
-            graph.remove_nodes_from([org, dst])
+        # walking costs of the path in the same distance as the other legs
+        costs[0] = org.distance(path[0].stop) / self.walking_velocity
+        costs[-1] = path[-1].stop.distance(dst) / self.walking_velocity
+        return path, costs
 
     def expected_arrival(
         self,
@@ -181,7 +211,9 @@ class Network(MobilityNetwork):
                 and graph.nodes
                 and today + stop_time.end_window > self.datetime_from(dept)
             ):
-                path, costs = self._nodes_on_shortest_path(graph, org, dst)
+                path, costs = self._nodes_on_shortest_path(
+                    graph, self.indices[stop_time.group.group_id], org, dst
+                )
                 if path:
                     dept_arrv = self.expected_arrival(
                         path, costs, dept, today, stop_time
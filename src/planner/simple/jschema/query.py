@@ -66,6 +66,7 @@ class MaaSSimNetworkSetting(BaseModel):
 
 class Setup(BaseModel):
     walking_meters_per_minute: float
+    max_walking_meters: float | None = None  # not limited if not specified
     reference_time: constr(min_length=8, max_length=8)
     networks: typing.Mapping[
         str,
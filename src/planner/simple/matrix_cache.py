@@ -0,0 +1,70 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import contextlib
+import dataclasses
+import hashlib
+import json
+import logging
+import pathlib
+import typing
+
+import numpy as np
+from core import Location
+from mblib.io.npy_cache import NpyCache
+from pydantic_settings import BaseSettings
+
+logger = logging.getLogger(__name__)
+
+
+class MatrixCacheConfig(BaseSettings, frozen=True):
+    """environment variable"""
+
+    # Each set of the stops writes a file of the full n x n float64 matrix,
+    # e.g. about 200 MB for 5,000 stops, and the files are never evicted.
+    MATRIX_CACHE_DIR: pathlib.Path | None = None  # not cached if not specified
+
+
+def canonical_order(stops: typing.Sequence[Location]) -> list[int]:
+    """indices of the stops in the order stored in the cache"""
+    return sorted(range(len(stops)), key=lambda i: dataclasses.astuple(stops[i]))
+
+
+@dataclasses.dataclass(frozen=True)
+class MatrixCache:
+    """on-disk cache of the distance matrices for the stop sets
+
+    Each matrix is stored as a NumPy file with the stops in canonical order,
+    and is memory-mapped on load."""
+
+    env: MatrixCacheConfig = dataclasses.field(default_factory=MatrixCacheConfig)
+
+    @property
+    def directory(self) -> pathlib.Path | None:
+        return self.env.MATRIX_CACHE_DIR
+
+    @staticmethod
+    def key(stops: typing.Sequence[Location]) -> str:
+        """content address of the matrix for the set of the stops"""
+        content = [dataclasses.astuple(stops[i]) for i in canonical_order(stops)]
+        return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+    @property
+    def _arrays(self) -> NpyCache:
+        return NpyCache(self.directory)
+
+    def load(self, key: str) -> np.ndarray | None:
+        if (matrix := self._arrays.load(key)) is not None:
+            path = self._arrays.path(key)
+            logger.info("loaded the distance matrix from the cache: %s", path)
+        return matrix
+
+    @contextlib.contextmanager
+    def create(self, key: str, size: int):
+        """a writable matrix to be saved in the cache when the context exits normally
+
+        None if the cache is disabled."""
+        with self._arrays.create(key, (size, size)) as matrix:
+            yield matrix
+        if self.directory:
+            path = self._arrays.path(key)
+            logger.info("saved the distance matrix to the cache: %s", path)
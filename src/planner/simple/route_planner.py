@@ -1,14 +1,19 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+import contextlib
 import logging
 import re
 import typing
 
-from core import Location, MobilityNetwork, Path, Trip
+import numpy as np
+from core import Location, MobilityNetwork, Path, Trip, haversine
 from jschema.response import DistanceMatrix
+from matrix_cache import MatrixCache, canonical_order
 
 logger = logging.getLogger(__name__)
 
+CHUNK_ELEMENTS = 1 << 20  # elements of a chunk of the distance matrix
+
 
 class Planner:
     def meters_for_all_stops_combinations(
@@ -16,6 +21,11 @@ class Planner:
     ) -> DistanceMatrix:
         raise NotImplementedError()
 
+    def meters_chunks_for_all_stops_combinations(
+        self, stops: list[Location]
+    ) -> typing.Iterator[np.ndarray]:
+        raise NotImplementedError()
+
     def plan(self, org: Location, dst: Location, dept: float) -> list[Path]:
         raise NotImplementedError()
 
@@ -24,24 +34,57 @@ pattern = re.compile(r".+:(.*)")
 
 
 class DirectPathPlanner(Planner):
-    def __init__(self, networks: typing.Collection[MobilityNetwork]):
+    def __init__(
+        self,
+        networks: typing.Collection[MobilityNetwork],
+        matrix_cache: MatrixCache | None = None,
+    ):
         super().__init__()
         self.networks = list(networks)
+        self.matrix_cache = matrix_cache
 
     def meters_for_all_stops_combinations(
         self, stops: list[Location]
     ) -> DistanceMatrix:
-        def _distance(org: Location, dst: Location):
-            if org.id_ == dst.id_:
-                return 0
-            distance = org.distance(dst)
-            return distance
-
         matrix = [
-            [_distance(org=stop_a, dst=stop_b) for stop_b in stops] for stop_a in stops
+            row
+            for chunk in self.meters_chunks_for_all_stops_combinations(stops)
+            for row in chunk.tolist()
         ]
         return DistanceMatrix(stops=[stop.id_ for stop in stops], matrix=matrix)
 
+    def meters_chunks_for_all_stops_combinations(
+        self, stops: list[Location]
+    ) -> typing.Iterator[np.ndarray]:
+        """rows of the distance matrix by chunks, so as to bound the memory for many stops"""
+        size = max(1, CHUNK_ELEMENTS // max(len(stops), 1))
+        # the matrix in the cache is in canonical order of the stops
+        order = np.array(canonical_order(stops), dtype=int)
+        position = np.empty_like(order)
+        position[order] = np.arange(len(stops))
+
+        key = self.matrix_cache.key(stops) if self.matrix_cache else ""
+        if key and (cached := self.matrix_cache.load(key)) is not None:
+            for start in range(0, len(stops), size):
+                yield cached[position[start : start + size]][:, position]
+            return
+
+        ids = np.array([stop.id_ for stop in stops])
+        lat = np.radians([stop.lat for stop in stops])
+        lng = np.radians([stop.lng for stop in stops])
+        with (
+            self.matrix_cache.create(key, len(stops))
+            if key
+            else contextlib.nullcontext()
+        ) as matrix:
+            for start in range(0, len(stops), size):
+                rows = slice(start, start + size)
+                chunk = haversine(lat[rows, None], lng[rows, None], lat, lng)
+                chunk[ids[rows, None] == ids] = 0.0
+                if matrix is not None:
+                    matrix[position[rows]] = chunk[:, order]
+                yield chunk
+
     def _shortest_paths(self, org: Location, dst: Location, dept: float):
         return sorted(
             (network.shortest_path(org, dst, dept) for network in self.networks),
@@ -1,6 +1,21 @@
 # SPDX-FileCopyrightText: 2023 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+import pathlib
+import tempfile
 import unittest
+from unittest.mock import patch
+
+import controller
+from core import Location
+from fastapi.testclient import TestClient
+from matrix_cache import MatrixCache, MatrixCacheConfig
+from route_planner import DirectPathPlanner
+
+stops = [
+    {"locationId": "S1", "lat": 36.699941, "lng": 137.212183},
+    {"locationId": "S2", "lat": 36.692495, "lng": 137.223181},
+    {"locationId": "S3", "lat": 36.693, "lng": 137.2},
+]
 
 
 class SimpleTripPlannerTestCase(unittest.IsolatedAsyncioTestCase):
@@ -8,5 +23,48 @@ class SimpleTripPlannerTestCase(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(True)
 
 
+class MatrixTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.client = TestClient(controller.app, raise_server_exceptions=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def planner(self, directory: pathlib.Path):
+        cache = MatrixCache(env=MatrixCacheConfig(MATRIX_CACHE_DIR=directory))
+        return patch.object(
+            controller, "planner", DirectPathPlanner([], matrix_cache=cache)
+        )
+
+    def test_matrix(self):
+        with self.planner(pathlib.Path(self.directory.name)):
+            response = self.client.post("/matrix", json=stops)
+
+        self.assertEqual(200, response.status_code)
+        result = response.json()
+        self.assertEqual(["S1", "S2", "S3"], result["stops"])
+        locations = [Location(e["locationId"], e["lat"], e["lng"]) for e in stops]
+        for a, row in zip(locations, result["matrix"]):
+            for b, meters in zip(locations, row):
+                self.assertAlmostEqual(a.distance(b), meters, places=6)
+
+    def test_not_set_up(self):
+        with patch.object(controller, "planner", None):
+            response = self.client.post("/matrix", json=stops)
+
+        self.assertEqual(409, response.status_code)
+
+    def test_cache_error(self):
+        # the error opening the cache is returned before the matrix is streamed
+        path = pathlib.Path(self.directory.name) / "file"
+        path.touch()
+        with self.planner(path):
+            response = self.client.post("/matrix", json=stops)
+
+        self.assertEqual(500, response.status_code)
+        self.assertFalse(response.text.startswith('{"stops"'))
+
+
 if __name__ == "__main__":
     unittest.main()
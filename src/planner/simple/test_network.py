@@ -1,9 +1,11 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION
 # SPDX-License-Identifier: Apache-2.0
 import datetime
+import pathlib
+import tempfile
 import unittest
 
-from core import Location, Path, Trip, WalkingNetwork
+from core import Location, LocationIndex, Path, Trip, WalkingNetwork
 from gbfs.network import Network as GbfsNetwork
 from gtfs.network import Network as GtfsNetwork
 from gtfs.object import Service, StopTime
@@ -14,6 +16,8 @@ from gtfs_flex.object import Service as flex_Service
 from gtfs_flex.object import Stop as flex_Stop
 from gtfs_flex.object import StopTime as flex_StopTime
 from gtfs_flex.object import Trip as flex_Trip
+from matrix_cache import MatrixCache, MatrixCacheConfig
+from route_planner import DirectPathPlanner
 
 BASE_DATE = datetime.date(2022, 1, 1)
 
@@ -71,6 +75,33 @@ gtfs_flex_stations = {
 }
 
 
+class LocationIndexTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.locations = list(locations.values())
+        self.index = LocationIndex(self.locations, cell_meters=300)
+
+    def test_within(self):
+        org = gbfs_stations["18_1"]
+        for radius in [100, 500, 1000, 3000]:
+            indices, meters = self.index.within(org, radius)
+
+            self.assertEqual(
+                [
+                    i
+                    for i, location in enumerate(self.locations)
+                    if location.distance(org) <= radius
+                ],
+                indices.tolist(),
+            )
+            for i, m in zip(indices.tolist(), meters.tolist()):
+                self.assertAlmostEqual(self.locations[i].distance(org), m, places=6)
+
+    def test_not_limited(self):
+        indices, _ = self.index.within(gbfs_stations["18_1"], None)
+
+        self.assertEqual(list(range(len(self.locations))), indices.tolist())
+
+
 class WalkingTestCase(unittest.TestCase):
     def setUp(self) -> None:
         self.walking_velocity = 80.0
@@ -112,12 +143,10 @@ class GbfsTestCase(unittest.TestCase):
         )
         self.network.setup(self.stations.values())
 
-    def test_successfully_created_graph(self):
-        locations_length = len(locations)
-        self.assertEqual(locations_length * 2, len(self.network.graph.nodes))
-        self.assertEqual(
-            locations_length * (locations_length - 1), len(self.network.graph.edges)
-        )
+    def test_successfully_set_up_stations(self):
+        self.network.setup(list(self.stations.values()) * 2)
+
+        self.assertEqual(list(self.stations.values()), self.network.stations)
 
     def test_correct_path_case(self):
         org = locations["1_1"]
@@ -165,6 +194,29 @@ class GbfsTestCase(unittest.TestCase):
 
         self.assertEqual(expected, path)
 
+    def test_no_path_case_out_of_walking_distance(self):
+        self.network.max_walking_meters = 100
+        self.network.setup(self.stations.values())
+        org = locations["1_1"]
+        dst = locations["21_1"]
+
+        path = self.network.shortest_path(org, dst, 10)
+
+        self.assertEqual(
+            Path(
+                trips=[
+                    Trip(
+                        org=org,
+                        dst=dst,
+                        dept=10,
+                        arrv=float("inf"),
+                        service="not_found",
+                    )
+                ]
+            ),
+            path,
+        )
+
 
 class GtfsTestCase(unittest.TestCase):
     def setUp(self) -> None:
@@ -246,6 +298,100 @@ class GtfsTestCase(unittest.TestCase):
 
         self.assertEqual(expected, path)
 
+    def test_transfer_case(self):
+        service = Service(
+            start_date=BASE_DATE,
+            end_date=BASE_DATE + datetime.timedelta(days=1),
+            monday=True,
+            tuesday=True,
+            wednesday=True,
+            thursday=True,
+            friday=True,
+            saturday=True,
+            sunday=True,
+        )
+        self.network.setup(
+            trips=[
+                gtfs_Trip(
+                    service=service,
+                    stop_times=[
+                        StopTime(
+                            stop=location,
+                            arrival=datetime.timedelta(minutes=time),
+                            departure=datetime.timedelta(minutes=time),
+                        )
+                        for location, time in schedule
+                    ],
+                )
+                for schedule in [
+                    [(self.stations["3_1"], 543), (self.stations["7_1"], 546)],
+                    [(self.stations["7_1"], 547), (self.stations["31_1"], 557)],
+                ]
+            ]
+        )
+        org = locations["1_1"]
+        dst = locations["29_1"]
+        path = self.network.shortest_path(org, dst, 531.0)
+
+        expected = Path(
+            [
+                Trip(
+                    org=org,
+                    dst=self.stations["3_1"],
+                    dept=531.0,
+                    arrv=531.0
+                    + org.distance(self.stations["3_1"]) / self.walking_velocity,
+                    service="walking",
+                ),
+                Trip(
+                    org=self.stations["3_1"],
+                    dst=self.stations["7_1"],
+                    dept=543.0,
+                    arrv=546.0,
+                    service=self.service_name,
+                ),
+                Trip(
+                    org=self.stations["7_1"],
+                    dst=self.stations["31_1"],
+                    dept=547.0,
+                    arrv=557.0,
+                    service=self.service_name,
+                ),
+                Trip(
+                    org=self.stations["31_1"],
+                    dst=dst,
+                    dept=557.0,
+                    arrv=557
+                    + self.stations["31_1"].distance(dst) / self.walking_velocity,
+                    service="walking",
+                ),
+            ]
+        )
+
+        self.assertEqual(expected, path)
+
+    def test_no_path_case_out_of_walking_distance(self):
+        self.network.max_walking_meters = 500
+        self.network.setup(self.network.trips)
+        org = locations["1_1"]
+        dst = locations["21_1"]
+        path = self.network.shortest_path(org, dst, 530.0)
+
+        self.assertEqual(
+            Path(
+                trips=[
+                    Trip(
+                        org=org,
+                        dst=dst,
+                        dept=530.0,
+                        arrv=float("inf"),
+                        service="not_found",
+                    )
+                ]
+            ),
+            path,
+        )
+
 
 class OndemandBusTestCase(unittest.TestCase):
     def setUp(self) -> None:
@@ -298,6 +444,17 @@ class OndemandBusTestCase(unittest.TestCase):
             ]
         )
 
+    def test_graph_is_not_modified(self):
+        dept = self.start_window + 60
+        self.network.shortest_path(locations["1_1"], locations["21_1"], dept)
+        graphs = self.network.graph(BASE_DATE)
+        nodes = [list(graph.nodes) for graph in graphs.values()]
+
+        self.network.shortest_path(locations["1_1"], locations["21_1"], dept)
+
+        self.assertIs(graphs, self.network.graph(BASE_DATE))
+        self.assertEqual(nodes, [list(graph.nodes) for graph in graphs.values()])
+
     def test_no_path_case_not_available(self):
         org = locations["1_1"]
         dst = locations["21_1"]
@@ -371,5 +528,43 @@ class OndemandBusTestCase(unittest.TestCase):
         self.assertEqual(expected, path)
 
 
+class DistanceMatrixTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stops = list(locations.values())
+        self.directory = tempfile.TemporaryDirectory()
+        self.planner = DirectPathPlanner(
+            [],
+            matrix_cache=MatrixCache(
+                env=MatrixCacheConfig(
+                    MATRIX_CACHE_DIR=pathlib.Path(self.directory.name)
+                )
+            ),
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assertDistanceMatrix(self, stops: list[Location]):
+        result = self.planner.meters_for_all_stops_combinations(stops)
+
+        self.assertEqual([stop.id_ for stop in stops], result.stops)
+        for stop_a, row in zip(stops, result.matrix):
+            for stop_b, meters in zip(stops, row):
+                if stop_a.id_ == stop_b.id_:
+                    self.assertEqual(0.0, meters)
+                else:
+                    self.assertAlmostEqual(stop_a.distance(stop_b), meters, places=6)
+
+    def test_distance_matrix(self):
+        self.assertDistanceMatrix(self.stops)
+
+    def test_cached_in_any_order(self):
+        self.assertDistanceMatrix(self.stops)
+        self.assertEqual(1, len(list(pathlib.Path(self.directory.name).iterdir())))
+
+        self.assertDistanceMatrix(self.stops[::-1])
+        self.assertEqual(1, len(list(pathlib.Path(self.directory.name).iterdir())))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -6,7 +6,8 @@ import math
 import fastapi
 from commuter import CommuterScenario
 from jschema.query import Setup
-from jschema.response import Message, Peek, Step, StepEvent, User
+from jschema.response import Advance, Message, Peek, Step, StepEvent, User
+from mblib.io import stepping
 from mblib.io.log import init_logger
 from mblib.jschema import events, spec
 
@@ -45,7 +46,9 @@ def get_specification():
     builder.set_feature(
         events.EventType.DEMAND, declared=["demand_id", "pre_reserve", "arrive_by"]
     )
-    return builder.get_specification_response(version=events.VERSION_1)
+    return builder.get_specification_response(
+        version=events.VERSION_1, api=spec.ApiDefinition(advance=True, independent=True)
+    )
 
 
 @app.post("/setup", response_model=Message)
@@ -80,11 +83,25 @@ def step():
     return {"now": now, "events": events}
 
 
+@app.post("/advance", response_model=Advance, response_model_exclude_none=True)
+def advance(until: float | None = None):
+    now, next_, events_ = stepping.advance(
+        scenario.peek, scenario.step, scenario.env.now, until
+    )
+    next_ = next_ if math.isfinite(next_) else -1
+    return {"now": now, "next": next_, "events": events_}
+
+
 @app.post("/triggered")
 def triggered(_: events.Event):
     pass
 
 
+@app.post("/triggered/batch")
+def triggered_batch(_: list[events.Event]):
+    pass
+
+
 @app.post("/finish", response_model=Message)
 def finish():
     global scenario
@@ -6,6 +6,7 @@ import math
 import fastapi
 from generator import DemandGenerator
 from jschema import query, response
+from mblib.io import stepping
 from mblib.io.log import init_logger
 from mblib.jschema import events, spec
 
@@ -42,7 +43,9 @@ scenario: DemandGenerator | None = None
 def get_specification():
     builder = spec.EventSpecificationBuilder(step=response.StepEvent)
     builder.set_feature(events.EventType.DEMAND, declared=["demand_id", "pre_reserve"])
-    return builder.get_specification_response(version=events.VERSION_1)
+    return builder.get_specification_response(
+        version=events.VERSION_1, api=spec.ApiDefinition(advance=True, independent=True)
+    )
 
 
 @app.post("/setup", response_model=response.Message)
@@ -79,11 +82,25 @@ def step():
     return {"now": now, "events": events}
 
 
+@app.post("/advance", response_model=response.Advance, response_model_exclude_none=True)
+def advance(until: float | None = None):
+    now, next_, events_ = stepping.advance(
+        scenario.peek, scenario.step, scenario.env.now, until
+    )
+    next_ = next_ if math.isfinite(next_) else -1
+    return {"now": now, "next": next_, "events": events_}
+
+
 @app.post("/triggered")
 def triggered(_: events.Event):
     pass
 
 
+@app.post("/triggered/batch")
+def triggered_batch(_: list[events.Event]):
+    pass
+
+
 @app.post("/finish", response_model=response.Message)
 def finish():
     global scenario
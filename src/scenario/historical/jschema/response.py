@@ -10,6 +10,7 @@ Message = response.Message
 Peek = response.Peek
 StepEvent: typing.TypeAlias = DemandEvent
 Step = response.Step[StepEvent]
+Advance = response.Advance[StepEvent]
 
 
 class User(BaseModel):
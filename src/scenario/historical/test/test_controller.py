@@ -0,0 +1,65 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import unittest
+
+import controller
+from fastapi.testclient import TestClient
+
+org = {"locationId": "Org", "lat": 154.1, "lng": 27.1}
+dst = {"locationId": "Dst", "lat": 154.2, "lng": 27.3}
+setting = {
+    "trips": [
+        {"org": org, "dst": dst, "time": t, "dept": t, "service": "walking"}
+        for t in [10.0, 10.0, 20.0, 35.0]
+    ]
+}
+
+
+class AdvanceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(controller.app)
+
+    def start(self):
+        self.assertEqual(200, self.client.post("/setup", json=setting).status_code)
+        self.assertEqual(200, self.client.post("/start").status_code)
+
+    def steps(self):
+        """(now, events) of each step emitting events"""
+        steps = []
+        while self.client.get("/peek").json()["next"] >= 0:
+            response = self.client.post("/step").json()
+            if response["events"]:
+                steps.append((response["now"], response["events"]))
+        return steps
+
+    def advances(self, until: float | None = None):
+        advances = []
+        while True:
+            params = {"until": until} if until is not None else {}
+            response = self.client.post("/advance", params=params).json()
+            if response["events"]:
+                advances.append((response["now"], response["events"]))
+            elif response["next"] < 0 or (
+                until is not None and response["next"] > until
+            ):
+                return advances
+
+    def test_same_as_step(self):
+        self.start()
+        expected = self.steps()
+        self.assertEqual([10.0, 10.0, 20.0, 35.0], [now for now, _ in expected])
+
+        # /advance emits the events of each step separately, in the same order
+        self.start()
+        self.assertEqual(expected, self.advances())
+
+    def test_until(self):
+        self.start()
+        self.assertEqual(
+            [10.0, 10.0, 20.0], [now for now, _ in self.advances(until=30.0)]
+        )
+        self.assertEqual(35.0, self.client.get("/peek").json()["next"])
+
+
+if __name__ == "__main__":
+    unittest.main()
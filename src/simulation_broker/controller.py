@@ -6,14 +6,20 @@ import logging
 import math
 import pathlib
 import typing
+import zipfile
 
 import fastapi
 from engine import RunnerEngine
 from jschema import query, response
 from mblib.io.log import init_logger
-from mblib.io.result import FileResultWriter, HTTPResultWriter, ResultWriter
+from mblib.io.result import (
+    FileResultWriter,
+    HTTPResultWriter,
+    ParquetResultWriter,
+    ResultWriter,
+)
 from route_planner import Path, Planner
-from runner import HttpRunner, Runner
+from runner import HttpRunner, InProcessRunner, Runner
 from validation import EventValidator
 
 logger = logging.getLogger(__name__)
@@ -74,13 +80,16 @@ class SetupParser:
         return 99
 
     @property
-    def externals(self) -> list[tuple[str, query.ExternalSetting]]:
+    def externals(
+        self,
+    ) -> list[tuple[str, query.ExternalSetting | query.InProcessSetting]]:
         names = sorted(self.settings.keys(), key=self._order)
         # fix order for some modules by _order function
         return [
             (name, self.settings[name])
             for name in names
-            if self.settings[name].type == query.ModuleType.http
+            if self.settings[name].type
+            in (query.ModuleType.http, query.ModuleType.inprocess)
         ]
 
 
@@ -155,25 +164,46 @@ async def setup(settings: query.Setup):
     parser = SetupParser(settings)
 
     name, broker_setting = parser.broker
-    if endpoint := broker_setting.details.writer.endpoint:
+    writer_setting = broker_setting.details.writer
+    if endpoint := writer_setting.endpoint:
         manager.writer = HTTPResultWriter(f"{endpoint}/result/events/")
+    elif writer_setting.format == "parquet":
+        manager.writer = ParquetResultWriter(
+            pathlib.Path("events"), batch_size=writer_setting.batch_size
+        )
     else:
-        manager.writer = FileResultWriter(pathlib.Path("events.txt"))
+        manager.writer = FileResultWriter(
+            pathlib.Path("events.txt"),
+            batch_size=writer_setting.batch_size,
+            compression=writer_setting.compression,
+            segment_size=writer_setting.segment_size,
+        )
 
     if v := broker_setting.details.validation:
         validator = EventValidator(
             ignore_feature=v.ignore_feature,
             ignore_schema=v.ignore_schema,
             ignore_in_process=v.ignore_in_process,
+            sample_interval=v.sample_interval,
+            sample_warmup=v.sample_warmup,
         )
     else:
         validator = EventValidator()
-    manager.engine = RunnerEngine(writer=manager.writer, validator=validator)
+    manager.engine = RunnerEngine(
+        writer=manager.writer,
+        validator=validator,
+        concurrent_triggered=broker_setting.details.concurrent_triggered,
+    )
     for name, planner_setting in parser.planners:
         planner = Planner(name, endpoint=planner_setting.endpoint.unicode_string())
         manager.add_planner(name, planner)
     for name, external_setting in parser.externals:
-        runner = HttpRunner(name, endpoint=external_setting.endpoint.unicode_string())
+        if external_setting.type == query.ModuleType.inprocess:
+            runner = InProcessRunner(name, directory=external_setting.directory)
+        else:
+            runner = HttpRunner(
+                name, endpoint=external_setting.endpoint.unicode_string()
+            )
         manager.add_runner(name, runner)
     await manager.engine.setup()
     for name, planner_setting in parser.planners:
@@ -241,9 +271,26 @@ async def finish():
 
 
 @app.get("/events")
-def events():
+def events(event_type: str | None = None):
+    if isinstance(manager.writer, ParquetResultWriter):
+        paths = manager.writer.paths
+        if event_type is None:
+            # archive the tables of all the event types
+            archive = pathlib.Path("events.zip")
+            with zipfile.ZipFile(archive, "w") as zf:
+                for path in paths.values():
+                    zf.write(path, arcname=path.name)
+            return fastapi.responses.FileResponse(path=archive)
+        if path := paths.get(event_type):
+            return fastapi.responses.FileResponse(path=path)
+        msg = f"no events: event_type={event_type}"
+        raise fastapi.HTTPException(fastapi.status.HTTP_404_NOT_FOUND, msg)
     if isinstance(manager.writer, FileResultWriter):
-        return fastapi.responses.FileResponse(path=manager.writer.filepath)
+        if manager.writer.paths == [manager.writer.filepath]:
+            return fastapi.responses.FileResponse(path=manager.writer.filepath)
+        return fastapi.responses.StreamingResponse(
+            manager.writer.iter_bytes(), media_type="text/plain"
+        )
     else:
         msg = "must be retrieved from jobmanager"
         raise fastapi.HTTPException(fastapi.status.HTTP_404_NOT_FOUND, msg)
@@ -1,7 +1,10 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
 import asyncio
+import heapq
+import itertools
 import logging
+import math
 import typing
 
 from jschema.event import Event
@@ -34,6 +37,25 @@ class Runner:
     async def triggered(self, event: Event) -> None:
         raise NotImplementedError()
 
+    async def advance(
+        self, until: float, next_: float | None = None
+    ) -> tuple[int | float, int | float, list[Event]]:
+        """step until the next event time exceeds `until` or some events are emitted
+
+        `next_` is the next event time cached by the broker, peeked if not given.
+        returns the current time, the next event time and the emitted events"""
+        if next_ is None:
+            next_ = await self.peek()
+        now, events = next_, []
+        while not events and math.isfinite(next_) and next_ <= until:
+            now, events = await self.step()
+            next_ = await self.peek()
+        return now, next_, events
+
+    async def triggered_batch(self, events: list[Event]) -> None:
+        for event in events:
+            await self.triggered(event)
+
     async def finish(self) -> None:
         pass
 
@@ -41,62 +63,164 @@ class Runner:
         pass
 
 
+class PeekQueue:
+    """priority queue of the cached next event time of each runner
+
+    Runners whose state may have changed are marked as dirty and have to be
+    peeked again before the queue is used."""
+
+    def __init__(self):
+        # entry: (next event time, order of runner, sequence number, name)
+        self._heap: list[tuple[int | float, int, int, str]] = []
+        self._entries: dict[str, tuple[int | float, int, int, str]] = {}
+        self._orders: dict[str, int] = {}
+        self._counter = itertools.count()
+        self.dirty: set[str] = set()
+
+    def add(self, name: str):
+        self._orders.setdefault(name, len(self._orders))
+        self.invalidate(name)
+
+    def invalidate(self, name: str):
+        self._entries.pop(name, None)
+        self.dirty.add(name)
+
+    def update(self, name: str, peek: float):
+        entry = (peek, self._orders[name], next(self._counter), name)
+        self._entries[name] = entry
+        self.dirty.discard(name)
+        heapq.heappush(self._heap, entry)
+
+    def first(self) -> tuple[str | None, int | float]:
+        """get the runner with the earliest next event time except dirty ones"""
+        while self._heap:
+            entry = self._heap[0]
+            peek, _, _, name = entry
+            if self._entries.get(name) is entry:
+                return name, peek
+            heapq.heappop(self._heap)  # discard outdated entry
+        return None, math.inf
+
+    def pop(self) -> tuple[str | None, int | float]:
+        """take out the runner with the earliest next event time and mark it as dirty"""
+        name, peek = self.first()
+        if name is not None:
+            heapq.heappop(self._heap)
+            self.invalidate(name)
+        return name, peek
+
+
 class RunnerEngine:
-    def __init__(self, writer: ResultWriter, validator: EventValidator):
+    def __init__(
+        self,
+        writer: ResultWriter,
+        validator: EventValidator,
+        concurrent_triggered: bool = False,
+    ):
         self._writer = writer
         self.validator: EventValidator = validator
         self._runners: dict[str, Runner] = {}
+        self._peeks = PeekQueue()
+        # send triggered events to the independent runners concurrently
+        self._concurrent_triggered = concurrent_triggered
+        self._independents: set[str] = set()
 
     def add_runner(self, name: str, runner: Runner):
         self._runners[name] = runner
+        self._peeks.add(name)
 
     async def setup(self):
         for name, runner in self._runners.items():
             spec = await runner.spec()
             self.validator.specs[name] = spec
+            if spec.api and spec.api.independent:
+                self._independents.add(name)
 
         logger.debug("validator: %s", self.validator)
         self.validator.check_versions()
         self.validator.check_schemas()
         self.validator.check_features()
+        self.validator.compile()
 
     async def start(self):
-        for runner in self._runners.values():
+        for name, runner in self._runners.items():
             await runner.start()
+            self._peeks.invalidate(name)
+
+    async def _update_peeks(self):
+        """peek only the runners whose next event time may have changed"""
+        names = sorted(self._peeks.dirty)
+        peeks = await asyncio.gather(*[self._runners[name].peek() for name in names])
+        for name, peek in zip(names, peeks):
+            self._peeks.update(name, peek)
 
     async def peek(self):
-        return min(
-            await asyncio.gather(*[runner.peek() for runner in self._runners.values()])
-        )
+        await self._update_peeks()
+        _, peek = self._peeks.first()
+        return peek
 
     async def step(self, until: float | None = None) -> int | float:
-        peeks = await asyncio.gather(
-            *[runner.peek() for runner in self._runners.values()]
-        )
+        await self._update_peeks()
 
         # step the simulator with the lowest peek() value
-        runner, min_peek = min(zip(self._runners.values(), peeks), key=lambda e: e[1])
+        name, min_peek = self._peeks.first()
         # If the next event is after the value of until, returns the scheduled time of it
-        if until and min_peek > until:
+        if (until and min_peek > until) or name is None:
             return min_peek
 
-        now, events = await runner.step()
-
+        runner = self._runners[name]
+        self._peeks.pop()
+        # the runner can advance without any interaction
+        # until the next event of the other runners
+        _, horizon = self._peeks.first()
+        if until:
+            horizon = min(horizon, until)
+        if not math.isfinite(horizon):
+            horizon = min_peek
+        now, next_, events = await runner.advance(horizon, min_peek)
+        self._peeks.update(name, next_)
+
+        triggered: dict[str, list[Event]] = {name: [] for name in self._runners}
         for event in events:
-            self.validator.check_event_on_step_response(runner.name, event)
+            # the source is set before the event is dumped for the validation
             event.source = runner.name
-            await self._writer.write_json(event.model_dump(exclude_none=True))
+            self.validator.check_event_on_step_response(runner.name, event)
+            await self._writer.write_json(event.record())
 
             # sync triggered events with the other runners
             if service := event.service:
                 self.validator.check_event_on_triggered_request(service, event)
-                await self._runners[service].triggered(event)
+                triggered[service].append(event)
             else:
                 for each in self._runners.values():
                     self.validator.check_event_on_triggered_request(each.name, event)
-                    await each.triggered(event)
+                    triggered[each.name].append(event)
+        await self._triggered(
+            {name: events_ for name, events_ in triggered.items() if events_}
+        )
         return now
 
+    async def _triggered_sequentially(self, triggered: dict[str, list[Event]]):
+        for name, events in triggered.items():
+            await self._runners[name].triggered_batch(events)
+            self._peeks.invalidate(name)
+
+    async def _triggered(self, triggered: dict[str, list[Event]]):
+        if not self._concurrent_triggered:
+            await self._triggered_sequentially(triggered)
+            return
+        # the runners not declared as independent receive events one after another
+        await asyncio.gather(
+            self._triggered_sequentially(
+                {k: v for k, v in triggered.items() if k not in self._independents}
+            ),
+            *[
+                self._triggered_sequentially({k: v})
+                for k, v in triggered.items()
+                if k in self._independents
+            ],
+        )
+
     async def finish(self):
         for runner in self._runners.values():
             try:
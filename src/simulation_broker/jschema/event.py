@@ -1,7 +1,8 @@
 # SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
 
-from pydantic import BaseModel, Extra
+import orjson
+from pydantic import BaseModel, Extra, PrivateAttr
 
 
 class Event(BaseModel, extra=Extra.allow):
@@ -9,3 +10,30 @@ class Event(BaseModel, extra=Extra.allow):
     source: str | None = None
     time: float
     service: str | None = None
+    _dumped: dict | None = PrivateAttr(None)
+    _recorded: dict | None = PrivateAttr(None)
+    _encoded: bytes | None = PrivateAttr(None)
+
+    def dump(self) -> dict:
+        """dict of the event forwarded to the modules, dumped only once
+
+        The event must not be modified after dumping."""
+        if self._dumped is None:
+            self._dumped = self.model_dump()
+        return self._dumped
+
+    def record(self) -> dict:
+        """dict of the event without null values for the result, dumped only once"""
+        if self._recorded is None:
+            self._recorded = self.model_dump(exclude_none=True)
+        return self._recorded
+
+    def encode(self) -> bytes:
+        """JSON bytes of the event, encoded only once to forward it to the modules"""
+        if self._encoded is None:
+            self._encoded = orjson.dumps(self.dump())
+        return self._encoded
+
+    @staticmethod
+    def encode_list(events: list["Event"]) -> bytes:
+        return b"[" + b",".join(event.encode() for event in events) + b"]"
@@ -1,9 +1,10 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+import pathlib
 import typing
 from enum import Enum
 
-from pydantic import AnyHttpUrl, BaseModel, RootModel
+from pydantic import AnyHttpUrl, BaseModel, Field, RootModel
 
 
 class LocationSetting(BaseModel):
@@ -16,6 +17,7 @@ class ModuleType(str, Enum):
     broker = "broker"
     planner = "planner"
     http = "http"
+    inprocess = "inprocess"
 
 
 class BaseSetting(BaseModel):
@@ -28,6 +30,12 @@ class ExternalSetting(BaseSetting):
     details: typing.Mapping
 
 
+class InProcessSetting(BaseSetting):
+    type: typing.Literal[ModuleType.inprocess]
+    directory: pathlib.Path  # directory including controller.py of the module
+    details: typing.Mapping
+
+
 class PlannerSetting(BaseSetting):
     type: typing.Literal[ModuleType.planner]
     endpoint: AnyHttpUrl
@@ -36,17 +44,25 @@ class PlannerSetting(BaseSetting):
 
 class ResultWriterSetting(BaseModel):
     endpoint: AnyHttpUrl | None = None
+    # for the file writer (used if the endpoint is not specified)
+    format: typing.Literal["jsonl", "parquet"] = "jsonl"
+    batch_size: int = Field(1000, ge=1)
+    compression: typing.Literal["gzip", "zstd"] | None = None
+    segment_size: int | None = Field(None, gt=0)  # bytes before compression
 
 
 class ValidationSetting(BaseModel):
     ignore_feature: bool = False
     ignore_schema: bool = False
     ignore_in_process: bool = False
+    sample_interval: int = Field(1, ge=1)
+    sample_warmup: int = Field(0, ge=0)
 
 
 class BrokerSettingDetails(BaseModel):
     writer: ResultWriterSetting = ResultWriterSetting()
     validation: ValidationSetting | None = None
+    concurrent_triggered: bool = False
 
 
 class BrokerSetting(BaseSetting):
@@ -54,7 +70,11 @@ class BrokerSetting(BaseSetting):
     details: BrokerSettingDetails
 
 
-class Setup(RootModel[dict[str, BrokerSetting | PlannerSetting | ExternalSetting]]):
+class Setup(
+    RootModel[
+        dict[str, BrokerSetting | PlannerSetting | ExternalSetting | InProcessSetting]
+    ]
+):
     # dict-like accessors
     def __getattr__(self, name: str):
         if name in ["get", "keys", "values", "items"]:
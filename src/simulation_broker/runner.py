@@ -1,12 +1,19 @@
 # SPDX-FileCopyrightText: 2022 TOYOTA MOTOR CORPORATION and MaaS Blender Contributors
 # SPDX-License-Identifier: Apache-2.0
+import importlib
+import inspect
 import logging
+import pathlib
+import sys
 import typing
 
 import aiohttp
+import fastapi
+import orjson
+import pydantic
 from engine import Event, Runner
 from mblib.io import httputil
-from mblib.jschema.spec import SpecificationResponse
+from mblib.jschema.spec import ApiDefinition, SpecificationResponse
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +23,7 @@ class HttpRunner(Runner):
         super().__init__(name=name)
         self._endpoint = endpoint
         self._session = aiohttp.ClientSession()
+        self._api = ApiDefinition()
 
     def __str__(self):
         return f"HttpRunner({self.name}, {self._endpoint})"
@@ -26,7 +34,7 @@ class HttpRunner(Runner):
             params=params if params else {},
         ) as response:
             await httputil.check_response(response)
-            return await response.json()
+            return orjson.loads(await response.read())
 
     async def _post(
         self,
@@ -34,19 +42,25 @@ class HttpRunner(Runner):
         data: typing.Any = None,
         params: typing.Mapping | None = None,
         timeout_seconds=300,
+        body: bytes | None = None,
     ):
+        """post `data` as JSON, or `body` as already encoded JSON bytes"""
         async with self._session.post(
             self._endpoint + method,
-            json=data,
+            json=data if body is None else None,
+            data=body,
+            headers={"Content-Type": "application/json"} if body is not None else None,
             params=params if params else {},
             timeout=aiohttp.ClientTimeout(total=timeout_seconds),
         ) as response:
             await httputil.check_response(response)
-            return await response.json()
+            return orjson.loads(await response.read())
 
     async def spec(self) -> SpecificationResponse:
         response = await self._get("spec")
         result = SpecificationResponse.model_validate(response)
+        if result.api:
+            self._api = result.api
         return result
 
     async def setup(self, setting: typing.Mapping):
@@ -61,10 +75,27 @@ class HttpRunner(Runner):
 
     async def step(self):
         response = await self._post("step")
-        return response["now"], [Event.parse_obj(event) for event in response["events"]]
+        return response["now"], [
+            Event.model_validate(event) for event in response["events"]
+        ]
 
     async def triggered(self, event: Event):
-        await self._post("triggered", data=event.model_dump())
+        await self._post("triggered", body=event.encode())
+
+    async def advance(self, until: float, next_: float | None = None):
+        if not self._api.advance:
+            return await super().advance(until, next_)
+        response = await self._post("advance", params={"until": until})
+        return (
+            response["now"],
+            response["next"] if response["next"] >= 0 else float("inf"),
+            [Event.model_validate(event) for event in response["events"]],
+        )
+
+    async def triggered_batch(self, events: list[Event]):
+        if not self._api.advance:
+            return await super().triggered_batch(events)
+        await self._post("triggered/batch", body=Event.encode_list(events))
 
     async def finish(self):
         await self._post("finish")
@@ -73,3 +104,141 @@ class HttpRunner(Runner):
     async def reservable(self, org: str, dst: str):
         response = await self._get("reservable", {"org": org, "dst": dst})
         return response["reservable"]
+
+
+def load_isolated_module(directory: pathlib.Path, name: str = "controller"):
+    """import a module of the simulator on the directory
+
+    Each simulator has its own top-level modules (e.g. core, jschema) which can
+    conflict with the ones of the broker or the other simulators, so these are
+    imported freshly and removed from sys.modules after importing."""
+    directory = directory.resolve()
+    local_names = {
+        e.stem if e.suffix == ".py" else e.name
+        for e in directory.iterdir()
+        if e.suffix == ".py" or e.is_dir()
+    }
+
+    def is_local(module_name: str):
+        return module_name.partition(".")[0] in local_names
+
+    saved = {k: v for k, v in sys.modules.items() if is_local(k)}
+    for k in saved:
+        del sys.modules[k]
+    sys.path.insert(0, str(directory))
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(str(directory))
+        for k in [k for k in sys.modules if is_local(k)]:
+            del sys.modules[k]
+        sys.modules.update(saved)
+
+
+def _value(response: typing.Any, key: str):
+    if isinstance(response, typing.Mapping):
+        return response[key]
+    return getattr(response, key)
+
+
+def _event(event: typing.Any) -> Event:
+    if isinstance(event, pydantic.BaseModel):
+        event = event.model_dump()
+    return Event.model_validate(event)
+
+
+class InProcessRunner(Runner):
+    """runner to call the API functions of the simulator in the broker process
+
+    The simulator is imported from the directory including its controller.py,
+    so its requirements have to be installed with the broker. Input files must
+    be specified by fetch_url, since no upload API is served."""
+
+    def __init__(self, name: str, directory: pathlib.Path):
+        super().__init__(name=name)
+        self._directory = directory
+        self._module = load_isolated_module(directory)
+        self._endpoints: dict[tuple[str, str], typing.Callable] = {
+            (method, route.path): route.endpoint
+            for route in self._module.app.routes
+            if isinstance(route, fastapi.routing.APIRoute)
+            for method in route.methods
+        }
+        self._params: dict[typing.Callable, list[str]] = {
+            endpoint: list(inspect.signature(endpoint).parameters)
+            for endpoint in self._endpoints.values()
+        }
+        self._adapters: dict[tuple[typing.Callable, str], pydantic.TypeAdapter] = {}
+        self._api = ApiDefinition()
+
+    def __str__(self):
+        return f"InProcessRunner({self.name}, {self._directory})"
+
+    def _adapter(self, endpoint: typing.Callable, param: str):
+        if not (adapter := self._adapters.get((endpoint, param))):
+            annotation = typing.get_type_hints(endpoint)[param]
+            adapter = self._adapters[endpoint, param] = pydantic.TypeAdapter(annotation)
+        return adapter
+
+    async def _call(self, method: str, path: str, *args: typing.Any):
+        endpoint = self._endpoints[method, path]
+        result = endpoint(
+            *[
+                self._adapter(endpoint, k).validate_python(v)
+                for k, v in zip(self._params[endpoint], args)
+            ]
+        )
+        return await self._result(result)
+
+    @staticmethod
+    async def _result(result: typing.Any):
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def spec(self) -> SpecificationResponse:
+        response = await self._call("GET", "/spec")
+        result = SpecificationResponse.model_validate(response, from_attributes=True)
+        if result.api:
+            self._api = result.api
+        return result
+
+    async def setup(self, setting: typing.Mapping):
+        await self._call("POST", "/setup", setting)
+
+    async def start(self):
+        await self._call("POST", "/start")
+
+    async def peek(self):
+        next_ = _value(await self._call("GET", "/peek"), "next")
+        return next_ if next_ >= 0 else float("inf")
+
+    async def step(self):
+        response = await self._call("POST", "/step")
+        return _value(response, "now"), [_event(e) for e in _value(response, "events")]
+
+    async def triggered(self, event: Event):
+        await self._call("POST", "/triggered", event.dump())
+
+    async def advance(self, until: float, next_: float | None = None):
+        if not self._api.advance:
+            return await super().advance(until, next_)
+        response = await self._call("POST", "/advance", until)
+        next_ = _value(response, "next")
+        return (
+            _value(response, "now"),
+            next_ if next_ >= 0 else float("inf"),
+            [_event(e) for e in _value(response, "events")],
+        )
+
+    async def triggered_batch(self, events: list[Event]):
+        if not self._api.advance:
+            return await super().triggered_batch(events)
+        await self._call("POST", "/triggered/batch", [e.dump() for e in events])
+
+    async def finish(self):
+        await self._call("POST", "/finish")
+
+    async def reservable(self, org: str, dst: str):
+        response = await self._call("GET", "/reservable", org, dst)
+        return _value(response, "reservable")
@@ -1,10 +1,20 @@
+import asyncio
+import contextlib
+import importlib.util
+import io
+import pathlib
 import random
+import tempfile
 import unittest
+import zipfile
 
+import controller
 import pydantic
 import yaml
 from controller import SetupParser
+from fastapi.testclient import TestClient
 from jschema import query
+from mblib.io.result import ParquetResultWriter
 
 
 class SetupParserTestCase(unittest.TestCase):
@@ -91,6 +101,70 @@ dummy_ondemand:
                 ],
             )
 
+    def test_externals_inprocess(self):
+        settings = dict(self.settings.items())
+        settings["walking"] = pydantic.parse_obj_as(
+            query.Setup,
+            {
+                "walking": {
+                    "type": "inprocess",
+                    "directory": "../walking",
+                    "details": {},
+                }
+            },
+        )["walking"]
+        parser = SetupParser(settings)
+        _, setting = next(e for e in parser.externals if e[0] == "walking")
+        self.assertEqual(setting.type, query.ModuleType.inprocess)
+        self.assertEqual(str(setting.directory), "../walking")
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+class ParquetEventsTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # the archive is created in the working directory
+        chdir = contextlib.chdir(directory.name)
+        chdir.__enter__()
+        self.addCleanup(chdir.__exit__, None, None, None)
+
+        writer = ParquetResultWriter(pathlib.Path("events"))
+
+        async def write():
+            for event_type, time in [("DEMAND", 0.0), ("DEPART", 1.0), ("DEMAND", 2.0)]:
+                await writer.write_json({"eventType": event_type, "time": time})
+            await writer.close()
+
+        asyncio.run(write())
+        controller.manager.writer = writer
+        self.addCleanup(setattr, controller.manager, "writer", None)
+        self.client = TestClient(controller.app)
+
+    def test_archive(self):
+        import pyarrow.parquet
+
+        response = self.client.get("/events")
+        self.assertEqual(200, response.status_code)
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            self.assertEqual(
+                ["DEMAND.parquet", "DEPART.parquet"], sorted(zf.namelist())
+            )
+            with zf.open("DEMAND.parquet") as fp:
+                table = pyarrow.parquet.read_table(fp)
+        self.assertEqual([0.0, 2.0], table.column("time").to_pylist())
+
+    def test_event_type(self):
+        import pyarrow.parquet
+
+        response = self.client.get("/events", params={"event_type": "DEPART"})
+        self.assertEqual(200, response.status_code)
+        table = pyarrow.parquet.read_table(io.BytesIO(response.content))
+        self.assertEqual([1.0], table.column("time").to_pylist())
+
+        response = self.client.get("/events", params={"event_type": "ARRIVED"})
+        self.assertEqual(404, response.status_code)
+
 
 if __name__ == "__main__":
     unittest.main()
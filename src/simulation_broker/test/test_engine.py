@@ -0,0 +1,259 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import asyncio
+import json
+import math
+import unittest
+
+import pydantic
+from engine import Runner, RunnerEngine
+from jschema.event import Event
+from mblib.io.result import ResultWriter
+from mblib.jschema import events, spec
+from validation import EventValidator
+
+
+class MemoryResultWriter(ResultWriter):
+    def __init__(self):
+        self.records: list[dict] = []
+
+    async def close(self):
+        pass
+
+    async def write_json(self, data: dict):
+        self.records.append(data)
+
+
+class ScheduledRunner(Runner):
+    """runner to emit events at the scheduled time"""
+
+    def __init__(
+        self,
+        name: str,
+        schedule: list[tuple[float, list[dict]]],
+        independent: bool = False,
+        log: list[str] | None = None,
+    ):
+        super().__init__(name=name)
+        self.schedule = schedule
+        self.independent = independent
+        self.log = log if log is not None else []
+        self.received: list[Event] = []
+        self.peeks = 0
+        self.steps = 0
+        self.batches = 0
+
+    async def spec(self):
+        return spec.SpecificationResponse(
+            version=events.VERSION_1,
+            api=spec.ApiDefinition(independent=self.independent),
+        )
+
+    async def peek(self):
+        self.peeks += 1
+        return self.schedule[0][0] if self.schedule else math.inf
+
+    async def step(self):
+        self.steps += 1
+        now, events = self.schedule.pop(0)
+        return now, [Event.model_validate(e) for e in events]
+
+    async def triggered(self, event: Event):
+        self.received.append(event)
+
+    async def triggered_batch(self, events: list[Event]):
+        self.batches += 1
+        self.log.append(f"{self.name}:begin")
+        await asyncio.sleep(0)
+        await super().triggered_batch(events)
+        self.log.append(f"{self.name}:end")
+
+
+def _event(event_type: str, time: float, service: str | None = None):
+    return {"eventType": event_type, "time": time, "service": service}
+
+
+class EventTestCase(unittest.TestCase):
+    def test_encode(self):
+        event = Event.model_validate(_event("DEMAND", 1.0) | {"details": {"x": 1}})
+        event.source = "a"
+        dumped = event.dump()
+        self.assertIs(dumped, event.dump())
+        self.assertEqual(
+            {
+                "eventType": "DEMAND",
+                "source": "a",
+                "time": 1.0,
+                "service": None,
+                "details": {"x": 1},
+            },
+            dumped,
+        )
+        encoded = event.encode()
+        self.assertIs(encoded, event.encode())
+        self.assertEqual(dumped, json.loads(encoded))
+        self.assertEqual([dumped] * 2, json.loads(Event.encode_list([event, event])))
+
+        # null values are omitted only from the result
+        recorded = event.record()
+        self.assertIs(recorded, event.record())
+        self.assertEqual(
+            {"eventType": "DEMAND", "source": "a", "time": 1.0, "details": {"x": 1}},
+            recorded,
+        )
+
+
+class RunnerEngineTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.writer = MemoryResultWriter()
+        self.engine = RunnerEngine(self.writer, EventValidator(ignore_in_process=True))
+
+    async def test_advance_until_next_of_others(self):
+        a = ScheduledRunner("a", [(1.0, []), (2.0, []), (3.0, [])])
+        b = ScheduledRunner("b", [(2.5, [])])
+        self.engine.add_runner("a", a)
+        self.engine.add_runner("b", b)
+
+        now = await self.engine.step()
+
+        self.assertEqual(2.0, now)
+        self.assertEqual(2, a.steps)
+        self.assertEqual(0, b.steps)
+        # the fallback starts from the cached peek and peeks once after each step
+        self.assertEqual(3, a.peeks)
+
+    async def test_advance_exhausted(self):
+        a = ScheduledRunner("a", [(1.0, [])])
+        self.engine.add_runner("a", a)
+
+        self.assertEqual(1.0, await self.engine.step())
+        # the runners without next events are not stepped even if no until is given
+        self.assertEqual(math.inf, await self.engine.step())
+        self.assertEqual(1, a.steps)
+
+    async def test_advance_stops_on_events(self):
+        a = ScheduledRunner("a", [(1.0, [_event("DEMAND", 1.0)]), (2.0, [])])
+        b = ScheduledRunner("b", [(5.0, [])])
+        self.engine.add_runner("a", a)
+        self.engine.add_runner("b", b)
+
+        now = await self.engine.step()
+
+        self.assertEqual(1.0, now)
+        self.assertEqual(1, a.steps)
+        self.assertEqual(["DEMAND"], [e.eventType for e in b.received])
+
+    async def test_advance_until(self):
+        a = ScheduledRunner("a", [(1.0, []), (2.0, []), (3.0, [])])
+        self.engine.add_runner("a", a)
+
+        now = await self.engine.step(until=2.0)
+
+        self.assertEqual(2.0, now)
+        self.assertEqual(2, a.steps)
+        self.assertEqual(3.0, await self.engine.step(until=2.0))
+
+    async def test_triggered_batch(self):
+        events = [
+            _event("DEMAND", 1.0),
+            _event("RESERVE", 1.0, service="b"),
+            _event("DEPART", 1.0),
+        ]
+        a = ScheduledRunner("a", [(1.0, events)])
+        b = ScheduledRunner("b", [])
+        c = ScheduledRunner("c", [])
+        for runner in [a, b, c]:
+            self.engine.add_runner(runner.name, runner)
+
+        await self.engine.step()
+
+        self.assertEqual(
+            ["DEMAND", "RESERVE", "DEPART"],
+            [e["eventType"] for e in self.writer.records],
+        )
+        self.assertEqual(["a"] * 3, [e["source"] for e in self.writer.records])
+        self.assertEqual(["DEMAND", "DEPART"], [e.eventType for e in a.received])
+        self.assertEqual(
+            ["DEMAND", "RESERVE", "DEPART"], [e.eventType for e in b.received]
+        )
+        self.assertEqual(["DEMAND", "DEPART"], [e.eventType for e in c.received])
+        self.assertEqual([1, 1, 1], [a.batches, b.batches, c.batches])
+
+    async def test_forward_vehicle_only_event(self):
+        location = {"locationId": "S1", "lat": 35.0, "lng": 139.0}
+        details = {"userId": None, "demandId": None, "location": location}
+        a = ScheduledRunner(
+            "a", [(1.0, [_event("DEPARTED", 1.0) | {"details": details}])]
+        )
+        b = ScheduledRunner("b", [])
+        for runner in [a, b]:
+            self.engine.add_runner(runner.name, runner)
+
+        await self.engine.step()
+
+        # the receivers parse the forwarded payload as the event of the type
+        adapter = pydantic.TypeAdapter(
+            events.DepartedEvent | events.ArrivedEvent | events.Event
+        )
+        (received,) = b.received
+        self.assertEqual(received.model_dump(), received.dump())
+        for parsed in [
+            adapter.validate_json(received.encode()),
+            adapter.validate_python(received.dump()),
+        ]:
+            self.assertIsInstance(parsed, events.DepartedEvent)
+            self.assertIsNone(parsed.details.userId)
+            self.assertEqual("S1", parsed.details.location.locationId)
+        self.assertEqual(details, self.writer.records[0]["details"])
+        self.assertNotIn("service", self.writer.records[0])
+
+    async def test_peek_cache(self):
+        a = ScheduledRunner("a", [(1.0, []), (3.0, [_event("DEMAND", 3.0)])])
+        b = ScheduledRunner("b", [(2.0, [_event("RESERVE", 2.0, service="a")])])
+        c = ScheduledRunner("c", [(10.0, [])])
+        for runner in [a, b, c]:
+            self.engine.add_runner(runner.name, runner)
+
+        self.assertEqual(1.0, await self.engine.peek())
+        self.assertEqual([1, 1, 1], [a.peeks, b.peeks, c.peeks])
+
+        self.assertEqual(1.0, await self.engine.step())  # a: no events
+        self.assertEqual(2.0, await self.engine.step())  # b: RESERVE to a
+        # the runner which received no events is not peeked again
+        self.assertEqual(1, c.peeks)
+
+        self.assertEqual(3.0, await self.engine.step())  # a: DEMAND to all
+        self.assertEqual(10.0, await self.engine.peek())
+        self.assertEqual(2, c.peeks)
+        self.assertEqual(["RESERVE", "DEMAND"], [e.eventType for e in a.received])
+
+    async def test_concurrent_triggered(self):
+        log = []
+        self.engine = RunnerEngine(
+            self.writer,
+            EventValidator(ignore_in_process=True),
+            concurrent_triggered=True,
+        )
+        runners = [
+            ScheduledRunner("a", [(1.0, [_event("DEMAND", 1.0)])], log=log),
+            ScheduledRunner("b", [], log=log),
+            ScheduledRunner("c", [], independent=True, log=log),
+            ScheduledRunner("d", [], independent=True, log=log),
+        ]
+        for runner in runners:
+            self.engine.add_runner(runner.name, runner)
+        await self.engine.setup()
+
+        await self.engine.step()
+
+        # dependent runners (a, b) receive events one after another
+        self.assertLess(log.index("a:end"), log.index("b:begin"))
+        # independent runners receive events concurrently
+        self.assertLess(log.index("c:begin"), log.index("a:end"))
+        self.assertLess(log.index("d:begin"), log.index("c:end"))
+        for runner in runners:
+            self.assertEqual(["DEMAND"], [e.eventType for e in runner.received])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+# SPDX-FileCopyrightText: 2024 TOYOTA MOTOR CORPORATION
+# SPDX-License-Identifier: Apache-2.0
+import math
+import pathlib
+import sys
+import typing
+import unittest
+
+import jschema
+from aiohttp import test_utils, web
+from engine import RunnerEngine
+from jschema.event import Event
+from mblib.jschema import events
+from runner import HttpRunner, InProcessRunner
+from test_engine import MemoryResultWriter, ScheduledRunner
+from validation import EventValidator
+
+HISTORICAL = pathlib.Path(__file__).parents[2] / "scenario" / "historical"
+org = {"locationId": "Org", "lat": 154.1, "lng": 27.1}
+dst = {"locationId": "Dst", "lat": 154.2, "lng": 27.3}
+
+
+def historical_setting(*times: float):
+    return {
+        "trips": [
+            {"org": org, "dst": dst, "time": t, "dept": t, "service": "walking"}
+            for t in times
+        ]
+    }
+
+
+class HttpRunnerTestCase(unittest.IsolatedAsyncioTestCase):
+    """HttpRunner calling a stub simulator"""
+
+    async def asyncSetUp(self):
+        self.advance = True
+        self.requests: list[tuple[str, dict, typing.Any]] = []
+        self.schedule = [(1.0, []), (2.0, [{"eventType": "DEMAND", "time": 2.0}])]
+
+        async def handle(request: web.Request):
+            body = await request.json() if request.can_read_body else None
+            self.requests.append((request.path, dict(request.query), body))
+            match request.path:
+                case "/spec":
+                    api = {"advance": self.advance}
+                    return web.json_response({"version": events.VERSION_1, "api": api})
+                case "/peek":
+                    next_ = self.schedule[0][0] if self.schedule else -1
+                    return web.json_response({"next": next_})
+                case "/step":
+                    now, events_ = self.schedule.pop(0)
+                    return web.json_response({"now": now, "events": events_})
+                case "/advance":
+                    return web.json_response(
+                        {"now": 2.0, "next": -1, "events": self.schedule[1][1]}
+                    )
+            return web.json_response({"message": "ok"})
+
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", handle)
+        self.server = test_utils.TestServer(app)
+        await self.server.start_server()
+        self.addAsyncCleanup(self.server.close)
+        self.runner = HttpRunner("stub", str(self.server.make_url("/")))
+        self.addAsyncCleanup(self.runner._session.close)
+
+    async def test_advance(self):
+        await self.runner.spec()
+
+        now, next_, events_ = await self.runner.advance(5.0)
+
+        self.assertEqual((2.0, math.inf), (now, next_))
+        self.assertEqual(["DEMAND"], [e.eventType for e in events_])
+        self.assertEqual(("/advance", {"until": "5.0"}, None), self.requests[-1])
+
+    async def test_triggered_batch(self):
+        await self.runner.spec()
+        batch = [
+            Event(eventType="DEMAND", time=1.0, source="a"),
+            Event(eventType="DEPART", time=1.0, source="a", service="stub"),
+        ]
+
+        await self.runner.triggered_batch(batch)
+
+        self.assertEqual(
+            [("/triggered/batch", {}, [e.model_dump() for e in batch])],
+            self.requests[1:],
+        )
+
+    async def test_without_advance(self):
+        # the single step API is called if /advance is not supported
+        self.advance = False
+        await self.runner.spec()
+
+        now, next_, events_ = await self.runner.advance(5.0, next_=1.0)
+        self.assertEqual((2.0, math.inf), (now, next_))
+        self.assertEqual(["DEMAND"], [e.eventType for e in events_])
+
+        await self.runner.triggered_batch(events_ * 2)
+        self.assertEqual(
+            ["/spec", "/step", "/peek", "/step", "/peek", "/triggered", "/triggered"],
+            [path for path, _, _ in self.requests],
+        )
+
+
+class InProcessRunnerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_isolated_modules(self):
+        runner1 = InProcessRunner("historical1", HISTORICAL)
+        runner2 = InProcessRunner("historical2", HISTORICAL)
+
+        self.assertIs(jschema, sys.modules["jschema"])
+        self.assertIsNot(runner1._module, runner2._module)
+
+        await runner1.setup(historical_setting(10.0))
+        await runner2.setup(historical_setting(20.0))
+        await runner1.start()
+        await runner2.start()
+        now1, _, events1 = await runner1.advance(100.0)
+        now2, _, events2 = await runner2.advance(100.0)
+        self.assertEqual((10.0, [10.0]), (now1, [e.time for e in events1]))
+        self.assertEqual((20.0, [20.0]), (now2, [e.time for e in events2]))
+
+    async def test_engine(self):
+        writer = MemoryResultWriter()
+        engine = RunnerEngine(writer, EventValidator())
+        runner = InProcessRunner("historical", HISTORICAL)
+        receiver = ScheduledRunner("receiver", [(15.0, [])])
+        engine.add_runner(runner.name, runner)
+        engine.add_runner(receiver.name, receiver)
+        await engine.setup()
+        await runner.setup(historical_setting(10.0, 10.0, 20.0))
+        await engine.start()
+
+        times = []
+        while math.isfinite(await engine.peek()):
+            times.append(await engine.step())
+        self.assertEqual(sorted(times), times)
+        self.assertIn(15.0, times)
+
+        self.assertEqual([10.0, 10.0, 20.0], [e.time for e in receiver.received])
+        # the events at the same time are delivered by separate steps
+        self.assertEqual(3, receiver.batches)
+        self.assertEqual(
+            ["U_1", "U_2", "U_3"], [e["details"]["userId"] for e in writer.records]
+        )
+        await engine.finish()
+
+
+if __name__ == "__main__":
+    unittest.main()
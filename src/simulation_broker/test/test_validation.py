@@ -5,6 +5,7 @@ import json
 import re
 import unittest
 from typing import ClassVar
+from unittest.mock import patch
 
 import pydantic
 from jschema.event import Event
@@ -73,6 +74,26 @@ class JsonSchemaTestCase(unittest.TestCase):
             schema.validate(event)
         print(cm.exception)
 
+    def test_validator_compiled_once(self):
+        schema = JsonSchema(self.data)
+        event = Event(eventType=events.EventType.RESERVE, time=12345.6789)
+        event.details = {"userId": "hogehoge"}
+        schema.validate(event)
+        validator = schema.validator
+        schema.validate(event)
+        self.assertIs(validator, schema.validator)
+
+    def test_validate_dumped_once(self):
+        schema = JsonSchema(self.data)
+        event = Event(eventType=events.EventType.RESERVE, time=12345.6789)
+        event.details = {"userId": "hogehoge"}
+        with patch.object(Event, "model_dump", wraps=event.model_dump) as dump:
+            schema.validate(event)
+            schema.validate(event)
+            event.encode()
+        # the payload forwarded to the modules is validated
+        dump.assert_called_once_with()
+
 
 class SchemaCompatibilityCheckerTestCase(unittest.TestCase):
     def test_ok(self):
@@ -264,3 +285,20 @@ class EventValidatorTestCase(unittest.TestCase):
         with self.assertRaisesRegex(MismatchSchemaError, ptn) as cm:
             validator.check_schemas()
         print(cm.exception)
+
+    def test_compile(self):
+        validator = EventValidator(specs=self.specs)
+        validator.compile()
+        for schema in validator._rx_schemas.values():
+            self.assertIn("validator", vars(schema))
+
+    def test_sampling(self):
+        validator = EventValidator(specs=self.specs, sample_interval=3, sample_warmup=2)
+        invalid = Event(eventType=events.EventType.DEMAND, time=1.0)
+        checked = []
+        for i in range(1, 10):
+            try:
+                validator.check_event_on_triggered_request("abc_module", invalid)
+            except ValidationError:
+                checked.append(i)
+        self.assertEqual([1, 2, 3, 6, 9], checked)
@@ -2,12 +2,17 @@
 # SPDX-License-Identifier: Apache-2.0
 from __future__ import annotations
 
+import collections
 import dataclasses
+import itertools
 import logging
 import typing
 from functools import cached_property
 
 import jsonschema
+import jsonschema.exceptions
+import jsonschema.protocols
+import jsonschema.validators
 import yaml
 from jschema.event import Event
 from mblib.jschema.spec import FeatureDefinition, SpecificationResponse, TxRx
@@ -61,8 +66,19 @@ class JsonSchema:
     def additional_properties(self) -> bool:
         return self.current.get("additionalProperties", True)
 
+    @cached_property
+    def validator(self) -> jsonschema.protocols.Validator:
+        """validator compiled only once for the schema"""
+        cls = jsonschema.validators.validator_for(self.data)
+        cls.check_schema(self.data)
+        return cls(self.data)
+
     def validate(self, event: Event):
-        jsonschema.validate(event.model_dump(), self.data)
+        # same as jsonschema.validate() except for compiling the validator,
+        # and validates the payload forwarded to the modules
+        errors = self.validator.iter_errors(event.dump())
+        if error := jsonschema.exceptions.best_match(errors):
+            raise error
 
 
 class MismatchVersionError(ValueError):
@@ -120,7 +136,14 @@ class EventValidator:
     ignore_feature: bool = False
     ignore_schema: bool = False
     ignore_in_process: bool = False
+    # validate only 1 in `sample_interval` events after `sample_warmup` events
+    # for each module, event type and direction
+    sample_interval: int = 1
+    sample_warmup: int = 0
     specs: dict[str, SpecificationResponse] = dataclasses.field(default_factory=dict)
+    _counts: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter, init=False, repr=False
+    )
 
     @staticmethod
     def _inv_tx_rx(dir_: TxRx) -> TxRx:
@@ -255,11 +278,26 @@ class EventValidator:
             for name, event_type, schema in self._iter_schema("Rx")
         }
 
+    def compile(self):
+        """compile validators for the events in process in advance"""
+        if self.ignore_in_process:
+            return
+        for schema in itertools.chain(
+            self._tx_schemas.values(), self._rx_schemas.values()
+        ):
+            _ = schema.validator
+
+    def _sampled(self, dir_: TxRx, module_name: str, event_type: EventType) -> bool:
+        key = (dir_, module_name, event_type)
+        self._counts[key] += 1
+        count = self._counts[key]
+        return count <= self.sample_warmup or count % self.sample_interval == 0
+
     def check_event_on_step_response(self, module_name: str, event: Event):
         if self.ignore_in_process:
             return
         schema = self._tx_schemas.get((module_name, event.eventType))
-        if schema:
+        if schema and self._sampled("Tx", module_name, event.eventType):
             try:
                 schema.validate(event)
             except:
@@ -272,7 +310,7 @@ class EventValidator:
         if self.ignore_in_process:
             return
         schema = self._rx_schemas.get((module_name, event.eventType))
-        if schema:
+        if schema and self._sampled("Rx", module_name, event.eventType):
             try:
                 schema.validate(event)
             except:
@@ -10,3 +10,4 @@ Peek = response.Peek
 
 StepEvent = ReserveEvent | DepartEvent
 Step = response.Step[StepEvent]
+Advance = response.Advance[StepEvent]
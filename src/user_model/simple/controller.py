@@ -6,6 +6,7 @@ import fastapi
 from core import Location, Route, Trip
 from event import ArrivedEvent, DepartedEvent, ReservedEvent
 from jschema import query, response
+from mblib.io import stepping
 from mblib.io.log import init_logger
 from mblib.jschema import events, spec
 from user_manager import UserManager
@@ -57,7 +58,9 @@ def get_specification():
     )
     builder.set_feature(events.EventType.DEPARTED, declared=["demand_id"])
     builder.set_feature(events.EventType.ARRIVED, declared=["demand_id"])
-    return builder.get_specification_response(version=events.VERSION_1)
+    return builder.get_specification_response(
+        version=events.VERSION_1, api=spec.ApiDefinition(advance=True, independent=True)
+    )
 
 
 @app.get("/spec/schema")
@@ -101,6 +104,24 @@ def step():
     return {"now": now, "events": events}
 
 
+@app.post("/advance", response_model=response.Advance)
+def advance(until: float | None = None):
+    now, next_, events_ = stepping.advance(
+        manager.peek,
+        lambda: (
+            manager.step(),
+            [event.dumps() for event in manager.triggered_events],
+        ),
+        manager.env.now,
+        until,
+    )
+    return {
+        "now": now,
+        "next": next_ if next_ < float("inf") else -1,
+        "events": events_,
+    }
+
+
 @app.post("/triggered")
 async def triggered(event: query.TriggeredEvent | events.Event):
     # expect nothing to happen. just let time forward.
@@ -184,6 +205,12 @@ async def triggered(event: query.TriggeredEvent | events.Event):
             )
 
 
+@app.post("/triggered/batch")
+async def triggered_batch(events_: list[query.TriggeredEvent | events.Event]):
+    for event in events_:
+        await triggered(event)
+
+
 @app.post("/finish", response_model=response.Message)
 async def finish():
     global manager